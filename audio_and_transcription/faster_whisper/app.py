@@ -3,6 +3,8 @@ import base64
 import requests
 from tempfile import NamedTemporaryFile
 
+import cold_start
+
 
 BEAM_VOLUME_PATH = "./cached_models"
 
@@ -13,9 +15,14 @@ if env.is_remote():
 
 
 # This runs once when the container first starts
+# Each phase is timed, see utils/cold_start for how to collect the metrics
+@cold_start.instrument_on_start
 def load_models():
-    model_path = download_model("large-v3", cache_dir=BEAM_VOLUME_PATH)
-    model = WhisperModel(model_path, device="cuda", compute_type="float16")
+    with cold_start.phase("download"):
+        model_path = download_model("large-v3", cache_dir=BEAM_VOLUME_PATH)
+    # CTranslate2 deserializes the weights straight onto the GPU
+    with cold_start.phase("deserialize_and_device_transfer"):
+        model = WhisperModel(model_path, device="cuda", compute_type="float16")
     return model
 
 
@@ -76,10 +83,14 @@ def transcribe(context, **inputs):
             temp.write(binary_data)
             temp.flush()
 
-            segments, _ = model.transcribe(temp.name, beam_size=5, language=language)
+            # Segments are generated lazily, so the loop is part of the inference
+            with cold_start.phase("first_inference", once=True):
+                segments, _ = model.transcribe(
+                    temp.name, beam_size=5, language=language
+                )
 
-            for segment in segments:
-                text += segment.text + " "
+                for segment in segments:
+                    text += segment.text + " "
 
             print(text)
             return {"text": text}
@@ -0,0 +1 @@
+../../utils/load_generator/load_generator.py
\ No newline at end of file
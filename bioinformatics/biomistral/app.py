@@ -1,5 +1,7 @@
 from beam import endpoint, Image, Volume, env
 
+import response_cache
+
 # This ensures that these packages are only loaded when the script is running remotely on Beam
 if env.is_remote():
     import torch
@@ -8,6 +10,17 @@ if env.is_remote():
 CHECKPOINT = "BioMistral/BioMistral-7B"
 BEAM_VOLUME_PATH = "./cached_models"
 
+# Repeated prompts are answered from a cache instead of the GPU, see
+# utils/response_cache. To also reuse answers to near-identical prompts, set a
+# cosine similarity threshold (e.g. 0.95) and add sentence-transformers to the image.
+SIMILARITY_THRESHOLD = None
+cache = response_cache.ResponseCache(
+    ttl=3600,
+    similarity_threshold=SIMILARITY_THRESHOLD,
+    # Deterministic responses are shared by every container through the volume
+    persist_dir=f"{BEAM_VOLUME_PATH}/response_cache",
+)
+
 
 def load_models():
     model = AutoModelForCausalLM.from_pretrained(
@@ -17,6 +30,8 @@ def load_models():
         cache_dir=BEAM_VOLUME_PATH,
     )
     tokenizer = AutoTokenizer.from_pretrained(CHECKPOINT)
+    if SIMILARITY_THRESHOLD is not None:
+        cache.embed = response_cache.sentence_transformer_embedder()
     return model, tokenizer
 
 
@@ -67,10 +82,21 @@ def generate(context, **inputs):
         "pad_token_id": tokenizer.pad_token_id,
     }
 
-    input_ids = tokenizer(prompt, return_tensors="pt").input_ids.cuda()
+    # Temperature 0 means greedy decoding, whose output is the same every time
+    if generate_args["temperature"] == 0:
+        generate_args["do_sample"] = False
+        for arg in ("temperature", "top_p", "top_k"):
+            generate_args.pop(arg)
+
+    def run_generation():
+        input_ids = tokenizer(prompt, return_tensors="pt").input_ids.cuda()
+
+        with torch.no_grad():
+            output = model.generate(inputs=input_ids, **generate_args)
+            generated_text = tokenizer.decode(output[0], skip_special_tokens=True)
 
-    with torch.no_grad():
-        output = model.generate(inputs=input_ids, **generate_args)
-        generated_text = tokenizer.decode(output[0], skip_special_tokens=True)
+        return {"generated_text": generated_text}
 
-    return {"generated_text": generated_text}
+    if not inputs.get("cache", True):
+        return run_generation()
+    return cache.get_or_compute(prompt, generate_args, run_generation)
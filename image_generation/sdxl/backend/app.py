@@ -6,6 +6,8 @@ The code below shows how to deploy a serverless inference API for running stable
 
 from beam import Image, Volume, endpoint, Output
 
+import cold_start
+
 CACHE_PATH = "./models"
 BASE_MODEL = "stabilityai/stable-diffusion-xl-base-1.0"
 REPO = "ByteDance/SDXL-Lightning"
@@ -32,6 +34,8 @@ image = (
 
 
 # This runs once when the container first boots
+# Each phase is timed, see utils/cold_start for how to collect the metrics
+@cold_start.instrument_on_start
 def load_models():
     import torch
     from diffusers import StableDiffusionXLPipeline, UNet2DConditionModel
@@ -39,17 +43,25 @@ def load_models():
     from safetensors.torch import load_file
 
     # Load model
-    unet = UNet2DConditionModel.from_config(BASE_MODEL, subfolder="unet").to(
-        "cuda", torch.float16
-    )
-    unet.load_state_dict(load_file(hf_hub_download(REPO, CKPT)))
-    pipe = StableDiffusionXLPipeline.from_pretrained(
-        BASE_MODEL,
-        unet=unet,
-        torch_dtype=torch.float16,
-        variant="fp16",
-        safety_checker=None,
-    )
+    with cold_start.phase("download"):
+        ckpt_path = hf_hub_download(REPO, CKPT)
+    # Like the original loader, the UNet goes to the GPU before the checkpoint is
+    # read, and the checkpoint is deserialized straight onto the GPU, so host memory
+    # never holds the full-precision UNet and its weights at the same time
+    with cold_start.phase("device_transfer"):
+        unet = UNet2DConditionModel.from_config(BASE_MODEL, subfolder="unet").to(
+            "cuda", torch.float16
+        )
+    with cold_start.phase("deserialize"):
+        unet.load_state_dict(load_file(ckpt_path, device="cuda"))
+    with cold_start.phase("pipeline_load"):
+        pipe = StableDiffusionXLPipeline.from_pretrained(
+            BASE_MODEL,
+            unet=unet,
+            torch_dtype=torch.float16,
+            variant="fp16",
+            safety_checker=None,
+        )
 
     pipe.enable_sequential_cpu_offload()
     pipe.enable_attention_slicing("max")
@@ -78,7 +90,8 @@ def generate(context, prompt):
     )
 
     # Generate image
-    image = pipe(prompt, num_inference_steps=4, guidance_scale=0).images[0]
+    with cold_start.phase("first_inference", once=True):
+        image = pipe(prompt, num_inference_steps=4, guidance_scale=0).images[0]
 
     # Save image file
     output = Output.from_pil_image(image)
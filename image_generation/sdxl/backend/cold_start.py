@@ -0,0 +1 @@
+../../../utils/cold_start/cold_start.py
\ No newline at end of file
@@ -1,23 +1,57 @@
+import httpx
 import requests
 
+from sdxl_frontend.hedging import HedgePolicy
+
 BEAM_TOKEN = "YOUR_BEAM_TOKEN"
 BEAM_URL = "YOUR_BEAM_APP_URL"
 
+# Opt-in request hedging: if the endpoint has not responded after the
+# HEDGE_PERCENTILE of recent response times, a duplicate request is sent to the
+# next URL in HEDGE_URLS (or BEAM_URL again, which Beam can route to another
+# container) and whichever responds first is used.
+HEDGE_ENABLED = False
+HEDGE_URLS = []
+HEDGE_PERCENTILE = 95
+
+# Shared by every BeamService, so the delay and counters cover all requests
+hedge_policy = HedgePolicy(percentile=HEDGE_PERCENTILE, initial_delay=5.0, min_delay=0.1)
+
 
 class BeamService:
-    def __init__(self, prompt):
+    # One client for every request, so connections are reused instead of paying
+    # a new TCP and TLS handshake per attempt. It is created on, and only used
+    # from, the hedge policy's event loop.
+    _async_client = None
+
+    def __init__(self, prompt, hedge=None):
         self.url = BEAM_URL
         self.headers = {
             "Authorization": f"Bearer {BEAM_TOKEN}",
             "Content-Type": "application/json",
         }
         self.data = {"prompt": prompt}
+        self.hedge = HEDGE_ENABLED if hedge is None else hedge
 
-    def call_api(self):
-        response = requests.post(
-            self.url, headers=self.headers, json=self.data, stream=True
+    async def _post(self, url):
+        # The losing request is cancelled, which closes only its own connection
+        if BeamService._async_client is None:
+            BeamService._async_client = httpx.AsyncClient(timeout=None)
+        return await BeamService._async_client.post(
+            url, headers=self.headers, json=self.data
         )
 
+    def call_api(self):
+        if self.hedge:
+            hedge_url = HEDGE_URLS[0] if HEDGE_URLS else self.url
+            response = hedge_policy.run(
+                lambda: self._post(self.url), lambda: self._post(hedge_url)
+            )
+        else:
+            response = requests.post(
+                self.url, headers=self.headers, json=self.data, stream=True
+            )
+
         if response.status_code == 200:
             return response.json()
         else:
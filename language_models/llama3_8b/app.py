@@ -1,8 +1,12 @@
 from beam import endpoint, Image, Volume, env
 
+import cold_start
+import response_cache
+
 # This ensures that these packages are only loaded when the script is running remotely on Beam
 if env.is_remote():
     import torch
+    from huggingface_hub import snapshot_download
     from transformers import AutoModelForCausalLM, AutoTokenizer
 
 # Model parameters
@@ -19,24 +23,50 @@ EARLY_STOPPING = True
 
 BEAM_VOLUME_PATH = "./cached_models"
 
+# Repeated questions are answered from a cache instead of the GPU, see
+# utils/response_cache. To also reuse answers to near-identical questions, set a
+# cosine similarity threshold (e.g. 0.95) and add sentence-transformers to the image.
+SIMILARITY_THRESHOLD = None
+cache = response_cache.ResponseCache(
+    ttl=3600,
+    similarity_threshold=SIMILARITY_THRESHOLD,
+    # Deterministic responses are shared by every container through the volume
+    persist_dir=f"{BEAM_VOLUME_PATH}/response_cache",
+)
+
 
 # This runs once when the container first starts
+# Each phase is timed, see utils/cold_start for how to collect the metrics
+@cold_start.instrument_on_start
 def load_models():
-    tokenizer = AutoTokenizer.from_pretrained(
-        MODEL_NAME, 
-        cache_dir=BEAM_VOLUME_PATH,
-        padding_side='left'
-    )
-    tokenizer.pad_token = tokenizer.eos_token
-    model = AutoModelForCausalLM.from_pretrained(
-        MODEL_NAME, 
-        device_map="auto", 
-        torch_dtype=torch.float16, 
-        cache_dir=BEAM_VOLUME_PATH,
-        use_cache=True,
-        low_cpu_mem_usage=True
-    )
-    model.eval()
+    # Fetch the weights up front, so from_pretrained only reads from the cache
+    with cold_start.phase("download"):
+        snapshot_download(
+            MODEL_NAME,
+            cache_dir=BEAM_VOLUME_PATH,
+            allow_patterns=["*.json", "*.safetensors", "tokenizer*"],
+        )
+    with cold_start.phase("tokenizer"):
+        tokenizer = AutoTokenizer.from_pretrained(
+            MODEL_NAME, 
+            cache_dir=BEAM_VOLUME_PATH,
+            padding_side='left'
+        )
+        tokenizer.pad_token = tokenizer.eos_token
+    # With device_map="auto", weights are moved to the GPU as they are deserialized
+    with cold_start.phase("deserialize_and_device_transfer"):
+        model = AutoModelForCausalLM.from_pretrained(
+            MODEL_NAME, 
+            device_map="auto", 
+            torch_dtype=torch.float16, 
+            cache_dir=BEAM_VOLUME_PATH,
+            use_cache=True,
+            low_cpu_mem_usage=True
+        )
+        model.eval()
+    if SIMILARITY_THRESHOLD is not None:
+        with cold_start.phase("embedding_model"):
+            cache.embed = response_cache.sentence_transformer_embedder()
     return model, tokenizer
 
 
@@ -99,27 +129,38 @@ def generate_text(context, **inputs):
         "pad_token_id": tokenizer.pad_token_id,
     }
 
-    model_inputs_str = tokenizer.apply_chat_template(
-        messages, tokenize=False, add_generation_prompt=True
-    )
-    
-    tokenized_inputs = tokenizer(
-        model_inputs_str, 
-        return_tensors="pt", 
-        padding=True, 
-        truncation=True, 
-        max_length=2048
-    )
-    input_ids = tokenized_inputs["input_ids"].to("cuda")
-    attention_mask = tokenized_inputs["attention_mask"].to("cuda")
-    input_ids_length = input_ids.shape[-1]
-
-    with torch.no_grad():
-        outputs = model.generate(
-            input_ids=input_ids, 
-            attention_mask=attention_mask, 
-            **generate_args
+    # Temperature 0 means greedy decoding, whose output is the same every time
+    if generate_args["temperature"] == 0:
+        generate_args["do_sample"] = False
+        for arg in ("temperature", "top_p", "top_k"):
+            generate_args.pop(arg)
+
+    def generate():
+        model_inputs_str = tokenizer.apply_chat_template(
+            messages, tokenize=False, add_generation_prompt=True
         )
-        new_tokens = outputs[0][input_ids_length:]
-        output_text = tokenizer.decode(new_tokens, skip_special_tokens=True)
-        return {"output": output_text}
+
+        tokenized_inputs = tokenizer(
+            model_inputs_str,
+            return_tensors="pt",
+            padding=True,
+            truncation=True,
+            max_length=2048
+        )
+        input_ids = tokenized_inputs["input_ids"].to("cuda")
+        attention_mask = tokenized_inputs["attention_mask"].to("cuda")
+        input_ids_length = input_ids.shape[-1]
+
+        with torch.no_grad(), cold_start.phase("first_inference", once=True):
+            outputs = model.generate(
+                input_ids=input_ids,
+                attention_mask=attention_mask,
+                **generate_args
+            )
+            new_tokens = outputs[0][input_ids_length:]
+            output_text = tokenizer.decode(new_tokens, skip_special_tokens=True)
+            return {"output": output_text}
+
+    if not inputs.get("cache", True):
+        return generate()
+    return cache.get_or_compute(messages, generate_args, generate)
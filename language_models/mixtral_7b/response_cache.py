@@ -0,0 +1 @@
+../../utils/response_cache/response_cache.py
\ No newline at end of file
@@ -3,7 +3,12 @@ import os
 import time
 import slack_sdk
 import importlib
-from beam import schedule, Image
+from beam import schedule, Image, Volume
+
+# Persists data between scheduled runs, such as how long each test took
+RESULTS_PATH = "./results"
+TIMINGS_DB = f"{RESULTS_PATH}/timings.db"
+DEPLOYMENT_CACHE_FILE = f"{RESULTS_PATH}/deployments.json"
 
 
 def _create_config(token: str):
@@ -40,6 +45,7 @@ def _create_beta9_script():
         ["slack-sdk", "pytest", "requests", "backoff", "numpy", "paramiko"]
     )
     .add_commands(["mkdir ~/.beta9"]),
+    volumes=[Volume(name="integration-test-results", mount_path=RESULTS_PATH)],
 )
 def run_tests():
     _create_config(os.getenv("BEAM_AUTH_TOKEN"))
@@ -51,6 +57,9 @@ def run_tests():
 
     _create_beta9_script()
 
+    # Reuse deployments of examples that have not changed since the last run
+    os.environ.setdefault("BEAM_DEPLOYMENT_CACHE", DEPLOYMENT_CACHE_FILE)
+
     start_time = time.time()
     module = importlib.import_module("tests.light_test")
     module_funcs = [
@@ -59,33 +68,44 @@ def run_tests():
 
     tests = [func for func in module_funcs if func.__name__.startswith("test_")]
 
-    tests_index_failed = []
-    test_times = []
-    for i, test in enumerate(tests):
-        test_time_start = time.time()
-        try:
-            del os.environ[
-                "CONTAINER_ID"
-            ]  # This is so that beta9 cli commands is allowed to execute new functions in a worker
-            test()
-        except BaseException as e:
-            os.environ["CONTAINER_ID"] = container_id
-            tests_index_failed.append(i)
-            print(f"Test {test.__name__} failed with error: {e}")
-        finally:
-            os.environ["CONTAINER_ID"] = container_id
-            test_times.append(time.time() - test_time_start)
+    scheduler = importlib.import_module("tests.scheduler")
+    timing_history = importlib.import_module("tests.timing_history")
+    history = timing_history.TimingHistory(TIMINGS_DB)
+    durations = history.median_durations(tests)
+    max_workers = int(os.getenv("INTEGRATION_TEST_WORKERS", "8"))
+
+    # This is so that beta9 cli commands is allowed to execute new functions in a worker.
+    # The environment is shared by all test threads, so unset it once for the whole run
+    del os.environ["CONTAINER_ID"]
+    try:
+        tests_index_failed, test_times = scheduler.run_concurrently(
+            tests, durations=durations, max_workers=max_workers
+        )
+    finally:
+        os.environ["CONTAINER_ID"] = container_id
+
+    run_id = history.record_run(tests, tests_index_failed, test_times)
 
     total_time = time.time() - start_time
-    ship_results_to_slack(tests, tests_index_failed, test_times, total_time)
+    ship_results_to_slack(
+        tests,
+        tests_index_failed,
+        test_times,
+        total_time,
+        history=history,
+        run_id=run_id,
+    )
 
 
-def ship_results_to_slack(tests, test_index_failed, test_times, total_time):
+def ship_results_to_slack(
+    tests, test_index_failed, test_times, total_time, history=None, run_id=None
+):
     slack_url = os.getenv("SLACK_WEBHOOK_URL")
     print(f"Slack url: {slack_url}")
     total_time_str = seconds_to_readable(total_time)
 
     test_results_str = ""
+    regressions = []
     for i, test in enumerate(tests):
         name = test.__name__
         emoji = "✅"
@@ -95,8 +115,26 @@ def ship_results_to_slack(tests, test_index_failed, test_times, total_time):
 
         time_string = seconds_to_readable(test_times[i])
 
+        # Compare against earlier runs only, so this run does not skew its own baseline
+        if history is not None:
+            comparison = history.compare(name, test_times[i], before_run_id=run_id)
+            if comparison["median"] is not None:
+                time_string += (
+                    f" (median {seconds_to_readable(comparison['median'])},"
+                    f" p90 {seconds_to_readable(comparison['p90'])})"
+                )
+            if comparison["regression"] and i not in test_index_failed:
+                emoji = "🐢"
+                regressions.append(name)
+
         test_results_str += f"{emoji} {name}: {time_string}\n"
 
+    regressions_str = (
+        f"🐢 Slower than usual: {', '.join(regressions)}"
+        if regressions
+        else "No timing regressions"
+    )
+
     blocks = {
         "blocks": [
             {
@@ -109,6 +147,7 @@ def ship_results_to_slack(tests, test_index_failed, test_times, total_time):
             },
             {"type": "divider"},
             {"type": "section", "text": {"type": "mrkdwn", "text": test_results_str}},
+            {"type": "section", "text": {"type": "mrkdwn", "text": regressions_str}},
             {"type": "divider"},
             {
                 "type": "section",
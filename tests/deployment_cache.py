@@ -0,0 +1,117 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from pathlib import Path
+
+IGNORED_DIRS = {"__pycache__", ".pytest_cache", ".venv", "venv", "node_modules"}
+
+
+def hash_app_dir(app_dir, entrypoint):
+    # Hashes every file the deployment would be built from, plus the entrypoint,
+    # so any change to the example forces a fresh deploy
+    digest = hashlib.sha256(entrypoint.encode())
+    for root, dirs, files in os.walk(app_dir):
+        dirs[:] = sorted(
+            d for d in dirs if d not in IGNORED_DIRS and not d.startswith(".")
+        )
+        for file_name in sorted(files):
+            if file_name.endswith(".pyc"):
+                continue
+            path = Path(root) / file_name
+            digest.update(path.relative_to(app_dir).as_posix().encode())
+            digest.update(path.read_bytes())
+    return digest.hexdigest()
+
+
+def parse_deploy_output(stdout):
+    """Pulls the endpoint URL and example request body out of `beam deploy` output."""
+    url_match = re.search(r"curl -X POST '(https?://[^']+)'", stdout)
+    if not url_match:
+        return None
+    data_match = re.search(r"-d '(\{.*?\})'", stdout, re.DOTALL)
+    return url_match.group(1), data_match.group(1) if data_match else "{}"
+
+
+def parse_endpoint_url(url):
+    """Returns the deployment name and version in an endpoint URL, like .../name/v3."""
+    match = re.search(r"/endpoint/([^/]+)/v(\d+)/?$", url)
+    if not match:
+        return None
+    return match.group(1), int(match.group(2))
+
+
+def deploy_output(url, data, auth_token):
+    # The same shape `beam deploy` prints, so tests can't tell a reused deployment
+    # from a fresh one
+    return (
+        f"=> Deployed 🎉\n"
+        f"=> Invocation details\n"
+        f"curl -X POST '{url}' \\\n"
+        f"-H 'Connection: keep-alive' \\\n"
+        f"-H 'Content-Type: application/json' \\\n"
+        f"-H 'Authorization: Bearer {auth_token}' \\\n"
+        f"-d '{data}'\n"
+    )
+
+
+class DeploymentCache:
+    """
+    Remembers which source hash each deployment was built from, along with its id
+    and endpoint URL, so unchanged examples can reuse their deployment. The auth
+    token is never written to the cache file, the deploy output is rebuilt with the
+    current token on read.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+
+    def _read(self):
+        if not self.path.exists():
+            return {}
+        try:
+            with open(self.path) as f:
+                entries = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"Ignoring unreadable deployment cache {self.path}: {e}")
+            return {}
+        # Older caches stored the raw deploy output, token included, drop them
+        return {name: entry for name, entry in entries.items() if "url" in entry}
+
+    def _write(self, entries):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "w") as f:
+            json.dump(entries, f, indent=2, sort_keys=True)
+
+    def get(self, deployment_name, source_hash, auth_token):
+        """Returns `(deployment_id, deploy output)`, or None if the sources changed."""
+        with self._lock:
+            entry = self._read().get(deployment_name)
+        if entry and entry["source_hash"] == source_hash:
+            output = deploy_output(entry["url"], entry["data"], auth_token)
+            return entry["deployment_id"], output
+        return None
+
+    def put(self, deployment_name, source_hash, deployment_id, stdout):
+        parsed = parse_deploy_output(stdout)
+        if parsed is None:
+            return
+        url, data = parsed
+        with self._lock:
+            entries = self._read()
+            entries[deployment_name] = {
+                "name": deployment_name,
+                "source_hash": source_hash,
+                "deployment_id": deployment_id,
+                "url": url,
+                "data": data,
+            }
+            self._write(entries)
+
+    def evict(self, deployment_name):
+        with self._lock:
+            entries = self._read()
+            if entries.pop(deployment_name, None) is not None:
+                self._write(entries)
@@ -0,0 +1,263 @@
+"""
+Offline stand-in for the Beam gateway used by light_test.py.
+
+It implements the handful of HTTP routes the integration tests talk to and runs
+the example handlers in-process, so the suite can be timed and profiled without
+live infrastructure:
+
+    BEAM_FAKE_GATEWAY=1 pytest tests/light_test.py --durations=0
+
+Tests that run remote functions (`python app.py`) still need a real gateway and
+are skipped in this mode.
+"""
+
+import importlib.util
+import inspect
+import json
+import os
+import re
+import threading
+import urllib.request
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from types import SimpleNamespace
+from urllib.parse import parse_qs, urlparse
+
+
+def load_handler(app_dir, entrypoint, auth_token="fake-token"):
+    """Imports `file.py:name` from the app directory, returning the module and handler."""
+    # Beam's decorators look up a config context on import, so without a token
+    # they exit with "Not signed in". BEAM_TOKEN is read when beam is first
+    # imported, BETA9_TOKEN on every lookup.
+    os.environ.setdefault("BEAM_TOKEN", auth_token)
+    os.environ.setdefault("BETA9_TOKEN", os.environ["BEAM_TOKEN"])
+
+    file_name, handler_name = entrypoint.split(":")
+    app_path = Path(app_dir) / file_name
+    module_name = f"fake_gateway_{Path(app_dir).name}_{uuid.uuid4().hex[:8]}"
+
+    spec = importlib.util.spec_from_file_location(module_name, app_path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module, getattr(module, handler_name)
+
+
+class FakeDeployment:
+    def __init__(self, name, version, module, handler):
+        self.external_id = str(uuid.uuid4())
+        self.name = name
+        self.version = version
+        self.handler = handler
+
+        # Beam decorators wrap the user function, keep a reference to the original
+        self.func = getattr(handler, "func", handler)
+        parent = getattr(handler, "parent", None)
+        self.is_task_queue = type(parent).__name__ == "TaskQueue"
+        self.on_start = getattr(parent, "on_start", None) or None
+        if isinstance(self.on_start, str):
+            # Beam stores on_start as a "module:function" reference
+            self.on_start = getattr(module, self.on_start.split(":")[-1])
+        self._on_start_value = None
+        self._started = False
+        self._lock = threading.Lock()
+
+    def invoke(self, inputs):
+        with self._lock:
+            if not self._started:
+                if self.on_start is not None:
+                    self._on_start_value = self.on_start()
+                self._started = True
+
+        params = list(inspect.signature(self.func).parameters)
+        if params and params[0] == "context":
+            context = SimpleNamespace(on_start_value=self._on_start_value)
+            return self.func(context, **inputs)
+        return self.func(**inputs)
+
+    def to_dict(self):
+        return {
+            "external_id": self.external_id,
+            "name": self.name,
+            "version": self.version,
+        }
+
+
+class FakeGateway:
+    def __init__(self, host="127.0.0.1", port=0, auth_token="fake-token"):
+        self.auth_token = auth_token
+        self.deployments = {}
+        self.tasks = {}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def deploy(self, app_dir, entrypoint, name):
+        """
+        Registers the handler and returns what `beam deploy` would print, including
+        the curl command that light_test.py scrapes.
+        """
+        module, handler = load_handler(app_dir, entrypoint, self.auth_token)
+        with self._lock:
+            # Like Beam, every deploy of a name gets the next version
+            version = 1 + max(
+                (d.version for d in self.deployments.values() if d.name == name),
+                default=0,
+            )
+            deployment = FakeDeployment(name, version, module, handler)
+            self.deployments[deployment.external_id] = deployment
+
+        return (
+            f"=> Deployed 🎉\n"
+            f"=> Invocation details\n"
+            f"curl -X POST '{self.url}/endpoint/{name}/v{deployment.version}' \\\n"
+            f"-H 'Connection: keep-alive' \\\n"
+            f"-H 'Content-Type: application/json' \\\n"
+            f"-H 'Authorization: Bearer {self.auth_token}' \\\n"
+            f"-d '{{}}'\n"
+        )
+
+    def _find_deployments(self, name):
+        with self._lock:
+            return [d for d in self.deployments.values() if d.name == name]
+
+    def _run_task(self, task_id, deployment, inputs):
+        # Like the real task runner, a callback_url input overrides the decorator's
+        callback_url = inputs.pop("callback_url", None)
+
+        self.tasks[task_id]["status"] = "RUNNING"
+        try:
+            self.tasks[task_id]["outputs"] = deployment.invoke(inputs)
+            self.tasks[task_id]["status"] = "COMPLETE"
+        except Exception as e:
+            self.tasks[task_id]["status"] = "ERROR"
+            self.tasks[task_id]["error"] = str(e)
+
+        if callback_url:
+            self._send_callback(callback_url, self.tasks[task_id])
+
+    def _send_callback(self, callback_url, task):
+        request = urllib.request.Request(
+            callback_url,
+            data=json.dumps({"data": task.get("outputs")}).encode(),
+            headers={
+                "Content-Type": "application/json",
+                "X-Task-ID": task["id"],
+                "X-Task-Status": task["status"],
+            },
+            method="POST",
+        )
+        try:
+            urllib.request.urlopen(request, timeout=5).close()
+        except OSError as e:
+            print(f"Fake gateway callback to {callback_url} failed: {e}")
+
+    def _make_handler(self):
+        gateway = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, status, body):
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def _read_json(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                if not length:
+                    return {}
+                return json.loads(self.rfile.read(length))
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                query = parse_qs(url.query)
+
+                if re.fullmatch(r"/api/v1/deployment/[^/]+/?", url.path):
+                    name = query.get("name", [""])[0]
+                    limit = int(query.get("limit", ["100"])[0])
+                    offset = int(query.get("offset", ["0"])[0])
+                    deployments = gateway._find_deployments(name)[offset : offset + limit]
+                    return self._send_json(200, [d.to_dict() for d in deployments])
+
+                if match := re.fullmatch(r"/v2/task/([^/]+)/?", url.path):
+                    task = gateway.tasks.get(match.group(1))
+                    if task is None:
+                        return self._send_json(404, {"error": "task not found"})
+                    return self._send_json(200, task)
+
+                self._send_json(404, {"error": f"unknown route {url.path}"})
+
+            def do_DELETE(self):
+                url = urlparse(self.path)
+                if match := re.fullmatch(r"/api/v1/deployment/[^/]+/([^/]+)/?", url.path):
+                    with gateway._lock:
+                        deployment = gateway.deployments.pop(match.group(1), None)
+                    if deployment is None:
+                        return self._send_json(404, {"error": "deployment not found"})
+                    return self._send_json(200, deployment.to_dict())
+
+                self._send_json(404, {"error": f"unknown route {url.path}"})
+
+            def do_POST(self):
+                url = urlparse(self.path)
+                match = re.fullmatch(r"/endpoint/([^/]+)/v(\d+)/?", url.path)
+                if not match:
+                    return self._send_json(404, {"error": f"unknown route {url.path}"})
+
+                version = int(match.group(2))
+                deployments = [
+                    d
+                    for d in gateway._find_deployments(match.group(1))
+                    if d.version == version
+                ]
+                if not deployments:
+                    return self._send_json(404, {"error": "deployment not found"})
+                deployment = deployments[0]
+
+                try:
+                    inputs = self._read_json()
+                except json.JSONDecodeError as e:
+                    return self._send_json(400, {"error": str(e)})
+
+                if deployment.is_task_queue:
+                    task_id = str(uuid.uuid4())
+                    gateway.tasks[task_id] = {"id": task_id, "status": "PENDING"}
+                    threading.Thread(
+                        target=gateway._run_task,
+                        args=(task_id, deployment, inputs),
+                        daemon=True,
+                    ).start()
+                    return self._send_json(200, {"task_id": task_id})
+
+                try:
+                    return self._send_json(200, deployment.invoke(inputs))
+                except Exception as e:
+                    return self._send_json(500, {"error": str(e)})
+
+        return Handler
+
+
+if __name__ == "__main__":
+    gateway = FakeGateway(port=8765)
+    print(f"Fake gateway listening on {gateway.url}")
+    gateway._server.serve_forever()
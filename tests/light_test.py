@@ -1,15 +1,54 @@
+import contextlib
 import subprocess
 import pytest
 import os
 import re
 import json
+import threading
+import time
 import requests
-import backoff
+from concurrent.futures import ThreadPoolExecutor
+
+from tests.task_waiter import TaskWaiter
 
 WORKSPACE_ID = os.getenv("BEAM_WORKSPACE_ID")
 AUTH_TOKEN = os.getenv("BEAM_AUTH_TOKEN")
 GATEWAY_HOST = os.getenv("BEAM_GATEWAY_HOST", "app.beam.cloud")
 API_HOST = os.getenv("BEAM_API_HOST", "api.beam.cloud")
+GATEWAY_URL = f"https://{GATEWAY_HOST}"
+API_URL = f"https://{API_HOST}"
+
+# Set BEAM_FAKE_GATEWAY=1 to run the suite offline against tests/fake_gateway.py
+FAKE_GATEWAY = None
+if os.getenv("BEAM_FAKE_GATEWAY"):
+    from tests.fake_gateway import FakeGateway
+
+    FAKE_GATEWAY = FakeGateway().start()
+    WORKSPACE_ID = WORKSPACE_ID or "fake-workspace"
+    AUTH_TOKEN = FAKE_GATEWAY.auth_token
+    GATEWAY_URL = API_URL = FAKE_GATEWAY.url
+
+# Set BEAM_DEPLOYMENT_CACHE to a file path to reuse deployments of unchanged examples
+DEPLOYMENT_CACHE = None
+if os.getenv("BEAM_DEPLOYMENT_CACHE"):
+    from tests.deployment_cache import (
+        DeploymentCache,
+        hash_app_dir,
+        parse_deploy_output,
+        parse_endpoint_url,
+    )
+
+    DEPLOYMENT_CACHE = DeploymentCache(os.getenv("BEAM_DEPLOYMENT_CACHE"))
+
+requires_gateway = pytest.mark.skipif(
+    FAKE_GATEWAY is not None,
+    reason="runs remote functions, which the fake gateway does not support",
+)
+
+# Bound on concurrent deletes, and the size of the shared connection pool
+TEARDOWN_WORKERS = int(os.getenv("BEAM_TEARDOWN_WORKERS", "8"))
+_api_session = None
+_api_session_lock = threading.Lock()
 
 curl_pattern = r"(curl -X POST.+\n(\s*-H .+\n)*\s*-d \'{.*?}\')"
 
@@ -37,50 +76,189 @@ def parse_curl(curl_command):
     return prepared_req
 
 
-def delete_deployments(deployment_name):
-    res = requests.get(
-        f"https://{GATEWAY_HOST}/api/v1/deployment/{WORKSPACE_ID}?name={deployment_name}&limit={100}",
-        headers={
-            "Content-Type": "application/json",
-            "Authorization": "Bearer " + AUTH_TOKEN,
-        },
-    )
-
-    res = json.loads(res.text)
-    if res:
-        for d in res:
-            d_id = d["external_id"]
-            requests.delete(
-                f"https://{GATEWAY_HOST}/api/v1/deployment/{WORKSPACE_ID}/{d_id}",
-                headers={
+def api_session():
+    # One keep-alive session shared by all test threads, with enough pooled
+    # connections for concurrent teardowns
+    global _api_session
+    with _api_session_lock:
+        if _api_session is None:
+            adapter = requests.adapters.HTTPAdapter(
+                pool_connections=TEARDOWN_WORKERS, pool_maxsize=TEARDOWN_WORKERS
+            )
+            _api_session = requests.Session()
+            _api_session.mount("http://", adapter)
+            _api_session.mount("https://", adapter)
+            _api_session.headers.update(
+                {
                     "Content-Type": "application/json",
                     "Authorization": "Bearer " + AUTH_TOKEN,
-                },
+                }
             )
+        return _api_session
+
+
+def list_deployments(deployment_name, page_size=100):
+    deployments = []
+    seen = set()
+    offset = 0
+    while True:
+        res = api_session().get(
+            f"{GATEWAY_URL}/api/v1/deployment/{WORKSPACE_ID}",
+            params={"name": deployment_name, "limit": page_size, "offset": offset},
+        )
+        page = json.loads(res.text) or []
+
+        # Stop if the gateway ignores the offset and returns the same page again
+        new_deployments = [d for d in page if d["external_id"] not in seen]
+        if not new_deployments:
+            break
+        deployments.extend(new_deployments)
+        seen.update(d["external_id"] for d in new_deployments)
+
+        if len(page) < page_size:
+            break
+        offset += len(page)
+
+    return deployments
+
+
+def delete_deployments(deployment_name, max_workers=TEARDOWN_WORKERS):
+    start_time = time.time()
+    deployments = list_deployments(deployment_name)
+    if not deployments:
+        return 0
+
+    def delete(d):
+        res = api_session().delete(
+            f"{GATEWAY_URL}/api/v1/deployment/{WORKSPACE_ID}/{d['external_id']}"
+        )
+        return res.ok
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(deployments))) as executor:
+        deleted = sum(executor.map(delete, deployments))
+
+    print(
+        f"Deleted {deleted}/{len(deployments)} deployments named {deployment_name} "
+        f"in {time.time() - start_time:.2f}s"
+    )
+    return deleted
+
 
 def prepare_app_path(directory):
+    # Returns the app directory instead of chdir-ing into it, since the working
+    # directory is process-global and tests may run concurrently in threads
     file_name = "app.py"
     current_dir = os.path.dirname(os.path.abspath(__file__))
     parent_dir = os.path.dirname(current_dir)
     app_path = os.path.join(parent_dir, directory, file_name)
-    os.chdir(os.path.dirname(app_path))
+    app_dir = os.path.dirname(app_path)
     test_name = os.path.join(directory, file_name).replace("\\", "/")
-    return test_name, app_path, current_dir
+    return test_name, app_path, app_dir
+
+
+def deploy_app(app_dir, entrypoint, deployment_name):
+    if FAKE_GATEWAY is not None:
+        stdout = FAKE_GATEWAY.deploy(app_dir, entrypoint, deployment_name)
+        return subprocess.CompletedProcess(
+            args=[], returncode=0, stdout=stdout, stderr=""
+        )
+
+    command = [
+        "beam",
+        "deploy",
+        entrypoint,
+        "--name",
+        deployment_name,
+    ]
+    return subprocess.run(command, capture_output=True, text=True, cwd=app_dir)
+
+
+def find_deployment_id(deployment_name, stdout):
+    # The endpoint URL in the deploy output ends with the version just deployed
+    parsed = parse_deploy_output(stdout)
+    endpoint = parse_endpoint_url(parsed[0]) if parsed else None
+    if endpoint is None:
+        return None
+    name, version = endpoint
+    for d in list_deployments(deployment_name):
+        if d.get("name") == name and d.get("version") == version:
+            return d["external_id"]
+    return None
+
+
+@contextlib.contextmanager
+def deployment(app_dir, entrypoint, deployment_name):
+    """
+    Deploys the app and yields the deploy result, tearing the deployment down
+    afterwards. When the deployment cache is enabled, an existing deployment built
+    from the same sources is reused and kept around for the next run, unless the
+    test fails.
+    """
+    try:
+        if DEPLOYMENT_CACHE is None:
+            yield deploy_app(app_dir, entrypoint, deployment_name)
+        else:
+            source_hash = hash_app_dir(app_dir, entrypoint)
+            cached = DEPLOYMENT_CACHE.get(deployment_name, source_hash, AUTH_TOKEN)
+            deployment_ids = [
+                d["external_id"] for d in list_deployments(deployment_name)
+            ]
+            if cached is not None and cached[0] in deployment_ids:
+                print(f"Reusing cached deployment {deployment_name}")
+                yield subprocess.CompletedProcess(
+                    args=[], returncode=0, stdout=cached[1], stderr=""
+                )
+            else:
+                # The sources changed, so any older deployment is stale
+                delete_deployments(deployment_name)
+                result = deploy_app(app_dir, entrypoint, deployment_name)
+                deployment_id = (
+                    find_deployment_id(deployment_name, result.stdout)
+                    if result.returncode == 0
+                    else None
+                )
+                if deployment_id is not None:
+                    DEPLOYMENT_CACHE.put(
+                        deployment_name, source_hash, deployment_id, result.stdout
+                    )
+                yield result
+    except BaseException:
+        if DEPLOYMENT_CACHE is not None:
+            DEPLOYMENT_CACHE.evict(deployment_name)
+        delete_deployments(deployment_name)
+        raise
+
+    if DEPLOYMENT_CACHE is None:
+        delete_deployments(deployment_name)
+
+
+def task_waiter():
+    # Task results can only be pushed to us when the receiver is reachable from the
+    # workers: always with the fake gateway, otherwise only through a public URL
+    public_url = os.getenv("BEAM_TASK_CALLBACK_URL")
+    if FAKE_GATEWAY is None and not public_url:
+        return TaskWaiter(API_URL, AUTH_TOKEN, callbacks=False)
+
+    return TaskWaiter(
+        API_URL,
+        AUTH_TOKEN,
+        callback_host="127.0.0.1" if FAKE_GATEWAY is not None else "0.0.0.0",
+        callback_port=int(os.getenv("BEAM_TASK_CALLBACK_PORT", "0")),
+        callback_public_url=public_url,
+    )
+
+
+def to_deployment_name(test_name):
+    # Every example is called app.py, so name deployments after their directory
+    # to keep concurrently running tests from deleting each other's deployments
+    return test_name.split("/")[0].replace("_", "-")
 
 def test_quickstart():
     dir_name = "quickstart"
-    test_name, _, current_dir = prepare_app_path(dir_name)
-    deployment_name = test_name.split("/")[-1]
+    test_name, _, app_dir = prepare_app_path(dir_name)
+    deployment_name = to_deployment_name(test_name)
 
-    try:
-        command = [
-            "beam",
-            "deploy",
-            "app.py:predict",
-            "--name",
-            deployment_name,
-        ]
-        result = subprocess.run(command, capture_output=True, text=True)
+    with deployment(app_dir, "app.py:predict", deployment_name) as result:
         assert result.returncode == 0, f"{test_name} failed with error: {result.stderr}"
         assert "Deployed" in result.stdout, f"{test_name} failed to deploy"
 
@@ -94,25 +272,14 @@ def test_quickstart():
                 response.status_code == 200
             ), f"{test_name} request to endpoint failed with status code: {response.status_code}"
             assert "result" in response.text, f"{test_name} unexpected response"
-    finally:
-        delete_deployments(deployment_name)
-        os.chdir(current_dir)
 
 
 def test_custom_image():
     dir_name = "custom_images"
-    test_name, _, current_dir = prepare_app_path(dir_name)
-    deployment_name = test_name.split("/")[-1]
+    test_name, _, app_dir = prepare_app_path(dir_name)
+    deployment_name = to_deployment_name(test_name)
 
-    try:
-        command = [
-            "beam",
-            "deploy",
-            "app.py:handler",
-            "--name",
-            deployment_name,
-        ]
-        result = subprocess.run(command, capture_output=True, text=True)
+    with deployment(app_dir, "app.py:handler", deployment_name) as result:
         assert result.returncode == 0, f"{test_name} failed with error: {result.stderr}"
         assert "Deployed" in result.stdout, f"{test_name} failed to deploy"
         curl_pattern = r"(curl -X POST.+\n(\s*-H .+\n)*\s*-d \'{.*?}\')"
@@ -128,24 +295,12 @@ def test_custom_image():
             ), f"{test_name} request to endpoint failed with status code: {response.status_code}"
             assert "torch_version" in response.text, f"{test_name} torch not found in output"
 
-    finally:
-        delete_deployments(deployment_name)
-        os.chdir(current_dir)
-
 
 def test_gpu_acceleration():
-    test_name, _, current_dir = prepare_app_path("gpu_acceleration")
-    deployment_name = test_name.split("/")[-1]
+    test_name, _, app_dir = prepare_app_path("gpu_acceleration")
+    deployment_name = to_deployment_name(test_name)
 
-    try:
-        command = [
-            "beam",
-            "deploy",
-            "app.py:handler",
-            "--name",
-            deployment_name,
-        ]
-        result = subprocess.run(command, capture_output=True, text=True)
+    with deployment(app_dir, "app.py:handler", deployment_name) as result:
         assert result.returncode == 0, f"{test_name} failed with error: {result.stderr}"
         assert "Deployed" in result.stdout, f"{test_name} failed to deploy"
         curl_pattern = r"(curl -X POST.+\n(\s*-H .+\n)*\s*-d \'{.*?}\')"
@@ -163,39 +318,26 @@ def test_gpu_acceleration():
                 "This container has a GPU attached" in response.text
             ), f"{test_name} GPU not found in output"
 
-    finally:
-        delete_deployments(deployment_name)
-        os.chdir(current_dir)
-
 
+@requires_gateway
 def test_using_secrets():
-    test_name, app_path, current_dir = prepare_app_path("secrets")
+    test_name, app_path, app_dir = prepare_app_path("secrets")
 
-    try:
-        result = subprocess.run(["python", app_path], capture_output=True, text=True)
-        assert result.returncode == 0, f"{test_name} failed with error: {result.stderr}"
-        assert (
-            "Function complete" in result.stdout
-        ), f"{test_name} function did not complete"
-        assert "secret" in result.stdout, f"{test_name} no sum in output"
-
-    finally:
-        os.chdir(current_dir)
+    result = subprocess.run(
+        ["python", app_path], capture_output=True, text=True, cwd=app_dir
+    )
+    assert result.returncode == 0, f"{test_name} failed with error: {result.stderr}"
+    assert (
+        "Function complete" in result.stdout
+    ), f"{test_name} function did not complete"
+    assert "secret" in result.stdout, f"{test_name} no sum in output"
 
 
 def test_creating_endpoint():
-    test_name, _, current_dir = prepare_app_path("endpoints")
-    deployment_name = test_name.split("/")[-1]
+    test_name, _, app_dir = prepare_app_path("endpoints")
+    deployment_name = to_deployment_name(test_name)
 
-    try:
-        command = [
-            "beam",
-            "deploy",
-            "app.py:multiply",
-            "--name",
-            deployment_name,
-        ]
-        result = subprocess.run(command, capture_output=True, text=True)
+    with deployment(app_dir, "app.py:multiply", deployment_name) as result:
         assert result.returncode == 0, f"{test_name} failed with error: {result.stderr}"
         assert "Deployed" in result.stdout, f"{test_name} failed to deploy"
         curl_pattern = r"(curl -X POST.+\n(\s*-H .+\n)*\s*-d \'{.*?}\')"
@@ -212,24 +354,12 @@ def test_creating_endpoint():
             ), f"{test_name} request to endpoint failed with status code: {response.status_code}"
             assert "result" in response.text, f"{test_name} result not found in output"
 
-    finally:
-        delete_deployments(deployment_name)
-        os.chdir(current_dir)
-
 
 def test_keep_warm():
-    test_name, _, current_dir = prepare_app_path("keep_warm")
-    deployment_name = test_name.split("/")[-1]
+    test_name, _, app_dir = prepare_app_path("keep_warm")
+    deployment_name = to_deployment_name(test_name)
 
-    try:
-        command = [
-            "beam",
-            "deploy",
-            "app.py:handler",
-            "--name",
-            deployment_name,
-        ]
-        result = subprocess.run(command, capture_output=True, text=True)
+    with deployment(app_dir, "app.py:handler", deployment_name) as result:
         assert result.returncode == 0, f"{test_name} failed with error: {result.stderr}"
         assert "Deployed" in result.stdout, f"{test_name} failed to deploy"
         curl_pattern = r"(curl -X POST.+\n(\s*-H .+\n)*\s*-d \'{.*?}\')"
@@ -245,24 +375,12 @@ def test_keep_warm():
             ), f"{test_name} request to endpoint failed with status code: {response.status_code}"
             assert "warm" in response.text, f"{test_name} warm not found in output"
 
-    finally:
-        delete_deployments(deployment_name)
-        os.chdir(current_dir)
-
 
 def test_preload_models():
-    test_name, _, current_dir = prepare_app_path("preload_models")
-    deployment_name = test_name.split("/")[-1]
+    test_name, _, app_dir = prepare_app_path("preload_models")
+    deployment_name = to_deployment_name(test_name)
 
-    try:
-        command = [
-            "beam",
-            "deploy",
-            "app.py:predict",
-            "--name",
-            deployment_name,
-        ]
-        result = subprocess.run(command, capture_output=True, text=True)
+    with deployment(app_dir, "app.py:predict", deployment_name) as result:
         assert result.returncode == 0, f"{test_name} failed with error: {result.stderr}"
         assert "Deployed" in result.stdout, f"{test_name} failed to deploy"
         curl_pattern = r"(curl -X POST.+\n(\s*-H .+\n)*\s*-d \'{.*?}\')"
@@ -290,24 +408,12 @@ def test_preload_models():
                 if retries > 3:
                     raise e
 
-    finally:
-        delete_deployments(deployment_name)
-        os.chdir(current_dir)
-
 
 def test_task_queue():
-    test_name, _, current_dir = prepare_app_path("task_queues")
-    deployment_name = test_name.split("/")[-1]
+    test_name, _, app_dir = prepare_app_path("task_queues")
+    deployment_name = to_deployment_name(test_name)
 
-    try:
-        command = [
-            "beam",
-            "deploy",
-            "app.py:multiply",
-            "--name",
-            deployment_name,
-        ]
-        result = subprocess.run(command, capture_output=True, text=True)
+    with deployment(app_dir, "app.py:multiply", deployment_name) as result:
         assert result.returncode == 0, f"{test_name} failed with error: {result.stderr}"
         assert "Deployed" in result.stdout, f"{test_name} failed to deploy"
         curl_pattern = r"(curl -X POST.+\n(\s*-H .+\n)*\s*-d \'{.*?}\')"
@@ -316,8 +422,9 @@ def test_task_queue():
         match = re.search(curl_pattern, result.stdout, re.DOTALL)
         assert match is not None, f"{test_name} no curl command found"
         r = parse_curl(match.group(0))
-        with requests.Session() as session:
-            r.prepare_body(json={"x": 2}, files=None, data=None)
+        with task_waiter() as waiter, requests.Session() as session:
+            r.prepare_body(json=waiter.with_callback({"x": 2}), files=None, data=None)
+            started_at = time.time()
             response = session.send(r)
             assert (
                 response.status_code == 200
@@ -327,136 +434,105 @@ def test_task_queue():
                 res["task_id"] is not None
             ), f"{test_name} did not get task id in response"
 
-
-            @backoff.on_predicate(backoff.expo, predicate=lambda x: x['status'] in ["PENDING", "RUNNING", "COMPLETED"] , max_tries=10)
-            def get_task_status(task_id, auth_token):
-                response = requests.get(
-                    f"https://{API_HOST}/v2/task/{task_id}/",
-                    headers={
-                        "Content-Type": "application/json",
-                        "Authorization": f"Bearer {auth_token}",
-                    },
-                )
-                response.raise_for_status()
-                return json.loads(response.text)
-
             try:
-                res = get_task_status(res['task_id'], AUTH_TOKEN)
-                assert res["status"] == "COMPLETE", f"{test_name} task did not complete successfully"
-            except requests.exceptions.RequestException as e:
-                assert False, f"{test_name} request to get task status failed: {str(e)}"
-
-    finally:
-        delete_deployments(deployment_name)
-        os.chdir(current_dir)
+                res = waiter.wait(res["task_id"], timeout=300, started_at=started_at)
+            except TimeoutError as e:
+                assert False, f"{test_name} task did not finish: {str(e)}"
+            assert res["status"] == "COMPLETE", f"{test_name} task did not complete successfully"
+            print(
+                f"{test_name} task completed in {res['latency']:.2f}s via {res['completed_via']}"
+            )
 
 
+@requires_gateway
 def test_task_callbacks():
-    test_name, app_path, current_dir = prepare_app_path("callbacks")
-
-    try:
-        command = ["python", app_path]
-        result = subprocess.run(command, capture_output=True, text=True)
-        assert result.returncode == 0, f"{test_name} failed with error: {result.stderr}"
-        assert (
-            "Function complete" in result.stdout
-        ), f"{test_name} function did not complete"
-        assert (
-            "Sending data to callback" in result.stdout
-        ), f"{test_name} failed to send data to callback"
-        assert (
-            "Callback request took" in result.stdout
-        ), f"{test_name} callback was not successful"
-
-    finally:
-        os.chdir(current_dir)
-
-
+    test_name, app_path, app_dir = prepare_app_path("callbacks")
+
+    command = ["python", app_path]
+    result = subprocess.run(command, capture_output=True, text=True, cwd=app_dir)
+    assert result.returncode == 0, f"{test_name} failed with error: {result.stderr}"
+    assert (
+        "Function complete" in result.stdout
+    ), f"{test_name} function did not complete"
+    assert (
+        "Sending data to callback" in result.stdout
+    ), f"{test_name} failed to send data to callback"
+    assert (
+        "Callback request took" in result.stdout
+    ), f"{test_name} callback was not successful"
+
+
+@requires_gateway
 def test_running_functions():
-    test_name, app_path, current_dir = prepare_app_path("functions")
+    test_name, app_path, app_dir = prepare_app_path("functions")
 
-    try:
-        command = ["python", app_path]
-        result = subprocess.run(command, capture_output=True, text=True)
-        assert result.returncode == 0, f"{test_name} failed with error: {result.stderr}"
-        assert (
-            "Function complete" in result.stdout
-        ), f"{test_name} function did not complete"
-        assert "{'sum': 285}" in result.stdout, f"{test_name} sum not found in output"
-        assert "{'sum': 14}" in result.stdout, f"{test_name} sum not found in output"
-
-    finally:
-        os.chdir(current_dir)
+    command = ["python", app_path]
+    result = subprocess.run(command, capture_output=True, text=True, cwd=app_dir)
+    assert result.returncode == 0, f"{test_name} failed with error: {result.stderr}"
+    assert (
+        "Function complete" in result.stdout
+    ), f"{test_name} function did not complete"
+    assert "{'sum': 285}" in result.stdout, f"{test_name} sum not found in output"
+    assert "{'sum': 14}" in result.stdout, f"{test_name} sum not found in output"
 
 
+@requires_gateway
 def test_scaling_out():
-    test_name, app_path, current_dir = prepare_app_path("scaling_out")
-
-    try:
-        command = ["python", app_path]
-        result = subprocess.run(command, capture_output=True, text=True)
-        assert result.returncode == 0, f"{test_name} failed with error: {result.stderr}"
-        assert (
-            "Function complete" in result.stdout
-        ), f"{test_name} function did not complete"
-        assert "result" in result.stdout, f"{test_name} result not found in output"
+    test_name, app_path, app_dir = prepare_app_path("scaling_out")
 
-    finally:
-        os.chdir(current_dir)
+    command = ["python", app_path]
+    result = subprocess.run(command, capture_output=True, text=True, cwd=app_dir)
+    assert result.returncode == 0, f"{test_name} failed with error: {result.stderr}"
+    assert (
+        "Function complete" in result.stdout
+    ), f"{test_name} function did not complete"
+    assert "result" in result.stdout, f"{test_name} result not found in output"
 
 
+@requires_gateway
 def test_sharing_state():
-    test_name, app_path, current_dir = prepare_app_path("sharing_state")
+    test_name, app_path, app_dir = prepare_app_path("sharing_state")
 
-    try:
-        command = ["python", app_path]
-        result = subprocess.run(command, capture_output=True, text=True)
-        assert result.returncode == 0, f"{test_name} failed with error: {result.stderr}"
-        assert (
-            "Function complete" in result.stdout
-        ), f"{test_name} function did not complete"
-        assert "eli" in result.stdout, f"{test_name} local pop not found in output"
-        assert "daniel" in result.stdout, f"{test_name} remote pop not found in output"
-
-    finally:
-        os.chdir(current_dir)
+    command = ["python", app_path]
+    result = subprocess.run(command, capture_output=True, text=True, cwd=app_dir)
+    assert result.returncode == 0, f"{test_name} failed with error: {result.stderr}"
+    assert (
+        "Function complete" in result.stdout
+    ), f"{test_name} function did not complete"
+    assert "eli" in result.stdout, f"{test_name} local pop not found in output"
+    assert "daniel" in result.stdout, f"{test_name} remote pop not found in output"
 
 
+@requires_gateway
 def test_volume_use():
-    test_name, app_path, current_dir = prepare_app_path("volumes")
+    test_name, app_path, app_dir = prepare_app_path("volumes")
 
-    try:
-        command = ["python", app_path]
-        result = subprocess.run(command, capture_output=True, text=True)
-        assert result.returncode == 0, f"{test_name} failed with error: {result.stderr}"
-        assert (
-            "Function complete" in result.stdout
-        ), f"{test_name} function did not complete"
-        assert (
-            "On the volume!" in result.stdout
-        ), f"{test_name} On the volume not found in output"
-
-    finally:
-        os.chdir(current_dir)
+    command = ["python", app_path]
+    result = subprocess.run(command, capture_output=True, text=True, cwd=app_dir)
+    assert result.returncode == 0, f"{test_name} failed with error: {result.stderr}"
+    assert (
+        "Function complete" in result.stdout
+    ), f"{test_name} function did not complete"
+    assert (
+        "On the volume!" in result.stdout
+    ), f"{test_name} On the volume not found in output"
 
 
+@requires_gateway
 def test_outputs():
-    test_name, app_path, current_dir = prepare_app_path("outputs")
+    test_name, app_path, app_dir = prepare_app_path("outputs")
+
+    command = ["python", app_path]
+    result = subprocess.run(command, capture_output=True, text=True, cwd=app_dir)
+    assert result.returncode == 0, f"{test_name} failed with error: {result.stderr}"
+    assert (
+        "Function complete" in result.stdout
+    ), f"{test_name} function did not complete"
+    assert "Output ID" in result.stdout, f"{test_name} failed to find output ID"
+    assert (
+        "Output Exists: True" in result.stdout
+    ), f"{test_name} failed to confirm output exists"
 
-    try:
-        command = ["python", app_path]
-        result = subprocess.run(command, capture_output=True, text=True)
-        assert result.returncode == 0, f"{test_name} failed with error: {result.stderr}"
-        assert (
-            "Function complete" in result.stdout
-        ), f"{test_name} function did not complete"
-        assert "Output ID" in result.stdout, f"{test_name} failed to find output ID"
-        assert (
-            "Output Exists: True" in result.stdout
-        ), f"{test_name} failed to confirm output exists"
-
-    finally:
-        os.chdir(current_dir)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,46 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+def order_longest_first(tests, durations):
+    # Tests without a recorded duration go first, since they could be the longest
+    def sort_key(test):
+        duration = durations.get(test.__name__)
+        return (duration is not None, -(duration or 0))
+
+    return sorted(tests, key=sort_key)
+
+
+def _timed_run(test):
+    test_time_start = time.time()
+    try:
+        test()
+        return None, time.time() - test_time_start
+    except BaseException as e:
+        return e, time.time() - test_time_start
+
+
+def run_concurrently(tests, durations=None, max_workers=8):
+    """
+    Runs tests in a thread pool, submitting the longest ones first so the total
+    wall time approaches that of the single slowest test.
+
+    Returns the indexes of the failed tests and the time each test took, both in
+    the order of `tests`.
+    """
+    ordered = order_longest_first(tests, durations or {})
+    print(f"Running {len(tests)} tests with {max_workers} workers")
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {test: executor.submit(_timed_run, test) for test in ordered}
+
+    tests_index_failed = []
+    test_times = []
+    for i, test in enumerate(tests):
+        error, test_time = futures[test].result()
+        if error is not None:
+            tests_index_failed.append(i)
+            print(f"Test {test.__name__} failed with error: {error}")
+        test_times.append(test_time)
+
+    return tests_index_failed, test_times
@@ -0,0 +1,273 @@
+"""
+Waits for task queue tasks to finish.
+
+Results are pushed to a local callback receiver, using the per-request
+`callback_url` that Beam's task runner honors (the same mechanism as
+callbacks/app.py). Tasks whose callback never arrives, for example because the
+receiver is not reachable from the workers, are resolved by polling
+`/v2/task/{id}/` on an adaptive interval. Any number of tasks can be awaited at
+once, which makes it usable for measuring end-to-end latency under load.
+"""
+
+import json
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures import wait as wait_futures
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+TERMINAL_STATUSES = {"COMPLETE", "ERROR", "CANCELLED", "TIMEOUT", "EXPIRED"}
+
+
+class _PendingTask:
+    def __init__(self, task_id, started_at, poll_interval):
+        self.task_id = task_id
+        self.started_at = started_at
+        self.future = Future()
+        self.poll_interval = poll_interval
+        self.next_poll_at = started_at + poll_interval
+
+
+class TaskWaiter:
+    def __init__(
+        self,
+        api_url,
+        auth_token,
+        callbacks=True,
+        callback_host="127.0.0.1",
+        callback_port=0,
+        callback_public_url=None,
+        poll_interval=0.25,
+        max_poll_interval=5.0,
+        poll_workers=16,
+        retention=300.0,
+    ):
+        self.api_url = api_url
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+        # Seconds to remember results nobody has waited for yet, and tasks already
+        # resolved, whose second result (by callback or poll) is then ignored
+        self.retention = retention
+
+        self._pending = {}
+        # Task id -> (recorded at, ...), oldest first
+        self._early_results = OrderedDict()
+        self._resolved = OrderedDict()
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._wake = threading.Event()
+
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=poll_workers, pool_maxsize=poll_workers
+        )
+        self._session = requests.Session()
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+        self._session.headers.update(
+            {
+                "Content-Type": "application/json",
+                "Authorization": f"Bearer {auth_token}",
+            }
+        )
+        self._poll_executor = ThreadPoolExecutor(max_workers=poll_workers)
+        self._poller = threading.Thread(target=self._poll_loop, daemon=True)
+
+        self._server = None
+        self.callback_url = None
+        if callbacks:
+            self._server = ThreadingHTTPServer(
+                (callback_host, callback_port), self._make_handler()
+            )
+            self._server.daemon_threads = True
+            host, port = self._server.server_address[:2]
+            self.callback_url = callback_public_url or f"http://{host}:{port}/"
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def start(self):
+        if self._server is not None:
+            threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        self._poller.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        self._wake.set()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+        self._poll_executor.shutdown(wait=False, cancel_futures=True)
+        self._session.close()
+
+    def with_callback(self, inputs):
+        """Adds the callback URL to a task's inputs, if callbacks are enabled."""
+        if self.callback_url is None:
+            return inputs
+        return {**inputs, "callback_url": self.callback_url}
+
+    def register(self, task_id, started_at=None):
+        """
+        Starts tracking a task and returns a future that resolves to its final
+        status. `started_at` is when the task was submitted, used for latency.
+        """
+        started_at = started_at or time.time()
+        with self._lock:
+            pending = self._pending.get(task_id)
+            if pending is None:
+                pending = _PendingTask(task_id, started_at, self.poll_interval)
+                self._pending[task_id] = pending
+
+            # The callback can beat the enqueue response back to us
+            early_result = self._early_results.pop(task_id, None)
+
+        if early_result is not None:
+            self._resolve(task_id, *early_result[1])
+        self._wake.set()
+        return pending.future
+
+    def wait(self, task_id, timeout=None, started_at=None):
+        try:
+            return self.register(task_id, started_at).result(timeout=timeout)
+        except FutureTimeoutError:
+            self._abandon(task_id)
+            raise TimeoutError(f"Task {task_id} did not finish within {timeout}s")
+
+    def wait_many(self, tasks, timeout=None):
+        """
+        Waits for several tasks, given as task ids, (task id, submitted at) pairs,
+        or a {task id: submitted at} mapping, so latency includes the time queued.
+        """
+        if isinstance(tasks, dict):
+            tasks = tasks.items()
+        futures = {}
+        for task in tasks:
+            task_id, started_at = task if isinstance(task, tuple) else (task, None)
+            futures[task_id] = self.register(task_id, started_at)
+        wait_futures(futures.values(), timeout=timeout)
+        for task_id, future in futures.items():
+            if not future.done():
+                self._abandon(task_id)
+        return {
+            task_id: None if future.cancelled() else future.result()
+            for task_id, future in futures.items()
+        }
+
+    def _abandon(self, task_id):
+        # Stop polling a task nobody waits for anymore. A late result for it is
+        # kept like an early one, until it ages out
+        with self._lock:
+            pending = self._pending.get(task_id)
+            if pending is None or pending.future.done():
+                return
+            del self._pending[task_id]
+        pending.future.cancel()
+
+    def _prune(self, now):
+        # Both are in insertion order, so the oldest entries are first
+        for entries in (self._early_results, self._resolved):
+            while entries and next(iter(entries.values()))[0] < now - self.retention:
+                entries.popitem(last=False)
+
+    def _resolve(self, task_id, result, completed_at, completed_via):
+        now = time.time()
+        with self._lock:
+            self._prune(now)
+            if task_id in self._resolved:
+                # The other of callback and poll, nothing waits for it
+                del self._resolved[task_id]
+                return
+            pending = self._pending.pop(task_id, None)
+            if pending is None:
+                self._early_results[task_id] = (
+                    now,
+                    (result, completed_at, completed_via),
+                )
+                return
+            self._resolved[task_id] = (now,)
+
+        result = {
+            **result,
+            "completed_via": completed_via,
+            "latency": max(completed_at - pending.started_at, 0.0),
+        }
+        if not pending.future.done():
+            pending.future.set_result(result)
+
+    def _poll(self, pending):
+        try:
+            response = self._session.get(f"{self.api_url}/v2/task/{pending.task_id}/")
+            response.raise_for_status()
+            result = json.loads(response.text)
+        except requests.RequestException as e:
+            print(f"Polling task {pending.task_id} failed: {e}")
+            result = None
+
+        if result is not None and result.get("status") in TERMINAL_STATUSES:
+            self._resolve(pending.task_id, result, time.time(), "poll")
+            return
+
+        # Back off while the task is still running, callbacks usually win anyway
+        with self._lock:
+            pending.poll_interval = min(pending.poll_interval * 2, self.max_poll_interval)
+            pending.next_poll_at = time.time() + pending.poll_interval
+
+    def _poll_loop(self):
+        while not self._stopped.is_set():
+            now = time.time()
+            with self._lock:
+                due = [p for p in self._pending.values() if p.next_poll_at <= now]
+                # Keep in-flight polls from being picked up again until they finish
+                for pending in due:
+                    pending.next_poll_at = now + self.max_poll_interval
+                next_poll_at = min(
+                    (p.next_poll_at for p in self._pending.values()), default=None
+                )
+
+            for pending in due:
+                self._poll_executor.submit(self._poll, pending)
+
+            timeout = self.max_poll_interval
+            if next_poll_at is not None:
+                timeout = min(max(next_poll_at - time.time(), 0.01), timeout)
+            self._wake.wait(timeout)
+            self._wake.clear()
+
+    def _make_handler(self):
+        waiter = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                completed_at = time.time()
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+                self.send_response(200)
+                self.end_headers()
+
+                task_id = self.headers.get("X-Task-ID")
+                if not task_id:
+                    return
+
+                try:
+                    outputs = json.loads(body).get("data") if body else None
+                except json.JSONDecodeError:
+                    outputs = body.decode(errors="replace")
+
+                result = {
+                    "id": task_id,
+                    "status": self.headers.get("X-Task-Status", "COMPLETE"),
+                    "outputs": outputs,
+                }
+                waiter._resolve(task_id, result, completed_at, "callback")
+
+        return Handler
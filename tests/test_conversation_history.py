@@ -0,0 +1,54 @@
+import os
+import sys
+
+import pytest
+
+pytest.importorskip("openai")
+pytest.importorskip("rich")
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "vllm"))
+
+from chat import ConversationHistory  # noqa: E402
+
+
+def summaries(history):
+    return [
+        m for m in history.messages if m["content"].startswith("Summary of the earlier")
+    ]
+
+
+def test_summary_is_folded_into_the_next_one():
+    summarized = []
+
+    def summarizer(messages):
+        summarized.append(messages)
+        return f"summary {len(summarized)}"
+
+    history = ConversationHistory(
+        "model", token_budget=60, summarizer=summarizer, use_tokenizer=False
+    )
+    history.append({"role": "system", "content": "You are helpful."})
+    for i in range(12):
+        history.append({"role": "user", "content": f"question {i} " * 5})
+        history.append({"role": "assistant", "content": f"answer {i} " * 5})
+
+    assert len(summarized) > 1
+    assert len(summaries(history)) == 1
+    # Every summary after the first one includes the previous summary
+    for earlier, messages in enumerate(summarized[1:], start=1):
+        assert any(m["content"].endswith(f"summary {earlier}") for m in messages)
+
+
+
+def test_summary_index_tracks_the_summary():
+    history = ConversationHistory(
+        "model", token_budget=80, summarizer=lambda m: "summary", use_tokenizer=False
+    )
+    roles = ["system", "user", "assistant", "tool", "user", "assistant", "system"]
+    for i in range(40):
+        history.append({"role": roles[i % len(roles)], "content": f"message {i} " * 4})
+
+        found = summaries(history)
+        assert len(found) <= 1
+        if found:
+            assert history.messages[history._summary_index] is found[0]
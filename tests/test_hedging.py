@@ -0,0 +1,51 @@
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "utils", "hedging"))
+
+from hedging import HedgePolicy  # noqa: E402
+
+
+def attempt(seconds, result):
+    async def run():
+        await asyncio.sleep(seconds)
+        return result
+
+    return run
+
+
+def test_delay_holds_when_hedges_keep_winning():
+    # Every other primary is slow and loses to its duplicate. Those primaries are
+    # cancelled, but must still count, or the median drops to the fast ones
+    policy = HedgePolicy(
+        percentile=50, initial_delay=0.05, min_delay=0.001, window=20, min_samples=4
+    )
+
+    for i in range(20):
+        primary = attempt(0.005 if i % 2 else 0.15, "primary")
+        policy.run(primary, attempt(0.01, "duplicate"))
+
+    assert policy.hedges_won > 0
+    assert policy.delay() >= 0.05
+
+
+def test_winner_is_returned_and_loser_cancelled():
+    policy = HedgePolicy(initial_delay=0.01)
+    cancelled = []
+
+    async def slow():
+        try:
+            await asyncio.sleep(1)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    assert policy.run(slow, attempt(0.01, "duplicate")) == "duplicate"
+    assert policy.stats()["hedges_won"] == 1
+    # The cancellation is delivered on the policy's loop, after run() returns
+    deadline = time.monotonic() + 1
+    while not cancelled and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert cancelled == [True]
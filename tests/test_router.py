@@ -0,0 +1,117 @@
+import asyncio
+import gc
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("openai")
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "vllm"))
+
+from router import Backend, Router  # noqa: E402
+
+MODEL = "stub-model"
+
+
+def make_router(stream):
+    backend = Backend("http://127.0.0.1:1", "token")
+    backend.models = {MODEL: None}
+    backend.client = SimpleNamespace(
+        chat=SimpleNamespace(completions=SimpleNamespace(create=lambda **_: stream()))
+    )
+
+    async def acreate(**_):
+        return stream()
+
+    backend.async_client = SimpleNamespace(
+        chat=SimpleNamespace(completions=SimpleNamespace(create=acreate))
+    )
+    return Router([backend]), backend
+
+
+def chunks(*items):
+    def stream():
+        for item in items:
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+
+    return stream
+
+
+def create(router):
+    return router.create_chat_completion(model=MODEL, messages=[], stream=True)
+
+
+def test_unread_stream_is_released():
+    router, backend = make_router(chunks("a", "b"))
+    response = create(router)
+    assert backend.in_flight == 1
+
+    del response
+    gc.collect()
+    assert backend.in_flight == 0
+    assert backend.failures == 0
+
+
+def test_other_exceptions_release_with_an_error():
+    router, backend = make_router(chunks("a", ConnectionError("reset")))
+
+    with pytest.raises(ConnectionError):
+        list(create(router))
+    assert backend.in_flight == 0
+    assert backend.failures == 1
+
+
+def test_closed_stream_is_released_once():
+    router, backend = make_router(chunks("a", "b"))
+    response = create(router)
+    next(response)
+    response.close()
+    response.close()
+    del response
+    gc.collect()
+
+    assert backend.in_flight == 0
+    assert backend.ewma_latency is None
+
+
+def test_finished_stream_records_latency():
+    router, backend = make_router(chunks("a", "b"))
+    assert list(create(router)) == ["a", "b"]
+    assert backend.in_flight == 0
+    assert backend.ewma_latency is not None
+
+
+def test_cancelled_async_stream_is_released():
+    started = asyncio.Event()
+
+    def stream():
+        async def iterate():
+            yield "a"
+            started.set()
+            await asyncio.sleep(10)
+            yield "b"
+
+        return iterate()
+
+    router, backend = make_router(stream)
+
+    async def read():
+        response = await router.acreate_chat_completion(
+            model=MODEL, messages=[], stream=True
+        )
+        return [chunk async for chunk in response]
+
+    async def main():
+        task = asyncio.ensure_future(read())
+        await started.wait()
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(main())
+    assert backend.in_flight == 0
+    assert backend.failures == 0
@@ -0,0 +1,83 @@
+import asyncio
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("openai")
+pytest.importorskip("rich")
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "vllm"))
+
+from chat import ToolExecutor, tool  # noqa: E402
+
+
+def tool_call(call_id, name, arguments="{}"):
+    return SimpleNamespace(
+        id=call_id, function=SimpleNamespace(name=name, arguments=arguments)
+    )
+
+
+def run_turn(executor, calls):
+    started_at = time.monotonic()
+    messages = asyncio.run(executor.execute(calls))
+    return messages, time.monotonic() - started_at
+
+
+def test_sync_tool_timeout_bounds_the_turn():
+    @tool(timeout=0.2)
+    def hangs():
+        time.sleep(3)
+        return "done"
+
+    messages, elapsed = run_turn(ToolExecutor({"hangs": hangs}), [tool_call("1", "hangs")])
+
+    assert "timed out" in messages[0]["content"]
+    assert elapsed < 1.0
+
+
+def test_sync_tools_run_concurrently():
+    @tool()
+    def slow(value):
+        time.sleep(0.5)
+        return value
+
+    executor = ToolExecutor({"slow": slow})
+    calls = [tool_call(str(i), "slow", f'{{"value": "{i}"}}') for i in range(4)]
+    messages, elapsed = run_turn(executor, calls)
+
+    assert [m["content"] for m in messages] == ["0", "1", "2", "3"]
+    assert [m["tool_call_id"] for m in messages] == ["0", "1", "2", "3"]
+    assert elapsed < 1.5
+
+
+def test_pure_tool_cache_is_bounded():
+    calls = []
+
+    @tool(pure=True, cache_ttl=60)
+    def lookup(value):
+        calls.append(value)
+        return value
+
+    executor = ToolExecutor({"lookup": lookup}, max_cache_entries=2)
+    for value in ["a", "b", "a", "c", "a", "b"]:
+        run_turn(executor, [tool_call(value, "lookup", f'{{"value": "{value}"}}')])
+
+    # "b" was the least recently used when "c" came in, so it was computed again
+    assert calls == ["a", "b", "c", "b"]
+    assert len(executor._cache) == 2
+
+
+def test_expired_cache_entries_are_evicted():
+    @tool(pure=True, cache_ttl=0.05)
+    def lookup(value):
+        return value
+
+    executor = ToolExecutor({"lookup": lookup})
+    run_turn(executor, [tool_call("1", "lookup", '{"value": "a"}')])
+    time.sleep(0.1)
+    run_turn(executor, [tool_call("2", "lookup", '{"value": "b"}')])
+
+    assert list(executor._cache) == [("lookup", '{"value": "b"}')]
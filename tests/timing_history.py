@@ -0,0 +1,108 @@
+import sqlite3
+import statistics
+import threading
+import time
+from pathlib import Path
+
+# Number of previous runs each test is compared against
+WINDOW_SIZE = 20
+# Fewer samples than this are too noisy to call anything a regression
+MIN_SAMPLES = 5
+# How many robust standard deviations above the median counts as slower
+REGRESSION_THRESHOLD = 3.0
+
+
+def percentile(values, q):
+    values = sorted(values)
+    if not values:
+        return None
+    index = (len(values) - 1) * q
+    lower = int(index)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (index - lower)
+
+
+class TimingHistory:
+    """Per-test durations of every integration test run, stored in SQLite."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS test_times (
+                    run_id INTEGER NOT NULL,
+                    test_name TEXT NOT NULL,
+                    duration REAL NOT NULL,
+                    passed INTEGER NOT NULL
+                )
+                """
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS test_times_name ON test_times (test_name, run_id)"
+            )
+
+    def _connect(self):
+        return sqlite3.connect(self.path)
+
+    def record_run(self, tests, tests_index_failed, test_times):
+        run_id = int(time.time() * 1000)
+        rows = [
+            (run_id, test.__name__, test_time, i not in tests_index_failed)
+            for i, (test, test_time) in enumerate(zip(tests, test_times))
+        ]
+        with self._lock, self._connect() as conn:
+            conn.executemany("INSERT INTO test_times VALUES (?, ?, ?, ?)", rows)
+        return run_id
+
+    def recent_durations(self, test_name, before_run_id=None, limit=WINDOW_SIZE):
+        # Only passing runs count, a failure can be arbitrarily fast or slow
+        query = "SELECT duration FROM test_times WHERE test_name = ? AND passed = 1"
+        params = [test_name]
+        if before_run_id is not None:
+            query += " AND run_id < ?"
+            params.append(before_run_id)
+        query += " ORDER BY run_id DESC LIMIT ?"
+        params.append(limit)
+
+        with self._lock, self._connect() as conn:
+            return [row[0] for row in conn.execute(query, params)]
+
+    def median_durations(self, tests):
+        durations = {}
+        for test in tests:
+            recent = self.recent_durations(test.__name__)
+            if recent:
+                durations[test.__name__] = statistics.median(recent)
+        return durations
+
+    def compare(self, test_name, duration, before_run_id=None):
+        """
+        Compares a duration against the test's rolling window. A test is flagged as
+        a regression when it is above the window's p90 and more than
+        REGRESSION_THRESHOLD robust standard deviations (scaled MAD) above its median.
+        """
+        recent = self.recent_durations(test_name, before_run_id=before_run_id)
+        if not recent:
+            return {"median": None, "p90": None, "samples": 0, "regression": False}
+
+        median = statistics.median(recent)
+        p90 = percentile(recent, 0.9)
+        mad = statistics.median(abs(d - median) for d in recent)
+        # 1.4826 scales the MAD to a standard deviation for normal data, and the
+        # floor stops perfectly stable tests from flagging on tiny jitter
+        spread = max(1.4826 * mad, 0.05 * median)
+
+        regression = (
+            len(recent) >= MIN_SAMPLES
+            and duration > p90
+            and duration > median + REGRESSION_THRESHOLD * spread
+        )
+        return {
+            "median": median,
+            "p90": p90,
+            "samples": len(recent),
+            "regression": regression,
+        }
@@ -0,0 +1,200 @@
+"""
+*** Cold Start Instrumentation ***
+
+Breaks the cold boot of an endpoint into phases (download, weight
+deserialization, device transfer, first inference, ...) and records how long each
+one took, along with the memory it used:
+
+- `peak_device_memory_mb`: the most GPU memory torch allocated during the phase
+- `device_memory_used_mb`: for loaders that don't use torch (e.g. CTranslate2), the
+  GPU memory in use when the phase ended, as reported by nvidia-smi
+- `host_memory_lifetime_max_mb`: the process's peak resident set size so far, which
+  only tells a phase's own peak apart when it is the highest yet
+
+Wrap the `on_start` loader and mark its phases:
+
+    import cold_start
+
+    @cold_start.instrument_on_start
+    def load_models():
+        with cold_start.phase("download"):
+            path = download_model(...)
+        with cold_start.phase("deserialize"):
+            model = load(path)
+        return model
+
+and, in the handler, mark the first inference:
+
+    with cold_start.phase("first_inference", once=True):
+        result = model(...)
+
+Once on_start returns, and again after the first inference, the metrics are
+printed as a single `COLD_START_METRICS {...}` JSON line and written to
+`COLD_START_METRICS_PATH` (default `./cold_start_metrics.json`), so benchmark
+tooling can collect them from the container logs or a volume.
+"""
+
+import functools
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+
+LOG_PREFIX = "COLD_START_METRICS"
+
+_profiler = None
+
+
+def _torch_cuda():
+    torch = sys.modules.get("torch")
+    if torch is not None and torch.cuda.is_available() and torch.cuda.is_initialized():
+        return torch.cuda
+    return None
+
+
+def _reset_device_peak():
+    # If CUDA is only initialized during the phase, its peak starts at zero anyway
+    cuda = _torch_cuda()
+    if cuda is not None:
+        cuda.reset_peak_memory_stats()
+
+
+def _device_memory_used_mb():
+    try:
+        output = subprocess.check_output(
+            ["nvidia-smi", "--query-gpu=memory.used", "--format=csv,noheader,nounits"],
+            text=True,
+            timeout=5,
+        )
+        return float(sum(int(line) for line in output.split()))
+    except (OSError, subprocess.SubprocessError, ValueError):
+        return None
+
+
+def _memory():
+    """The memory fields of a phase, measured when it ends."""
+    cuda = _torch_cuda()
+    return {
+        # ru_maxrss is the peak resident set size of the process, in KB on Linux
+        "host_memory_lifetime_max_mb": (
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        ),
+        # torch's allocator peak since _reset_device_peak, at the start of the phase
+        "peak_device_memory_mb": (
+            cuda.max_memory_allocated() / 1024**2 if cuda is not None else None
+        ),
+        # The driver only reports current usage, so this is not a peak
+        "device_memory_used_mb": _device_memory_used_mb() if cuda is None else None,
+    }
+
+
+class ColdStartProfiler:
+    def __init__(self, name):
+        self.name = name
+        self.started_at = time.time()
+        self.phases = []
+        self.on_start_seconds = None
+        self._completed_once = set()
+
+    @contextmanager
+    def phase(self, name, once=False):
+        if once and name in self._completed_once:
+            yield
+            return
+
+        _reset_device_peak()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append(
+                {"name": name, "seconds": time.perf_counter() - start, **_memory()}
+            )
+            if once:
+                self._completed_once.add(name)
+                self.publish()
+
+    def metrics(self):
+        slowest = max(self.phases, key=lambda p: p["seconds"], default=None)
+        return {
+            "name": self.name,
+            "container_id": os.getenv("CONTAINER_ID"),
+            "started_at": self.started_at,
+            "on_start_seconds": self.on_start_seconds,
+            "total_seconds": sum(p["seconds"] for p in self.phases),
+            "dominant_phase": slowest["name"] if slowest else None,
+            "phases": self.phases,
+        }
+
+    def publish(self):
+        metrics = self.metrics()
+        print(f"{LOG_PREFIX} {json.dumps(metrics)}", flush=True)
+
+        path = os.getenv("COLD_START_METRICS_PATH", "./cold_start_metrics.json")
+        try:
+            with open(path, "w") as f:
+                json.dump(metrics, f, indent=2)
+        except OSError as e:
+            print(f"Could not write cold start metrics to {path}: {e}")
+
+
+@contextmanager
+def phase(name, once=False):
+    """Times a phase of the current cold start. A no-op outside an instrumented container."""
+    if _profiler is None:
+        yield
+        return
+
+    with _profiler.phase(name, once=once):
+        yield
+
+
+def metrics():
+    return _profiler.metrics() if _profiler is not None else None
+
+
+def instrument_on_start(func):
+    """Wraps an on_start loader so its phases, and its total duration, are recorded."""
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        global _profiler
+        _profiler = profiler = ColdStartProfiler(func.__name__)
+
+        start = time.perf_counter()
+        value = func(*args, **kwargs)
+        profiler.on_start_seconds = time.perf_counter() - start
+
+        # Time spent outside any marked phase still counts towards the cold start
+        marked = sum(p["seconds"] for p in profiler.phases)
+        if profiler.on_start_seconds - marked > 0.001:
+            profiler.phases.append(
+                {
+                    "name": "unmarked",
+                    "seconds": profiler.on_start_seconds - marked,
+                    **_memory(),
+                    # Unmarked time is spread across the loader, with no peak of its own
+                    "peak_device_memory_mb": None,
+                }
+            )
+
+        profiler.publish()
+        return value
+
+    return wrapper
+
+
+def parse_logs(text):
+    """Extracts every published set of metrics from container logs."""
+    results = []
+    for line in text.splitlines():
+        _, sep, payload = line.partition(f"{LOG_PREFIX} ")
+        if sep:
+            try:
+                results.append(json.loads(payload))
+            except json.JSONDecodeError:
+                continue
+    return results
@@ -0,0 +1,159 @@
+"""
+Request hedging: when a request hasn't answered after the `percentile` of recent
+response times, a duplicate is sent and whichever answers first wins. The loser is
+cancelled as soon as the winner is known, which closes its connection, so the
+server can stop working on it instead of running the whole job twice.
+
+Attempts are coroutines, run on an event loop the policy keeps in a background
+thread, so synchronous code can hedge too:
+
+    policy = HedgePolicy(percentile=95)
+    response = policy.run(lambda: send(primary_url), lambda: send(other_url))
+"""
+
+import asyncio
+import threading
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterator, Optional
+
+
+class HedgePolicy:
+    def __init__(
+        self,
+        percentile: float = 95.0,
+        initial_delay: float = 2.0,
+        min_delay: float = 0.05,
+        window: int = 200,
+        min_samples: int = 20,
+    ):
+        self.percentile = percentile
+        # Used until enough response times have been seen
+        self.initial_delay = initial_delay
+        self.min_delay = min_delay
+        self.min_samples = min_samples
+        self.samples: deque = deque(maxlen=window)
+        self.requests = 0
+        self.hedges_fired = 0
+        self.hedges_won = 0
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def delay(self) -> float:
+        with self._lock:
+            if len(self.samples) < self.min_samples:
+                return self.initial_delay
+            samples = sorted(self.samples)
+        index = min(int(len(samples) * self.percentile / 100), len(samples) - 1)
+        return max(samples[index], self.min_delay)
+
+    def _record(self, started_at: float) -> Callable[[asyncio.Future], None]:
+        # Only the primary's time counts. A primary cancelled because the hedge won
+        # is recorded too, with its time so far as a lower bound, otherwise the
+        # slowest primaries would be left out and the threshold would keep dropping
+        def record(future: asyncio.Future) -> None:
+            if future.cancelled() or future.exception() is None:
+                with self._lock:
+                    self.samples.append(time.perf_counter() - started_at)
+
+        return record
+
+    async def hedge(
+        self,
+        primary: Callable[[], Awaitable[Any]],
+        duplicate: Callable[[], Awaitable[Any]],
+    ) -> Any:
+        """
+        Awaits `primary()`, starting `duplicate()` if it is slow, and returns the
+        first result. Attempts should return once the response has started, e.g. on
+        its first token, and only raise if they failed.
+        """
+        with self._lock:
+            self.requests += 1
+
+        first = asyncio.ensure_future(primary())
+        first.add_done_callback(self._record(time.perf_counter()))
+        done, _ = await asyncio.wait({first}, timeout=self.delay())
+        if done:
+            return first.result()
+
+        second = asyncio.ensure_future(duplicate())
+        with self._lock:
+            self.hedges_fired += 1
+
+        pending = {first, second}
+        error: Optional[BaseException] = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for future in done:
+                    if future.exception() is not None:
+                        error = error or future.exception()
+                        continue
+                    if future is second:
+                        with self._lock:
+                            self.hedges_won += 1
+                    return future.result()
+        finally:
+            # Abort the loser, or both attempts if the caller was cancelled
+            for future in pending:
+                future.cancel()
+
+        # Both attempts failed
+        raise error
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        """The event loop attempts run on, started on first use."""
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, daemon=True).start()
+            return self._loop
+
+    def run(
+        self,
+        primary: Callable[[], Awaitable[Any]],
+        duplicate: Callable[[], Awaitable[Any]],
+    ) -> Any:
+        """Blocking version of `hedge`, for synchronous callers."""
+        return asyncio.run_coroutine_threadsafe(
+            self.hedge(primary, duplicate), self.loop
+        ).result()
+
+    def iterate(
+        self,
+        iterator: AsyncIterator[Any],
+        close: Optional[Callable[[], Awaitable[Any]]] = None,
+    ) -> Iterator[Any]:
+        """
+        Iterates an async iterator returned by a hedged attempt, e.g. the rest of a
+        stream, from synchronous code. `close` is awaited if iteration stops early.
+        """
+        finished = False
+        try:
+            while True:
+                try:
+                    yield asyncio.run_coroutine_threadsafe(
+                        iterator.__anext__(), self.loop
+                    ).result()
+                except StopAsyncIteration:
+                    finished = True
+                    return
+        finally:
+            if not finished and close is not None:
+                asyncio.run_coroutine_threadsafe(close(), self.loop).result()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "hedges_fired": self.hedges_fired,
+                "hedges_won": self.hedges_won,
+                "hedge_rate": self.hedges_fired / self.requests if self.requests else 0.0,
+                "hedge_win_rate": (
+                    self.hedges_won / self.hedges_fired if self.hedges_fired else 0.0
+                ),
+            }
@@ -0,0 +1,337 @@
+"""
+*** Open-Loop Load Generator ***
+
+Drives any Beam endpoint with requests that arrive at a fixed or Poisson rate,
+independent of how fast responses come back. This avoids the coordinated omission
+of closed-loop scripts, where a slow response also delays the next request and
+hides queueing latency.
+
+Latency is measured from when each request was scheduled to be sent, and is
+recorded separately for cold requests (sent after containers were stopped and
+before the first response that followed) and warm requests. Percentiles are
+reported from log-bucketed histograms, and a JSON report is written at the end.
+
+Example:
+
+    python load_generator.py \\
+        --url https://app.beam.cloud/endpoint/whisper/v1 \\
+        --payload '{"audio_url": "https://audio-samples.github.io/samples/mp3/blizzard_unconditional/sample-4.mp3"}' \\
+        --rate 2 --duration 120 --concurrency 16 \\
+        --cold-interval 60 --report whisper_report.json
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import subprocess
+import time
+
+import aiohttp
+
+PERCENTILES = [50, 90, 99, 99.9]
+
+
+class LatencyHistogram:
+    """
+    Histogram with logarithmic buckets, so every recorded value is kept to within
+    `precision` relative error regardless of its magnitude, like HdrHistogram.
+    """
+
+    def __init__(self, precision=0.01):
+        self.precision = precision
+        self._log_base = math.log1p(precision)
+        self.counts = {}
+        self.count = 0
+        self.min = math.inf
+        self.max = 0.0
+        self.total = 0.0
+
+    def record(self, seconds):
+        seconds = max(seconds, 1e-6)
+        bucket = math.ceil(math.log(seconds) / self._log_base)
+        self.counts[bucket] = self.counts.get(bucket, 0) + 1
+        self.count += 1
+        self.total += seconds
+        self.min = min(self.min, seconds)
+        self.max = max(self.max, seconds)
+
+    def merge(self, other):
+        for bucket, count in other.counts.items():
+            self.counts[bucket] = self.counts.get(bucket, 0) + count
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def percentile(self, q):
+        if not self.count:
+            return None
+        target = math.ceil(self.count * q / 100)
+        seen = 0
+        for bucket in sorted(self.counts):
+            seen += self.counts[bucket]
+            if seen >= target:
+                # Report the bucket's upper bound, capped at the largest real value
+                return min(math.exp(bucket * self._log_base), self.max)
+        return self.max
+
+    def summary(self):
+        if not self.count:
+            return {"count": 0}
+        return {
+            "count": self.count,
+            "min": self.min,
+            "mean": self.total / self.count,
+            "max": self.max,
+            **{f"p{q:g}": self.percentile(q) for q in PERCENTILES},
+        }
+
+
+def read_beam_token():
+    token = os.getenv("BEAM_AUTH_TOKEN") or os.getenv("BEAM_TOKEN")
+    if token:
+        return token
+
+    config_path = os.path.expanduser("~/.beam/config.ini")
+    if os.path.exists(config_path):
+        for line in open(config_path).read().split("\n"):
+            if line.startswith("token"):
+                return line.split(" = ")[1].strip()
+    return ""
+
+
+def stop_running_containers():
+    """Stops every running container, so the next requests hit a cold start."""
+    result = subprocess.run(
+        ["beam", "container", "list", "--format", "json"],
+        capture_output=True,
+        text=True,
+    )
+    containers = json.loads(result.stdout or "[]")
+    for container in containers:
+        if container.get("status") == "RUNNING":
+            subprocess.run(["beam", "container", "stop", container.get("container_id")])
+
+
+def arrival_times(rate, duration=None, total_requests=None, arrival="poisson", seed=None):
+    """Yields the offsets, in seconds from the start, at which requests are sent."""
+    rng = random.Random(seed)
+    offset = 0.0
+    sent = 0
+    while True:
+        if total_requests is not None and sent >= total_requests:
+            return
+        if duration is not None and offset >= duration:
+            return
+        yield offset
+        sent += 1
+        offset += rng.expovariate(rate) if arrival == "poisson" else 1 / rate
+
+
+class LoadGenerator:
+    def __init__(
+        self,
+        url,
+        payload,
+        token="",
+        rate=1.0,
+        duration=None,
+        total_requests=None,
+        arrival="poisson",
+        concurrency=32,
+        timeout=600,
+        cold_interval=None,
+        make_cold=stop_running_containers,
+        seed=None,
+    ):
+        if duration is None and total_requests is None:
+            raise ValueError("Either duration or total_requests must be set")
+
+        self.url = url
+        self.payload = payload
+        self.headers = {
+            "Authorization": f"Bearer {token}",
+            "Content-Type": "application/json",
+        }
+        self.rate = rate
+        self.duration = duration
+        self.total_requests = total_requests
+        self.arrival = arrival
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.cold_interval = cold_interval
+        self.make_cold = make_cold
+        self.seed = seed
+
+        self.histograms = {"cold": LatencyHistogram(), "warm": LatencyHistogram()}
+        self.service_times = LatencyHistogram()
+        self.status_codes = {}
+        self.errors = 0
+        self._cold_generation = 0
+        self._warm_generation = 0
+
+    async def _send(self, session, semaphore, scheduled_at):
+        # Requests sent after a cold start, until one of them completes, all wait on it
+        generation = self._cold_generation
+        is_cold = generation > self._warm_generation
+
+        async with semaphore:
+            sent_at = time.perf_counter()
+            try:
+                async with session.post(
+                    self.url, json=self.payload, headers=self.headers
+                ) as response:
+                    await response.read()
+                    status = response.status
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                status = type(e).__name__
+
+        finished_at = time.perf_counter()
+        self.status_codes[str(status)] = self.status_codes.get(str(status), 0) + 1
+        if status != 200:
+            self.errors += 1
+            return
+
+        self._warm_generation = max(self._warm_generation, generation)
+        self.histograms["cold" if is_cold else "warm"].record(finished_at - scheduled_at)
+        self.service_times.record(finished_at - sent_at)
+
+    async def _cold_starts(self):
+        while True:
+            await asyncio.sleep(self.cold_interval)
+            print("Stopping containers to measure a cold start")
+            await asyncio.to_thread(self.make_cold)
+            self._cold_generation += 1
+
+    async def run(self):
+        semaphore = asyncio.Semaphore(self.concurrency)
+        connector = aiohttp.TCPConnector(limit=self.concurrency, keepalive_timeout=60)
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+
+        cold_task = None
+        if self.cold_interval:
+            # The first request always finds a cold deployment
+            await asyncio.to_thread(self.make_cold)
+            self._cold_generation += 1
+            cold_task = asyncio.create_task(self._cold_starts())
+
+        started_at = time.perf_counter()
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+            requests = []
+            for offset in arrival_times(
+                self.rate, self.duration, self.total_requests, self.arrival, self.seed
+            ):
+                delay = started_at + offset - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                requests.append(
+                    asyncio.create_task(
+                        self._send(session, semaphore, started_at + offset)
+                    )
+                )
+            await asyncio.gather(*requests)
+
+        if cold_task is not None:
+            cold_task.cancel()
+
+        elapsed = time.perf_counter() - started_at
+        return self.report(len(requests), elapsed)
+
+    def report(self, total_requests, elapsed):
+        total = LatencyHistogram()
+        for histogram in self.histograms.values():
+            total.merge(histogram)
+
+        return {
+            "config": {
+                "url": self.url,
+                "arrival": self.arrival,
+                "rate": self.rate,
+                "duration": self.duration,
+                "total_requests": self.total_requests,
+                "concurrency": self.concurrency,
+                "cold_interval": self.cold_interval,
+            },
+            "requests": total_requests,
+            "errors": self.errors,
+            "status_codes": self.status_codes,
+            "elapsed": elapsed,
+            "throughput": (total_requests - self.errors) / elapsed if elapsed else 0,
+            "latency": {
+                "all": total.summary(),
+                "cold": self.histograms["cold"].summary(),
+                "warm": self.histograms["warm"].summary(),
+            },
+            "service_time": self.service_times.summary(),
+        }
+
+
+def print_report(report):
+    print("\nBenchmark Report")
+    print(f"Total Requests: {report['requests']}")
+    print(f"Errors: {report['errors']} {report['status_codes']}")
+    print(f"Elapsed: {report['elapsed']:.2f} seconds")
+    print(f"Throughput: {report['throughput']:.2f} requests/second")
+
+    for bucket, summary in report["latency"].items():
+        if not summary["count"]:
+            continue
+        percentiles = ", ".join(
+            f"p{q:g}={summary[f'p{q:g}']:.3f}s" for q in PERCENTILES
+        )
+        print(f"{bucket.title()} ({summary['count']} requests): {percentiles}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Open-loop load generator")
+    parser.add_argument("--url", required=True, help="Endpoint URL")
+    parser.add_argument("--payload", default="{}", help="JSON request body")
+    parser.add_argument("--payload-file", help="Read the JSON request body from a file")
+    parser.add_argument("--token", default=None, help="Beam auth token")
+    parser.add_argument("--rate", type=float, default=1.0, help="Requests per second")
+    parser.add_argument("--arrival", choices=["poisson", "fixed"], default="poisson")
+    parser.add_argument("--duration", type=float, help="Seconds to send requests for")
+    parser.add_argument("--requests", type=int, help="Number of requests to send")
+    parser.add_argument("--concurrency", type=int, default=32, help="Max in-flight")
+    parser.add_argument("--timeout", type=float, default=600, help="Request timeout")
+    parser.add_argument(
+        "--cold-interval",
+        type=float,
+        help="Stop running containers every N seconds to measure cold starts",
+    )
+    parser.add_argument("--seed", type=int, help="Seed for Poisson arrivals")
+    parser.add_argument("--report", default="load_report.json", help="JSON report path")
+    args = parser.parse_args()
+
+    if args.payload_file:
+        with open(args.payload_file) as f:
+            payload = json.load(f)
+    else:
+        payload = json.loads(args.payload)
+
+    generator = LoadGenerator(
+        url=args.url,
+        payload=payload,
+        token=args.token if args.token is not None else read_beam_token(),
+        rate=args.rate,
+        duration=args.duration,
+        total_requests=args.requests,
+        arrival=args.arrival,
+        concurrency=args.concurrency,
+        timeout=args.timeout,
+        cold_interval=args.cold_interval,
+        seed=args.seed,
+    )
+    report = asyncio.run(generator.run())
+    print_report(report)
+
+    with open(args.report, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nReport written to {args.report}")
+
+
+if __name__ == "__main__":
+    main()
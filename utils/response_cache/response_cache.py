@@ -0,0 +1,334 @@
+"""
+*** LLM Response Cache ***
+
+Caches the responses of text generation endpoints, so repeated questions don't
+pay for another generation on the GPU.
+
+- The exact tier is keyed by the normalized messages (or prompt) and the
+  sampling parameters.
+- The optional similarity tier embeds the conversation and returns the response
+  of a previous request with the same sampling parameters whose embedding is at
+  least `similarity_threshold` cosine-similar.
+
+Both tiers evict the least recently used entry when full and expire entries
+after `ttl` seconds. Deterministic requests (temperature 0, or sampling turned
+off) always produce the same output, so their entries don't expire in memory,
+can be written to a shared volume with `persist_dir`, and concurrent identical
+requests wait for a single generation. The files in `persist_dir` are pruned on
+write, down to `max_persisted_entries` and to those used in the last
+`persisted_ttl` seconds.
+
+    import response_cache
+
+    cache = response_cache.ResponseCache(ttl=3600)
+
+    def handler(context, **inputs):
+        return cache.get_or_compute(
+            inputs["messages"], generate_args, lambda: generate(inputs["messages"])
+        )
+"""
+
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+# Sampling parameters that don't change the output of greedy decoding
+SAMPLING_ONLY_PARAMS = {"temperature", "top_p", "top_k", "do_sample"}
+
+
+def normalize_text(text):
+    text = unicodedata.normalize("NFC", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def normalize_messages(messages):
+    """Accepts a prompt string or a list of chat messages."""
+    if isinstance(messages, str):
+        messages = [{"role": "user", "content": messages}]
+
+    normalized = []
+    for message in messages:
+        content = message.get("content") or ""
+        if isinstance(content, list):
+            content = " ".join(
+                part.get("text", "") for part in content if part.get("type") == "text"
+            )
+        normalized.append(
+            {"role": message.get("role", "user"), "content": normalize_text(content)}
+        )
+    return normalized
+
+
+def is_deterministic(params):
+    return params.get("temperature") == 0 or params.get("do_sample") is False
+
+
+def _params_key(params):
+    if is_deterministic(params):
+        params = {k: v for k, v in params.items() if k not in SAMPLING_ONLY_PARAMS}
+        params["deterministic"] = True
+    return json.dumps(params, sort_keys=True, default=str)
+
+
+class _LRU:
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.evictions = 0
+
+    def get(self, key, now):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at is not None and expires_at <= now:
+            del self.entries[key]
+            self.evictions += 1
+            return None
+        self.entries.move_to_end(key)
+        return value
+
+    def put(self, key, value, expires_at):
+        self.entries[key] = (expires_at, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+
+class ResponseCache:
+    def __init__(
+        self,
+        max_entries=1024,
+        ttl=3600,
+        similarity_threshold=None,
+        embed=None,
+        max_similar_entries=1024,
+        persist_dir=None,
+        max_persisted_entries=None,
+        persisted_ttl=7 * 24 * 3600,
+        log_every=100,
+    ):
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        # Maps a list of texts to a list of vectors, only needed for the similarity tier
+        self.embed = embed
+        self.persist_dir = persist_dir
+        self.max_persisted_entries = max_persisted_entries or max_entries
+        self.persisted_ttl = persisted_ttl
+        self.log_every = log_every
+
+        self._exact = _LRU(max_entries)
+        # key -> (params key, unit vector, value) in the value slot of the LRU
+        self._similar = _LRU(max_similar_entries)
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        # Coalesced requests waited for an identical request's generation
+        self._counts = {
+            "exact_hits": 0,
+            "similar_hits": 0,
+            "coalesced": 0,
+            "misses": 0,
+        }
+
+    @property
+    def similarity_enabled(self):
+        return self.similarity_threshold is not None and self.embed is not None
+
+    def _key(self, messages, params):
+        return json.dumps(
+            {"messages": normalize_messages(messages), "params": _params_key(params)},
+            sort_keys=True,
+        )
+
+    def _persist_path(self, key):
+        digest = hashlib.sha256(key.encode()).hexdigest()
+        return os.path.join(self.persist_dir, f"{digest}.json")
+
+    def _embed(self, messages):
+        text = "\n".join(
+            f"{m['role']}: {m['content']}" for m in normalize_messages(messages)
+        )
+        vector = list(self.embed([text])[0])
+        norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+        return [x / norm for x in vector]
+
+    def _expires_at(self, params, now):
+        return None if is_deterministic(params) or not self.ttl else now + self.ttl
+
+    def lookup(self, messages, params):
+        """Returns `(value, tier)`, where tier is "exact", "similar" or None on a miss."""
+        value, tier = self._find(messages, params)
+        self._count(f"{tier}_hits" if tier else "misses")
+        return value, tier
+
+    def _find(self, messages, params):
+        key = self._key(messages, params)
+        now = time.time()
+        with self._lock:
+            value = self._exact.get(key, now)
+        if value is None and self.persist_dir and is_deterministic(params):
+            value = self._read_persisted(key, params, now)
+        if value is not None:
+            return value, "exact"
+
+        if self.similarity_enabled:
+            value = self._lookup_similar(messages, params, now)
+            if value is not None:
+                return value, "similar"
+
+        return None, None
+
+    def _read_persisted(self, key, params, now):
+        path = self._persist_path(key)
+        try:
+            if self.persisted_ttl and os.path.getmtime(path) <= now - self.persisted_ttl:
+                return None
+            with open(path) as f:
+                value = json.load(f)
+            # The modification time marks when the file was last used, for pruning
+            os.utime(path)
+        except (OSError, json.JSONDecodeError):
+            return None
+        with self._lock:
+            self._exact.put(key, value, self._expires_at(params, now))
+        return value
+
+    def _lookup_similar(self, messages, params, now):
+        params_key = _params_key(params)
+        vector = self._embed(messages)
+
+        best_key, best_score = None, self.similarity_threshold
+        with self._lock:
+            for key, (expires_at, entry) in self._similar.entries.items():
+                if entry[0] != params_key or (expires_at is not None and expires_at <= now):
+                    continue
+                score = sum(a * b for a, b in zip(vector, entry[1]))
+                if score >= best_score:
+                    best_key, best_score = key, score
+            if best_key is None:
+                return None
+            # Only the entry that was used counts as recently used
+            return self._similar.get(best_key, now)[2]
+
+    def store(self, messages, params, value):
+        key = self._key(messages, params)
+        now = time.time()
+        expires_at = self._expires_at(params, now)
+
+        vector = self._embed(messages) if self.similarity_enabled else None
+        with self._lock:
+            self._exact.put(key, value, expires_at)
+            if vector is not None:
+                self._similar.put(key, (_params_key(params), vector, value), expires_at)
+
+        if self.persist_dir and is_deterministic(params):
+            os.makedirs(self.persist_dir, exist_ok=True)
+            path = self._persist_path(key)
+            # Write then rename, so other containers never read a partial file
+            with open(f"{path}.tmp", "w") as f:
+                json.dump(value, f)
+            os.replace(f"{path}.tmp", path)
+            self._prune_persisted(now)
+
+    def _prune_persisted(self, now):
+        files = []
+        for entry in os.scandir(self.persist_dir):
+            if not entry.name.endswith(".json"):
+                continue
+            try:
+                files.append((entry.stat().st_mtime, entry.path))
+            except OSError:
+                # Removed by another container
+                continue
+
+        files.sort(reverse=True)
+        for index, (used_at, path) in enumerate(files):
+            expired = self.persisted_ttl and used_at <= now - self.persisted_ttl
+            if expired or index >= self.max_persisted_entries:
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+
+    def get_or_compute(self, messages, params, compute):
+        """
+        Returns the cached response, or calls `compute()` and caches its result.
+        Identical deterministic requests that arrive together share one call.
+        """
+        value, tier = self._find(messages, params)
+        if value is not None:
+            self._count(f"{tier}_hits")
+            return value
+
+        if not is_deterministic(params):
+            self._count("misses")
+            value = compute()
+            self.store(messages, params, value)
+            return value
+
+        key = self._key(messages, params)
+        with self._lock:
+            event = self._in_flight.get(key)
+            leader = event is None
+            if leader:
+                event = self._in_flight[key] = threading.Event()
+
+        if not leader:
+            event.wait()
+            value, _ = self._find(messages, params)
+            if value is not None:
+                self._count("coalesced")
+                return value
+            # The leader failed, generate it ourselves
+            self._count("misses")
+            return compute()
+
+        self._count("misses")
+        try:
+            value = compute()
+            self.store(messages, params, value)
+            return value
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+            event.set()
+
+    def _count(self, name):
+        with self._lock:
+            self._counts[name] += 1
+            lookups = sum(self._counts.values())
+        if self.log_every and lookups % self.log_every == 0:
+            print(f"Response cache: {json.dumps(self.stats())}")
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self._counts)
+            lookups = sum(counts.values())
+            hits = lookups - counts["misses"]
+            return {
+                **counts,
+                "lookups": lookups,
+                "hit_rate": hits / lookups if lookups else 0.0,
+                "exact_entries": len(self._exact.entries),
+                "similar_entries": len(self._similar.entries),
+                "evictions": self._exact.evictions + self._similar.evictions,
+            }
+
+
+def sentence_transformer_embedder(model_name="sentence-transformers/all-MiniLM-L6-v2"):
+    """An `embed` function for the similarity tier, needs `sentence-transformers`."""
+    from sentence_transformers import SentenceTransformer
+
+    model = SentenceTransformer(model_name)
+
+    def embed(texts):
+        return model.encode(texts, normalize_embeddings=True).tolist()
+
+    return embed
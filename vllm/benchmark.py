@@ -0,0 +1,364 @@
+"""
+*** vLLM Deployment Benchmark ***
+
+Simulates concurrent multi-turn chat sessions against the deployments in
+models.py, using `ChatApplication` from chat.py, and reports throughput, time to
+first token and latency percentiles for each one.
+
+Sessions share a handful of system prompts, like real applications do, so
+deployments with prefix caching get the benefit they would in production.
+
+    python benchmark.py \\
+        --deployment mistral_instruct=https://mistral-7b-instruct-v0-3-15c4487-v1.app.beam.cloud \\
+        --deployment yicoder_chat=https://yi-coder-9b-chat-15c4487-v1.app.beam.cloud \\
+        --sessions 32 --turns 4 --max-tokens 256
+
+Pass `--stub` instead to benchmark local stand-ins of each deployment (see
+stub_server.py), which is handy for testing the harness offline.
+"""
+
+import argparse
+import json
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+import openai
+from openai import OpenAI
+from rich.console import Console
+from rich.table import Table
+
+from chat import (
+    RESPONSE_TOKEN_RESERVE,
+    ChatApplication,
+    ConversationHistory,
+    percentile,
+)
+from stub_server import StubServer
+
+console = Console()
+
+SYSTEM_PROMPTS = [
+    (
+        "You are a senior software engineer helping a colleague. Answer precisely, "
+        "show code when it helps, and point out edge cases, performance pitfalls and "
+        "security concerns. Prefer the standard library and explain trade-offs "
+        "briefly. If the question is ambiguous, state your assumptions first."
+    ),
+    (
+        "You are a friendly travel assistant. Suggest concrete itineraries with "
+        "neighbourhoods, opening hours and rough costs. Keep answers organised with "
+        "short headings, mention seasonal considerations, and always offer a budget "
+        "and a premium alternative."
+    ),
+    (
+        "You are a patient tutor. Explain concepts step by step, check understanding "
+        "with a short question at the end of each answer, and use simple analogies "
+        "before introducing formal definitions."
+    ),
+]
+
+CONVERSATIONS = [
+    [
+        "How do I read a large CSV file in Python without loading it all into memory?",
+        "Now filter the rows where the 'status' column is 'failed' and count them per day.",
+        "How would you parallelise that across 8 cores?",
+        "Write a unit test for the counting function.",
+    ],
+    [
+        "I have three days in Lisbon in October. What should I see?",
+        "We love food. Which markets and restaurants should we add?",
+        "Can we fit a day trip to Sintra in without rushing?",
+        "Summarise the final plan as a day by day list.",
+    ],
+    [
+        "What is a hash table and why are lookups fast?",
+        "What happens when two keys hash to the same bucket?",
+        "How does Python's dict handle resizing?",
+        "Give me an exercise to check I understood.",
+    ],
+]
+
+# Local stand-ins for the deployments in models.py, used with --stub. Rates are
+# illustrative, tune them with the stub flags to match measured deployments.
+STUB_PROFILES = {
+    "internvl": {
+        "model": "OpenGVLab/InternVL3-8B-AWQ",
+        "token_rate": 60.0,
+        "max_concurrency": 8,
+        "max_model_len": 4096,
+    },
+    "yicoder_chat": {
+        "model": "01-ai/Yi-Coder-9B-Chat",
+        "token_rate": 45.0,
+        "max_concurrency": 16,
+        "max_model_len": 8096,
+    },
+    "mistral_instruct": {
+        "model": "mistralai/Mistral-7B-Instruct-v0.3",
+        "token_rate": 55.0,
+        "max_concurrency": 16,
+        "max_model_len": 32768,
+    },
+    "deepseek_r1": {
+        "model": "deepseek-ai/DeepSeek-R1-Distill-Qwen-7B",
+        "token_rate": 50.0,
+        "max_concurrency": 12,
+        "max_model_len": 8096,
+    },
+}
+
+
+def read_beam_token() -> str:
+    token = os.getenv("BEAM_AUTH_TOKEN") or os.getenv("BEAM_TOKEN")
+    if token:
+        return token
+
+    config_path = os.path.expanduser("~/.beam/config.ini")
+    if os.path.exists(config_path):
+        for line in open(config_path).read().split("\n"):
+            if line.startswith("token"):
+                return line.split(" = ")[1].strip()
+    return ""
+
+
+def run_session(
+    client: OpenAI,
+    model: str,
+    session_id: int,
+    turns: int,
+    max_tokens: Optional[int],
+    token_budget: Optional[int],
+    think_time: float,
+    use_tokenizer: bool,
+    seed: Optional[int],
+) -> List[Dict[str, Any]]:
+    """Runs one chat session and returns the metrics of each of its turns."""
+    rng = random.Random(None if seed is None else seed + session_id)
+    chat_app = ChatApplication(client, model, max_tokens=max_tokens, echo=False)
+    chat_app.history = ConversationHistory(
+        model, token_budget=token_budget, use_tokenizer=use_tokenizer
+    )
+    chat_app.history.append(
+        {"role": "system", "content": SYSTEM_PROMPTS[session_id % len(SYSTEM_PROMPTS)]}
+    )
+    conversation = CONVERSATIONS[session_id % len(CONVERSATIONS)]
+
+    results = []
+    for turn in range(turns):
+        started_at = time.perf_counter()
+        try:
+            chat_app.process_user_input(conversation[turn % len(conversation)], stream=True)
+        except openai.OpenAIError as e:
+            # The history now ends with an unanswered message, so end the session
+            results.append(
+                {
+                    "session": session_id,
+                    "turn": turn,
+                    "error": str(e),
+                    "latency": time.perf_counter() - started_at,
+                }
+            )
+            break
+
+        metrics = chat_app.last_metrics
+        results.append(
+            {
+                "session": session_id,
+                "turn": turn,
+                "error": None,
+                "latency": metrics.total_time,
+                "ttft": metrics.time_to_first_token,
+                "inter_token_latencies": metrics.inter_token_latencies,
+                "output_tokens": metrics.output_tokens or len(metrics.token_times),
+            }
+        )
+
+        if think_time and turn < turns - 1:
+            time.sleep(rng.expovariate(1 / think_time))
+
+    return results
+
+
+def summarize(results: List[Dict[str, Any]], elapsed: float) -> Dict[str, Any]:
+    completed = [r for r in results if r["error"] is None]
+    ttfts = [r["ttft"] for r in completed if r["ttft"] is not None]
+    latencies = [r["latency"] for r in completed]
+    itls = [itl for r in completed for itl in r["inter_token_latencies"]]
+    output_tokens = sum(r["output_tokens"] for r in completed)
+
+    return {
+        "turns": len(completed),
+        "errors": len(results) - len(completed),
+        "elapsed": elapsed,
+        "turns_per_second": len(completed) / elapsed if elapsed else 0,
+        "output_tokens": output_tokens,
+        "output_tokens_per_second": output_tokens / elapsed if elapsed else 0,
+        **{f"ttft_p{q}": percentile(ttfts, q) for q in (50, 90, 99)},
+        **{f"latency_p{q}": percentile(latencies, q) for q in (50, 90, 99)},
+        **{f"itl_p{q}": percentile(itls, q) for q in (50, 99)},
+    }
+
+
+def benchmark_deployment(
+    name: str,
+    url: str,
+    token: str,
+    sessions: int = 16,
+    turns: int = 4,
+    max_tokens: Optional[int] = 256,
+    think_time: float = 0.0,
+    ramp_up: float = 0.0,
+    warmup: bool = True,
+    use_tokenizer: bool = True,
+    seed: Optional[int] = None,
+) -> Dict[str, Any]:
+    client = OpenAI(api_key=token, base_url=f"{url}/v1", max_retries=0, timeout=600)
+
+    models = client.models.list()
+    model = models.data[0].id
+    max_model_len = getattr(models.data[0], "max_model_len", None)
+    token_budget = max_model_len - RESPONSE_TOKEN_RESERVE if max_model_len else None
+
+    if warmup:
+        # Don't count a cold start as latency under load
+        client.chat.completions.create(
+            model=model, messages=[{"role": "user", "content": "Hi"}], max_tokens=1
+        )
+
+    console.print(f"Benchmarking [bold]{name}[/bold] ({model}) with {sessions} sessions")
+    started_at = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=sessions) as executor:
+        futures = []
+        for session_id in range(sessions):
+            futures.append(
+                executor.submit(
+                    run_session,
+                    client,
+                    model,
+                    session_id,
+                    turns,
+                    max_tokens,
+                    token_budget,
+                    think_time,
+                    use_tokenizer,
+                    seed,
+                )
+            )
+            if ramp_up:
+                time.sleep(ramp_up / sessions)
+        results = [r for future in futures for r in future.result()]
+    elapsed = time.perf_counter() - started_at
+
+    return {
+        "deployment": name,
+        "url": url,
+        "model": model,
+        "sessions": sessions,
+        "turns_per_session": turns,
+        "max_tokens": max_tokens,
+        **summarize(results, elapsed),
+    }
+
+
+def print_reports(reports: List[Dict[str, Any]]) -> None:
+    def ms(value: Optional[float]) -> str:
+        return f"{value * 1000:.0f}" if value is not None else "-"
+
+    table = Table(title="vLLM Deployment Benchmark")
+    table.add_column("Deployment", style="bold")
+    table.add_column("Turns", justify="right")
+    table.add_column("Errors", justify="right")
+    table.add_column("Turns/s", justify="right")
+    table.add_column("Tokens/s", justify="right")
+    table.add_column("TTFT p50/p90/p99 (ms)", justify="right")
+    table.add_column("Latency p50/p90/p99 (ms)", justify="right")
+    table.add_column("ITL p50/p99 (ms)", justify="right")
+
+    for report in reports:
+        table.add_row(
+            report["deployment"],
+            str(report["turns"]),
+            str(report["errors"]),
+            f"{report['turns_per_second']:.2f}",
+            f"{report['output_tokens_per_second']:.1f}",
+            "/".join(ms(report[f"ttft_p{q}"]) for q in (50, 90, 99)),
+            "/".join(ms(report[f"latency_p{q}"]) for q in (50, 90, 99)),
+            "/".join(ms(report[f"itl_p{q}"]) for q in (50, 99)),
+        )
+    console.print(table)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark vLLM deployments")
+    parser.add_argument(
+        "--deployment",
+        action="append",
+        default=[],
+        metavar="NAME=URL",
+        help="Deployment to benchmark, can be repeated",
+    )
+    parser.add_argument(
+        "--stub", action="store_true", help="Benchmark local stub servers instead"
+    )
+    parser.add_argument("--stub-token-rate", type=float, help="Override the stubs' tokens/second")
+    parser.add_argument("--stub-max-concurrency", type=int, help="Override the stubs' batch size")
+    parser.add_argument("--sessions", type=int, default=16, help="Concurrent chat sessions")
+    parser.add_argument("--turns", type=int, default=4, help="Turns per session")
+    parser.add_argument("--max-tokens", type=int, default=256, help="Max tokens per response")
+    parser.add_argument("--think-time", type=float, default=0.0, help="Mean seconds between turns")
+    parser.add_argument("--ramp-up", type=float, default=0.0, help="Seconds to start all sessions over")
+    parser.add_argument("--no-warmup", action="store_true", help="Skip the warmup request")
+    parser.add_argument("--seed", type=int, help="Seed for think times")
+    parser.add_argument("--report", default="vllm_benchmark.json", help="JSON report path")
+    args = parser.parse_args()
+
+    deployments = dict(d.split("=", 1) for d in args.deployment)
+    stubs = []
+    if args.stub:
+        for name in deployments or STUB_PROFILES:
+            profile = dict(STUB_PROFILES[name])
+            if args.stub_token_rate:
+                profile["token_rate"] = args.stub_token_rate
+            if args.stub_max_concurrency:
+                profile["max_concurrency"] = args.stub_max_concurrency
+            stub = StubServer(profile.pop("model"), **profile).start()
+            stubs.append(stub)
+            deployments[name] = stub.url
+    elif not deployments:
+        parser.error("Pass at least one --deployment, or --stub")
+
+    token = "stub" if args.stub else read_beam_token()
+    reports = []
+    try:
+        for name, url in deployments.items():
+            reports.append(
+                benchmark_deployment(
+                    name,
+                    url,
+                    token,
+                    sessions=args.sessions,
+                    turns=args.turns,
+                    max_tokens=args.max_tokens,
+                    think_time=args.think_time,
+                    ramp_up=args.ramp_up,
+                    warmup=not args.no_warmup,
+                    # The stubs serve real model names, don't download their tokenizers
+                    use_tokenizer=not args.stub,
+                    seed=args.seed,
+                )
+            )
+    finally:
+        for stub in stubs:
+            stub.stop()
+
+    print_reports(reports)
+    with open(args.report, "w") as f:
+        json.dump(reports, f, indent=2)
+    console.print(f"Report written to {args.report}")
+
+
+if __name__ == "__main__":
+    main()
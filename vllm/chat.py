@@ -1,10 +1,18 @@
+import asyncio
+import inspect
+import itertools
 import json
 import os
 import time
-from typing import Any, Dict, List, Optional
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
-from openai import OpenAI
+from openai import AsyncOpenAI, OpenAI
 from openai.types.chat import ChatCompletion, ChatCompletionMessage
+from openai.types.completion_usage import CompletionUsage
 
 from transformers import AutoTokenizer
 from rich.console import Console
@@ -12,8 +20,139 @@ from rich.panel import Panel
 from rich.prompt import Prompt
 from rich.progress import Progress
 from rich.live import Live
+from rich.text import Text
+
+from hedging import HedgePolicy
+from router import Backend, Router
+
+
+# Defaults for tools that were not registered with the `tool` decorator
+DEFAULT_TOOL_TIMEOUT = 30.0
+DEFAULT_TOOL_CACHE_TTL = 300.0
+# Memoized results kept across all pure tools, least recently used are evicted first
+DEFAULT_TOOL_CACHE_ENTRIES = 1024
+
+
+def tool(
+    pure: bool = False,
+    timeout: float = DEFAULT_TOOL_TIMEOUT,
+    cache_ttl: float = DEFAULT_TOOL_CACHE_TTL,
+) -> Callable:
+    """
+    Attach execution options to a tool function, sync or async. Results of pure
+    tools, whose output depends only on their arguments, are memoized for `cache_ttl`
+    seconds.
+    """
+
+    def decorator(func: Callable) -> Callable:
+        func.tool_options = {"pure": pure, "timeout": timeout, "cache_ttl": cache_ttl}
+        return func
+
+    return decorator
+
+
+class ToolExecutor:
+    """Runs every tool call of an assistant message concurrently."""
+
+    def __init__(
+        self,
+        registry: Dict[str, Callable],
+        max_cache_entries: int = DEFAULT_TOOL_CACHE_ENTRIES,
+    ):
+        self.registry = registry
+        self.max_cache_entries = max_cache_entries
+        # (name, canonical arguments) -> (expires_at, result), in least recently
+        # used order
+        self._cache: "OrderedDict[tuple, tuple]" = OrderedDict()
+
+    def _options(self, func: Callable) -> Dict[str, Any]:
+        return getattr(
+            func,
+            "tool_options",
+            {
+                "pure": False,
+                "timeout": DEFAULT_TOOL_TIMEOUT,
+                "cache_ttl": DEFAULT_TOOL_CACHE_TTL,
+            },
+        )
+
+    async def _invoke(
+        self, func: Callable, arguments: Dict[str, Any], pool: ThreadPoolExecutor
+    ) -> Any:
+        if inspect.iscoroutinefunction(func):
+            return await func(**arguments)
+        # Sync tools run in a thread so they don't block the other calls
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(pool, lambda: func(**arguments))
+
+    def _cache_get(self, key: tuple) -> Optional[tuple]:
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            del self._cache[key]
+            return None
+        self._cache.move_to_end(key)
+        return entry
+
+    def _cache_put(self, key: tuple, result: Any, ttl: float) -> None:
+        now = time.monotonic()
+        # Tools have different TTLs, so expired entries can be anywhere
+        for expired in [k for k, entry in self._cache.items() if entry[0] <= now]:
+            del self._cache[expired]
+        self._cache[key] = (now + ttl, result)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.max_cache_entries:
+            self._cache.popitem(last=False)
+
+    async def _run(self, tool_call: Any, pool: ThreadPoolExecutor) -> Dict[str, Any]:
+        name = tool_call.function.name
+        func = self.registry.get(name)
+
+        if func is None:
+            content = f"Error: unknown tool '{name}'"
+        else:
+            options = self._options(func)
+            try:
+                arguments = json.loads(tool_call.function.arguments or "{}")
+                key = (name, json.dumps(arguments, sort_keys=True))
+                cached = self._cache_get(key) if options["pure"] else None
+
+                if cached is not None:
+                    result = cached[1]
+                else:
+                    result = await asyncio.wait_for(
+                        self._invoke(func, arguments, pool), timeout=options["timeout"]
+                    )
+                    if options["pure"]:
+                        self._cache_put(key, result, options["cache_ttl"])
+                content = result if isinstance(result, str) else json.dumps(result)
+            except asyncio.TimeoutError:
+                content = f"Error: {name} timed out after {options['timeout']}s"
+            except (json.JSONDecodeError, TypeError) as e:
+                content = f"Error: invalid arguments for {name}: {e}"
+            except Exception as e:
+                content = f"Error: {name} failed: {e}"
+
+        return {"role": "tool", "tool_call_id": tool_call.id, "content": content}
+
+    async def execute(self, tool_calls: List[Any]) -> List[Dict[str, Any]]:
+        """Returns one `tool` message per call, in the order the calls were made."""
+        # A pool per turn, not the loop's default executor, which asyncio.run waits
+        # for on exit: a sync tool that timed out is left to finish on its own
+        pool = ThreadPoolExecutor(max_workers=max(len(tool_calls), 1))
+        try:
+            return list(
+                await asyncio.gather(*(self._run(call, pool) for call in tool_calls))
+            )
+        finally:
+            pool.shutdown(wait=False)
+
+    def clear_cache(self) -> None:
+        self._cache.clear()
 
 
+@tool(pure=True)
 def get_current_weather(city: str, state: str, unit: str) -> str:
     """Mock weather function that returns a fixed response."""
     return f"The weather in {city}, {state} is 75 degrees {unit}. It is sunny with light clouds."
@@ -49,34 +188,316 @@ tools = [
     }
 ]
 
+# Tools can be sync or async functions
 available_tools = {"get_current_weather": get_current_weather}
 
-
-class ChatApplication:
-    def __init__(self, client: OpenAI, model: str):
-        self.client = client
+# Follow-up completions allowed for a single user message before giving up on tools
+MAX_TOOL_ROUNDS = 5
+
+
+@lru_cache(maxsize=None)
+def get_tokenizer(model: str):
+    """Load a model's tokenizer once, rather than on every turn."""
+    return AutoTokenizer.from_pretrained(model)
+
+
+def count_output_tokens(
+    model: str, text: str, usage: Optional[CompletionUsage] = None
+) -> int:
+    """Prefer the token count reported by the server, tokenizing locally only as a fallback."""
+    if usage is not None and usage.completion_tokens is not None:
+        return usage.completion_tokens
+    return len(get_tokenizer(model).encode(text))
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """Linearly interpolated percentile, q between 0 and 100."""
+    if not values:
+        return None
+    values = sorted(values)
+    index = (len(values) - 1) * q / 100
+    lower = int(index)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (index - lower)
+
+
+class TurnMetrics:
+    """Latency of a single streamed response, as seen by the client."""
+
+    def __init__(self):
+        self.start_time = time.perf_counter()
+        self.token_times: List[float] = []
+        self.end_time: Optional[float] = None
+        self.output_tokens: Optional[int] = None
+
+    def record_token(self) -> None:
+        """Call whenever a chunk with content arrives."""
+        self.token_times.append(time.perf_counter())
+
+    def finish(self) -> None:
+        self.end_time = time.perf_counter()
+
+    @property
+    def total_time(self) -> float:
+        return (self.end_time or time.perf_counter()) - self.start_time
+
+    @property
+    def time_to_first_token(self) -> Optional[float]:
+        if not self.token_times:
+            return None
+        return self.token_times[0] - self.start_time
+
+    @property
+    def inter_token_latencies(self) -> List[float]:
+        return [b - a for a, b in zip(self.token_times, self.token_times[1:])]
+
+    @property
+    def decode_tokens_per_second(self) -> Optional[float]:
+        # Tokens after the first, over the time between first and last token.
+        # Chunks stand in for tokens when the server did not report usage.
+        if len(self.token_times) < 2:
+            return None
+        tokens = self.output_tokens or len(self.token_times)
+        decode_time = self.token_times[-1] - self.token_times[0]
+        return (tokens - 1) / decode_time if decode_time > 0 else None
+
+    def to_dict(self) -> Dict[str, Any]:
+        itl = self.inter_token_latencies
+        return {
+            "total_time": self.total_time,
+            "time_to_first_token": self.time_to_first_token,
+            "inter_token_latency_p50": percentile(itl, 50),
+            "inter_token_latency_p99": percentile(itl, 99),
+            "decode_tokens_per_second": self.decode_tokens_per_second,
+            "output_tokens": self.output_tokens,
+        }
+
+
+class SessionMetrics:
+    """Aggregates the streaming latency of every turn in a chat session."""
+
+    def __init__(self, model: str):
         self.model = model
-        self.conversation_history: List[Dict[str, Any]] = []
-
-    def handle_tool_calls(self, assistant_message: ChatCompletionMessage) -> str:
-        """Handle tool calls and return the processed response."""
-        responses = []
+        self.turns: List[TurnMetrics] = []
+
+    def add(self, turn: TurnMetrics) -> None:
+        self.turns.append(turn)
+
+    def summary(self) -> Dict[str, Any]:
+        ttfts = [
+            t.time_to_first_token
+            for t in self.turns
+            if t.time_to_first_token is not None
+        ]
+        itls = [itl for t in self.turns for itl in t.inter_token_latencies]
+        decode_rates = [
+            t.decode_tokens_per_second
+            for t in self.turns
+            if t.decode_tokens_per_second is not None
+        ]
+        return {
+            "model": self.model,
+            "turns": len(self.turns),
+            **{f"ttft_p{q}": percentile(ttfts, q) for q in (50, 90, 99)},
+            **{f"itl_p{q}": percentile(itls, q) for q in (50, 90, 99)},
+            "decode_tokens_per_second_mean": (
+                sum(decode_rates) / len(decode_rates) if decode_rates else None
+            ),
+        }
+
+
+# Rough token cost of an image part, used when budgeting the history
+IMAGE_TOKEN_ESTIMATE = 1024
+# Tokens of the context window kept free for the response
+RESPONSE_TOKEN_RESERVE = 1024
+
+
+class ConversationHistory:
+    """
+    Chat history that stays within a token budget.
+
+    Each message's token count is computed once, when it is appended, and a running
+    total is kept. When the total goes over the budget, the oldest turns are
+    dropped (system messages and the latest turn are always kept). If a
+    `summarizer` is given, it is called with the dropped messages and its result is
+    kept as a single system message in their place. Appending a message identical
+    to the previous one is a no-op.
+    """
+
+    def __init__(
+        self,
+        model: str,
+        token_budget: Optional[int] = None,
+        summarizer: Optional[Callable[[List[Dict[str, Any]]], str]] = None,
+        use_tokenizer: bool = True,
+    ):
+        self.model = model
+        self.token_budget = token_budget
+        self.summarizer = summarizer
+        self._messages: List[Dict[str, Any]] = []
+        self._token_counts: List[int] = []
+        # Without the model's tokenizer, tokens are estimated from the length
+        self._use_tokenizer = use_tokenizer
+        self._summary_index: Optional[int] = None
+        self.total_tokens = 0
+
+    @property
+    def messages(self) -> List[Dict[str, Any]]:
+        return self._messages
+
+    def __len__(self) -> int:
+        return len(self._messages)
+
+    def count_tokens(self, message: Dict[str, Any]) -> int:
+        content = message.get("content") or ""
+        if isinstance(content, str):
+            texts, images = [content], 0
+        else:
+            texts = [p.get("text", "") for p in content if p.get("type") == "text"]
+            images = sum(1 for p in content if p.get("type") == "image_url")
+        # Tool calls made by the assistant are sent back as part of its message
+        for tool_call in message.get("tool_calls") or []:
+            texts.append(tool_call["function"]["name"])
+            texts.append(tool_call["function"]["arguments"])
+
+        text = "\n".join(texts)
+        tokens = None
+        if self._use_tokenizer:
+            try:
+                tokens = len(get_tokenizer(self.model).encode(text))
+            except (OSError, ValueError):
+                # Gated or unknown tokenizer, don't try to load it again
+                self._use_tokenizer = False
+        if tokens is None:
+            # Roughly 4 characters per token
+            tokens = len(text) // 4 + 1
+        # A few tokens of chat template overhead per message
+        return tokens + 4 + images * IMAGE_TOKEN_ESTIMATE
+
+    def append(self, message: Dict[str, Any]) -> None:
+        if self._messages and self._messages[-1] == message:
+            return
+
+        tokens = self.count_tokens(message)
+        self._messages.append(message)
+        self._token_counts.append(tokens)
+        self.total_tokens += tokens
+        self._enforce_budget()
+
+    def _enforce_budget(self) -> None:
+        if self.token_budget is None or self.total_tokens <= self.token_budget:
+            return
+
+        # The latest turn, from the last user message on, is always kept
+        last_turn = max(
+            (i for i, m in enumerate(self._messages) if m["role"] == "user"),
+            default=len(self._messages) - 1,
+        )
 
-        for tool_call in assistant_message.tool_calls:
-            function_name = tool_call.function.name
-            if function_name not in available_tools:
+        # Drop whole turns from the front, keeping system messages other than an
+        # earlier summary, which gets folded into the new one
+        dropped: List[Dict[str, Any]] = []
+        index = 0
+        while index < last_turn:
+            message = self._messages[index]
+            if message["role"] == "system" and index != self._summary_index:
+                index += 1
                 continue
+            at_turn_boundary = message["role"] == "user"
+            if at_turn_boundary and self.total_tokens <= self.token_budget:
+                break
 
-            try:
-                function_args = json.loads(tool_call.function.arguments)
-                function_response = available_tools[function_name](**function_args)
-                responses.append(function_response)
-            except (json.JSONDecodeError, TypeError) as e:
-                print(f"Error processing tool call: {e}")
-                continue
+            dropped.append(self._messages.pop(index))
+            self.total_tokens -= self._token_counts.pop(index)
+            if index == self._summary_index:
+                self._summary_index = None
+            elif self._summary_index is not None and index < self._summary_index:
+                self._summary_index -= 1
+            last_turn -= 1
+
+        # An earlier summary that wasn't dropped stays the one to fold in next time
+        if dropped and self.summarizer is not None:
+            summary = {
+                "role": "system",
+                "content": f"Summary of the earlier conversation: {self.summarizer(dropped)}",
+            }
+            tokens = self.count_tokens(summary)
+            self._messages.insert(index, summary)
+            self._token_counts.insert(index, tokens)
+            self.total_tokens += tokens
+            self._summary_index = index
 
-        # Return the first response (since we're only handling weather requests)
-        return responses[0] if responses else "I couldn't process that request."
+
+class ChatApplication:
+    def __init__(
+        self,
+        client: OpenAI,
+        model: str,
+        token_budget: Optional[int] = None,
+        max_tokens: Optional[int] = None,
+        echo: bool = True,
+        hedge: Optional[HedgePolicy] = None,
+        hedge_clients: Optional[Tuple[Any, Any]] = None,
+    ):
+        self.client = client
+        self.model = model
+        # Opt-in hedging over a pair of async clients, for the request and its
+        # duplicate, e.g. another deployment. They are async so the loser can be
+        # cancelled, closing its connection
+        if hedge is not None and hedge_clients is None:
+            raise ValueError("hedge_clients is required for hedging")
+        self.hedge = hedge
+        self.hedge_clients = hedge_clients
+        self.max_tokens = max_tokens
+        # Whether process_user_input prints to the terminal
+        self.echo = echo
+        self.history = ConversationHistory(model, token_budget=token_budget)
+        # Token usage reported by the server for the most recent response
+        self.last_usage: Optional[CompletionUsage] = None
+        # Streaming latency of the most recent response, and of the whole session
+        self.last_metrics: Optional[TurnMetrics] = None
+        self.session_metrics = SessionMetrics(model)
+        self.tool_executor = ToolExecutor(available_tools)
+
+    @property
+    def conversation_history(self) -> List[Dict[str, Any]]:
+        return self.history.messages
+
+    def create_completion(self, **kwargs: Any) -> Any:
+        """Create a chat completion, hedged if a HedgePolicy was given."""
+        if self.hedge is None:
+            return self.client.chat.completions.create(**kwargs)
+
+        async def attempt(client: Any) -> Any:
+            response = await client.chat.completions.create(**kwargs)
+            if not kwargs.get("stream"):
+                return response, []
+            # Wait for the first token, servers send the role straight away
+            received = []
+            while not received or (
+                received[-1].choices and not received[-1].choices[0].delta.content
+            ):
+                try:
+                    received.append(await response.__anext__())
+                except StopAsyncIteration:
+                    break
+            return response, received
+
+        primary, duplicate = self.hedge_clients
+        response, received = self.hedge.run(
+            lambda: attempt(primary), lambda: attempt(duplicate)
+        )
+        if not kwargs.get("stream"):
+            return response
+        # Then hand back the rest of the stream
+        close = getattr(response, "aclose", None) or getattr(response, "close", None)
+        return itertools.chain(received, self.hedge.iterate(response, close))
+
+    def handle_tool_calls(
+        self, assistant_message: ChatCompletionMessage
+    ) -> List[Dict[str, Any]]:
+        """Run the message's tool calls concurrently and return their `tool` messages."""
+        return asyncio.run(self.tool_executor.execute(assistant_message.tool_calls))
 
     def supports_tools(self) -> bool:
         """Check if the current model supports tool calling."""
@@ -87,7 +508,7 @@ class ChatApplication:
     ) -> str:
         """Process user input and return assistant's response."""
         if self.model == "OpenGVLab/InternVL3-8B-AWQ" and img_link:
-            self.conversation_history.append(
+            self.history.append(
                 {
                     "role": "user",
                     "content": [
@@ -97,36 +518,68 @@ class ChatApplication:
                 }
             )
         else:
-            self.conversation_history.append({"role": "user", "content": user_input})
+            self.history.append({"role": "user", "content": user_input})
 
-        response = self.client.chat.completions.create(
+        metrics = TurnMetrics()
+        # Usage of this turn only, a server that sends none mustn't reuse the last one
+        self.last_usage = None
+        response = self.create_completion(
             model=self.model,
             messages=self.conversation_history,
             tools=tools if self.supports_tools() else None,
+            max_tokens=self.max_tokens,
             stream=stream,
+            stream_options={"include_usage": True} if stream else None,
         )
 
         if stream:
-            print("Assistant: ", end="", flush=True)
-            full_response = ""
+            if self.echo:
+                print("Assistant: ", end="", flush=True)
+            parts = []
             for chunk in response:
-                if chunk.choices[0].delta.content:
-                    content = chunk.choices[0].delta.content
-                    full_response += content
-            print()
-            self.conversation_history.append(
+                # The final chunk carries the usage and has no choices
+                if chunk.usage:
+                    self.last_usage = chunk.usage
+                if chunk.choices and chunk.choices[0].delta.content:
+                    metrics.record_token()
+                    parts.append(chunk.choices[0].delta.content)
+            metrics.finish()
+            full_response = "".join(parts)
+            metrics.output_tokens = count_output_tokens(
+                self.model, full_response, self.last_usage
+            )
+            self.last_metrics = metrics
+            self.session_metrics.add(metrics)
+            if self.echo:
+                print()
+            self.history.append(
                 {"role": "assistant", "content": full_response}
             )
             return full_response
 
         else:
+            self.last_usage = response.usage
             assistant_message = response.choices[0].message
-            final_response = ""
-            if self.supports_tools() and assistant_message.tool_calls:
-                final_response = self.handle_tool_calls(assistant_message)
-            else:
-                final_response = assistant_message.content
-            self.conversation_history.append(
+
+            # Feed the tool results back until the model answers in text
+            for _ in range(MAX_TOOL_ROUNDS):
+                if not (self.supports_tools() and assistant_message.tool_calls):
+                    break
+                self.history.append(assistant_message.model_dump(exclude_none=True))
+                for message in self.handle_tool_calls(assistant_message):
+                    self.history.append(message)
+
+                response = self.create_completion(
+                    model=self.model,
+                    messages=self.conversation_history,
+                    tools=tools,
+                    max_tokens=self.max_tokens,
+                )
+                self.last_usage = response.usage
+                assistant_message = response.choices[0].message
+
+            final_response = assistant_message.content or ""
+            self.history.append(
                 {"role": "assistant", "content": final_response}
             )
             return final_response
@@ -135,6 +588,115 @@ class ChatApplication:
 console = Console()
 
 
+class StreamRenderer:
+    """
+    Renders a streamed response without re-rendering the whole answer per chunk.
+
+    In "panel" mode, chunks are appended to a single rich Text inside the Live
+    panel, and Live redraws it at most refresh_per_second times. In "append" mode,
+    chunks are written straight to the terminal and never redrawn at all.
+    """
+
+    def __init__(
+        self, console: Console, mode: str = "panel", refresh_per_second: int = 10
+    ):
+        self.console = console
+        self.mode = mode
+        self.refresh_interval = 1 / refresh_per_second
+        self.parts: List[str] = []
+        self._live: Optional[Live] = None
+        self._rich_text = Text()
+        self._last_flush = 0.0
+
+    def __enter__(self) -> "StreamRenderer":
+        if self.mode == "panel":
+            self._live = Live(
+                Panel(
+                    "⏳ [bold cyan]Thinking...[/bold cyan]",
+                    title="Assistant",
+                    expand=False,
+                    style="cyan",
+                ),
+                console=self.console,
+                refresh_per_second=1 / self.refresh_interval,
+            )
+            self._live.__enter__()
+        else:
+            self.console.print("[bold cyan]Assistant:[/bold cyan] ", end="")
+        return self
+
+    def append(self, content: str) -> None:
+        self.parts.append(content)
+
+        if self._live is not None:
+            if len(self.parts) == 1:
+                # Swap the placeholder for the panel once, afterwards only the
+                # Text is mutated and Live picks it up on its next refresh
+                self._live.update(
+                    Panel(self._rich_text, title="Assistant", expand=False, style="cyan"),
+                    refresh=False,
+                )
+            self._rich_text.append(content)
+            return
+
+        self.console.file.write(content)
+        now = time.perf_counter()
+        if now - self._last_flush >= self.refresh_interval:
+            self.console.file.flush()
+            self._last_flush = now
+
+    @property
+    def text(self) -> str:
+        return "".join(self.parts)
+
+    def __exit__(self, *exc) -> None:
+        if self._live is not None:
+            self._live.__exit__(*exc)
+        else:
+            self.console.file.write("\n")
+            self.console.file.flush()
+
+
+def print_turn_metrics(metrics: TurnMetrics) -> None:
+    itl = metrics.inter_token_latencies
+    console.print(
+        f"🚀 [bold yellow]Time To First Token:[/bold yellow] {metrics.time_to_first_token:.3f}s"
+    )
+    if itl:
+        console.print(
+            f"⏱️ [bold yellow]Inter-Token Latency:[/bold yellow] "
+            f"p50 {percentile(itl, 50) * 1000:.1f}ms, p99 {percentile(itl, 99) * 1000:.1f}ms"
+        )
+    if metrics.decode_tokens_per_second is not None:
+        console.print(
+            f"🔁 [bold yellow]Decode Tokens Per Second:[/bold yellow] "
+            f"{metrics.decode_tokens_per_second:.2f}"
+        )
+
+
+def print_session_summary(session: SessionMetrics) -> None:
+    summary = session.summary()
+
+    def ms(value: Optional[float]) -> str:
+        return f"{value * 1000:.1f}ms" if value is not None else "-"
+
+    decode_rate = summary["decode_tokens_per_second_mean"]
+    console.print(
+        Panel(
+            f"[bold]Model:[/bold] {summary['model']} ({summary['turns']} turns)\n"
+            f"[bold]TTFT:[/bold] p50 {ms(summary['ttft_p50'])}, "
+            f"p90 {ms(summary['ttft_p90'])}, p99 {ms(summary['ttft_p99'])}\n"
+            f"[bold]Inter-token latency:[/bold] p50 {ms(summary['itl_p50'])}, "
+            f"p90 {ms(summary['itl_p90'])}, p99 {ms(summary['itl_p99'])}\n"
+            f"[bold]Decode tokens/sec:[/bold] "
+            f"{f'{decode_rate:.2f}' if decode_rate is not None else '-'}",
+            title="Session Latency Summary",
+            expand=False,
+            style="yellow",
+        )
+    )
+
+
 def chat() -> None:
     """Main chat loop"""
     console.print(
@@ -156,17 +718,61 @@ def chat() -> None:
     beam_token = beam_config[1].split(" = ")[1].strip()
 
     stream = Prompt.ask("[bold yellow]Stream mode? (y/n)[/bold yellow]").lower() == "y"
+    render_mode = "panel"
+    if stream:
+        render_mode = Prompt.ask(
+            "[bold yellow]Render mode[/bold yellow]",
+            choices=["panel", "append"],
+            default="panel",
+        )
 
-    client = OpenAI(
-        api_key=beam_token,
-        base_url=f"{app_url}/v1",
-    )
+    app_urls = [url.strip() for url in app_url.split(",") if url.strip()]
+    if len(app_urls) > 1:
+        # Several deployments, send each turn to whichever can answer soonest
+        router = Router([Backend(url, beam_token) for url in app_urls])
+        router.refresh_models()
+        conversation_id = uuid.uuid4().hex
+        client = router.client(conversation_id)
+        # Duplicates get a separate conversation, so they go to the least loaded
+        # deployment
+        hedge_clients = (router.async_client(conversation_id), router.async_client())
+    else:
+        client = OpenAI(
+            api_key=beam_token,
+            base_url=f"{app_urls[0]}/v1",
+        )
+        # Beam spreads the duplicate over the deployment's containers
+        async_client = AsyncOpenAI(api_key=beam_token, base_url=f"{app_urls[0]}/v1")
+        hedge_clients = (async_client, async_client)
 
     models = client.models.list()
-    model = models.data[0].id
+    model_card = models.data[0]
+    if len(models.data) > 1:
+        model_id = Prompt.ask(
+            "[bold yellow]Model[/bold yellow]",
+            choices=[m.id for m in models.data],
+            default=model_card.id,
+        )
+        model_card = next(m for m in models.data if m.id == model_id)
+    model = model_card.id
     console.print(Panel(f"✅ [bold green]Model {model} is ready[/bold green]"))
 
-    chat_app = ChatApplication(client, model)
+    # Keep the prompt within the context window, leaving room for the response
+    max_model_len = getattr(model_card, "max_model_len", None)
+    token_budget = os.getenv("CHAT_TOKEN_BUDGET")
+    if token_budget is None and max_model_len:
+        token_budget = max_model_len - RESPONSE_TOKEN_RESERVE
+    # Opt-in hedging of slow requests, e.g. CHAT_HEDGE_PERCENTILE=95
+    hedge = None
+    if os.getenv("CHAT_HEDGE_PERCENTILE"):
+        hedge = HedgePolicy(percentile=float(os.getenv("CHAT_HEDGE_PERCENTILE")))
+    chat_app = ChatApplication(
+        client,
+        model,
+        token_budget=int(token_budget) if token_budget else None,
+        hedge=hedge,
+        hedge_clients=hedge_clients,
+    )
 
     try:
         while True:
@@ -183,48 +789,43 @@ def chat() -> None:
                     "[bold yellow]Image link (press enter to skip)[/bold yellow]"
                 )
 
-            chat_app.conversation_history.append(
-                {"role": "user", "content": user_input}
-            )
-
             # Start timer
             start_time = time.time()
+            end_time = None
+            usage = None
+            turn_metrics = None
 
             if stream:
+                # The non-streaming path adds the message in process_user_input
+                chat_app.history.append({"role": "user", "content": user_input})
                 full_response = ""
                 try:
-                    with Live(
-                        Panel(
-                            "⏳ [bold cyan]Thinking...[/bold cyan]",
-                            title="Assistant",
-                            expand=False,
-                            style="cyan",
-                        ),
-                        console=console,
-                        refresh_per_second=10,
-                    ) as live:
-                        response = chat_app.client.chat.completions.create(
+                    with StreamRenderer(console, mode=render_mode) as renderer:
+                        turn_metrics = TurnMetrics()
+                        response = chat_app.create_completion(
                             model=chat_app.model,
                             messages=chat_app.conversation_history,
                             stream=True,
+                            stream_options={"include_usage": True},
                         )
 
                         for chunk in response:
+                            # The final chunk carries the usage and has no choices
+                            if chunk.usage:
+                                usage = chunk.usage
+                            if not chunk.choices:
+                                continue
                             if hasattr(chunk.choices[0].delta, "content"):
                                 content = chunk.choices[0].delta.content
                                 if content:
-                                    full_response += content
-                                    live.update(
-                                        Panel(
-                                            full_response,
-                                            title="Assistant",
-                                            expand=False,
-                                            style="cyan",
-                                        )
-                                    )
+                                    turn_metrics.record_token()
+                                    renderer.append(content)
+                        end_time = time.time()
+                        turn_metrics.finish()
+                    full_response = renderer.text
 
                     # Append final assistant message
-                    chat_app.conversation_history.append(
+                    chat_app.history.append(
                         {"role": "assistant", "content": full_response}
                     )
 
@@ -241,12 +842,10 @@ def chat() -> None:
                         response = chat_app.process_user_input(
                             user_input, img_link, stream
                         )
+                        end_time = time.time()
+                        usage = chat_app.last_usage
                         progress.update(task, advance=100)
 
-                    chat_app.conversation_history.append(
-                        {"role": "assistant", "content": response}
-                    )
-
                     console.print("\n✨ [bold green]Final Response:[/bold green] ✨")
                     console.print(
                         Panel(response, title="Assistant", expand=False, style="cyan")
@@ -257,12 +856,12 @@ def chat() -> None:
                         f"[bold red]Error during response generation:[/bold red] {e}"
                     )
 
-            # Measure tokens
-            tokenizer = AutoTokenizer.from_pretrained(model)
-            output_tokens = len(tokenizer.encode(full_response if stream else response))
+            # Measure tokens, outside of the timed generation
+            output_tokens = count_output_tokens(
+                model, full_response if stream else response, usage
+            )
 
-            end_time = time.time()
-            total_time = end_time - start_time
+            total_time = (end_time or time.time()) - start_time
             output_tokens_per_second = (
                 output_tokens / total_time if total_time > 0 else 0
             )
@@ -277,9 +876,23 @@ def chat() -> None:
                 f"⚡ [bold yellow]Tokens Per Second:[/bold yellow] {output_tokens_per_second:.2f}"
             )
 
+            if turn_metrics is not None and turn_metrics.token_times:
+                turn_metrics.output_tokens = output_tokens
+                chat_app.session_metrics.add(turn_metrics)
+                print_turn_metrics(turn_metrics)
+
     except KeyboardInterrupt:
         console.print("\n[bold red]Exiting the chat.[/bold red]")
 
+    if chat_app.session_metrics.turns:
+        print_session_summary(chat_app.session_metrics)
+    if hedge is not None:
+        stats = hedge.stats()
+        console.print(
+            f"🪃 [bold yellow]Hedges:[/bold yellow] {stats['hedges_fired']} fired, "
+            f"{stats['hedges_won']} won, over {stats['requests']} requests"
+        )
+
 
 if __name__ == "__main__":
     chat()
@@ -0,0 +1 @@
+../utils/hedging/hedging.py
\ No newline at end of file
@@ -1,33 +1,114 @@
-from beam import Image, Volume, env, function
+from beam import Image, Volume, endpoint, env, function
 
 # These imports are only available in the remote environment
 if env.is_remote():
+    from fastapi.responses import JSONResponse
     from vllm import LLM
 
 # This beam volume is mounted as a file system and used to cache the downloaded model
 vllm_cache = Volume(name="yicoder", mount_path="./yicoder")
 
+image = (
+    Image()
+    .add_python_packages(["vllm", "huggingface_hub[hf-transfer]"])
+    .with_envs("HF_HUB_ENABLE_HF_TRANSFER=1")
+)
+
+# The engine is created once per container and reused by every call it serves,
+# since loading the weights and capturing CUDA graphs dominates a single prompt
+_llm = None
+
+
+def load_llm():
+    global _llm
+    if _llm is None:
+        _llm = LLM(
+            model="01-ai/Yi-Coder-9B-Chat",
+            download_dir=vllm_cache.mount_path,
+            max_model_len=8096,
+        )
+    return _llm
+
+
+def to_prompt_list(prompts):
+    """
+    Accepts a single prompt or a list of prompts. Anything else raises a ValueError,
+    a bare string would otherwise be iterated one character at a time.
+    """
+    if isinstance(prompts, str):
+        prompts = [prompts]
+    if (
+        not isinstance(prompts, list)
+        or not prompts
+        or not all(isinstance(prompt, str) and prompt for prompt in prompts)
+    ):
+        raise ValueError("Please provide a prompt or a list of prompts.")
+    return prompts
+
 
 @function(
-    image=Image()
-    .add_python_packages(["vllm", "huggingface_hub[hf-transfer]"])
-    .with_envs("HF_HUB_ENABLE_HF_TRANSFER=1"),
+    image=image,
     volumes=[vllm_cache],
     gpu="A100-40",
     memory="8Gi",
     cpu=1,
 )
 def yicoder(prompt: str):
-    llm = LLM(
-        model="01-ai/Yi-Coder-9B-Chat",
-        download_dir=vllm_cache.mount_path,
-        max_model_len=8096,
-    )
+    llm = load_llm()
     request_output = llm.chat(
         messages=[{"role": "user", "content": prompt}],
     )
     return request_output[0].outputs[0].text
 
 
+@function(
+    image=image,
+    volumes=[vllm_cache],
+    gpu="A100-40",
+    memory="8Gi",
+    cpu=1,
+)
+def yicoder_batch(prompts: list):
+    prompts = to_prompt_list(prompts)
+    llm = load_llm()
+    # A single call lets vLLM batch every prompt together, instead of one at a time
+    request_outputs = llm.chat(
+        messages=[[{"role": "user", "content": prompt}] for prompt in prompts],
+    )
+    return [output.outputs[0].text for output in request_outputs]
+
+
+@endpoint(
+    name="yicoder",
+    on_start=load_llm,
+    image=image,
+    volumes=[vllm_cache],
+    gpu="A100-40",
+    memory="8Gi",
+    cpu=1,
+)
+def yicoder_endpoint(context, **inputs):
+    llm = context.on_start_value
+    try:
+        prompts = to_prompt_list(inputs.get("prompts") or inputs.get("prompt"))
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+
+    request_outputs = llm.chat(
+        messages=[[{"role": "user", "content": prompt}] for prompt in prompts],
+    )
+    return {"outputs": [output.outputs[0].text for output in request_outputs]}
+
+
 if __name__ == "__main__":
     print(yicoder.remote("How can I use `echo` to say hi in my terminal?"))
+
+    print(
+        yicoder_batch.remote(
+            [
+                "How can I use `echo` to say hi in my terminal?",
+                "Write a Python function that reverses a linked list.",
+                "What does `git rebase --onto` do?",
+            ]
+        )
+    )
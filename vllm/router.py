@@ -0,0 +1,355 @@
+"""
+Client-side router across several OpenAI-compatible deployments, such as the
+ones in models.py or replicas of the same one.
+
+Each backend's latency is tracked as an exponentially weighted moving average,
+along with its in-flight requests, and every request goes to the backend serving
+the requested model that is expected to finish it soonest. Requests that carry a
+conversation id stick to the backend that served the conversation before, so
+follow-up turns reuse its prefix cache, unless that backend has fallen well
+behind the others.
+
+    router = Router([Backend(url, token) for url in urls])
+    router.refresh_models()
+    chat_app = ChatApplication(router.client(conversation_id="abc"), model)
+
+Run this file to see it balance chat sessions across local stub servers.
+"""
+
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+
+import openai
+from openai import AsyncOpenAI, OpenAI
+
+
+class Backend:
+    def __init__(
+        self,
+        url: str,
+        token: str,
+        name: Optional[str] = None,
+        timeout: float = 600,
+    ):
+        self.url = url.rstrip("/")
+        self.name = name or self.url
+        self.client = OpenAI(
+            api_key=token, base_url=f"{self.url}/v1", max_retries=0, timeout=timeout
+        )
+        # For requests that may be cancelled, such as hedges
+        self.async_client = AsyncOpenAI(
+            api_key=token, base_url=f"{self.url}/v1", max_retries=0, timeout=timeout
+        )
+        # Model id -> model card, filled in by Router.refresh_models
+        self.models: Dict[str, Any] = {}
+        self.ewma_latency: Optional[float] = None
+        self.in_flight = 0
+        self.requests = 0
+        self.failures = 0
+        self.unhealthy_until = 0.0
+
+    def expected_wait(self, default_latency: float) -> float:
+        # Requests already in flight are served before, or alongside, a new one
+        latency = self.ewma_latency if self.ewma_latency is not None else default_latency
+        return latency * (self.in_flight + 1)
+
+
+class _TrackedStream:
+    """
+    A streamed response whose backend stays in flight until the stream ends, fails
+    or is closed. The backend is released exactly once, also when a stream that was
+    never read is garbage collected.
+    """
+
+    def __init__(
+        self, router: "Router", backend: Backend, stream: Any, started_at: float
+    ):
+        self.router = router
+        self.backend = backend
+        self.stream = stream
+        self.started_at = started_at
+        self._iterator = None
+        self._released = False
+        self._release_lock = threading.Lock()
+
+    def _release(self, latency: Optional[float] = None, error: bool = False) -> None:
+        with self._release_lock:
+            if self._released:
+                return
+            self._released = True
+        self.router.release(self.backend, latency, error)
+
+    def _finish(self, exc: Optional[BaseException]) -> None:
+        if exc is None:
+            self._release(time.perf_counter() - self.started_at)
+        elif isinstance(exc, Exception):
+            # The connection failed or the server errored, e.g. httpx.ReadError
+            self._release(error=True)
+        else:
+            # Interrupted by the caller, don't let a partial time skew the average
+            self._release()
+
+    def __iter__(self) -> Iterator[Any]:
+        return self
+
+    def __next__(self) -> Any:
+        try:
+            if self._iterator is None:
+                self._iterator = iter(self.stream)
+            return next(self._iterator)
+        except StopIteration:
+            self._finish(None)
+            raise
+        except BaseException as e:
+            self._finish(e)
+            raise
+
+    def close(self) -> None:
+        self._release()
+        close = getattr(self.stream, "close", None)
+        if close is not None:
+            close()
+
+    def __del__(self) -> None:
+        self._release()
+
+
+class _TrackedAsyncStream(_TrackedStream):
+    def __aiter__(self) -> AsyncIterator[Any]:
+        return self
+
+    async def __anext__(self) -> Any:
+        try:
+            if self._iterator is None:
+                self._iterator = self.stream.__aiter__()
+            return await self._iterator.__anext__()
+        except StopAsyncIteration:
+            self._finish(None)
+            raise
+        except BaseException as e:
+            # Includes asyncio.CancelledError, which releases without an error
+            self._finish(e)
+            raise
+
+    async def aclose(self) -> None:
+        self._release()
+        close = getattr(self.stream, "aclose", None) or getattr(self.stream, "close", None)
+        if close is not None:
+            await close()
+
+    # Like openai's AsyncStream, where close is a coroutine too
+    close = aclose
+
+
+class Router:
+    def __init__(
+        self,
+        backends: List[Backend],
+        alpha: float = 0.3,
+        affinity_slack: float = 2.0,
+        failure_cooldown: float = 30.0,
+        max_conversations: int = 10000,
+    ):
+        self.backends = backends
+        # Weight of the newest sample in the latency average
+        self.alpha = alpha
+        # How much longer than the best backend a conversation's backend may take
+        # before the conversation is moved
+        self.affinity_slack = affinity_slack
+        self.failure_cooldown = failure_cooldown
+        self.max_conversations = max_conversations
+        self._affinity: "OrderedDict[str, Backend]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def refresh_models(self) -> None:
+        """Fetches the models each backend serves."""
+        for backend in self.backends:
+            try:
+                models = backend.client.models.list()
+                backend.models = {model.id: model for model in models.data}
+            except openai.OpenAIError as e:
+                print(f"Could not list models of {backend.name}: {e}")
+                backend.models = {}
+
+    def list_models(self) -> SimpleNamespace:
+        """The union of every backend's models, shaped like `client.models.list()`."""
+        cards = {}
+        for backend in self.backends:
+            for model_id, card in backend.models.items():
+                cards.setdefault(model_id, card)
+        return SimpleNamespace(data=list(cards.values()))
+
+    def select(self, model: str, conversation_id: Optional[str] = None) -> Backend:
+        """Picks a backend for a request and counts it as in flight."""
+        now = time.time()
+        with self._lock:
+            serving = [b for b in self.backends if model in b.models]
+            if not serving:
+                raise ValueError(f"No backend serves {model}")
+            # Fall back to unhealthy backends rather than failing outright
+            candidates = [b for b in serving if b.unhealthy_until <= now] or serving
+
+            # Backends without samples yet are assumed to be as fast as the best one,
+            # so they get tried
+            known = [b.ewma_latency for b in candidates if b.ewma_latency is not None]
+            default_latency = min(known) if known else 1.0
+
+            best = min(candidates, key=lambda b: b.expected_wait(default_latency))
+            if conversation_id is not None:
+                pinned = self._affinity.get(conversation_id)
+                if pinned in candidates and pinned.expected_wait(
+                    default_latency
+                ) <= self.affinity_slack * best.expected_wait(default_latency):
+                    best = pinned
+
+                self._affinity[conversation_id] = best
+                self._affinity.move_to_end(conversation_id)
+                if len(self._affinity) > self.max_conversations:
+                    self._affinity.popitem(last=False)
+
+            best.in_flight += 1
+            best.requests += 1
+            return best
+
+    def release(
+        self, backend: Backend, latency: Optional[float] = None, error: bool = False
+    ) -> None:
+        with self._lock:
+            backend.in_flight -= 1
+            if error:
+                backend.failures += 1
+                backend.unhealthy_until = time.time() + self.failure_cooldown
+                return
+            if latency is not None:
+                if backend.ewma_latency is None:
+                    backend.ewma_latency = latency
+                else:
+                    backend.ewma_latency += self.alpha * (latency - backend.ewma_latency)
+
+    def create_chat_completion(
+        self, conversation_id: Optional[str] = None, **kwargs: Any
+    ) -> Any:
+        """Sends a chat completion to the best backend for `kwargs["model"]`."""
+        backend = self.select(kwargs["model"], conversation_id)
+        started_at = time.perf_counter()
+        try:
+            response = backend.client.chat.completions.create(**kwargs)
+        except openai.OpenAIError:
+            self.release(backend, error=True)
+            raise
+        except BaseException:
+            # E.g. interrupted by the caller, which says nothing about the backend
+            self.release(backend)
+            raise
+
+        if kwargs.get("stream"):
+            return _TrackedStream(self, backend, response, started_at)
+
+        self.release(backend, time.perf_counter() - started_at)
+        return response
+
+    async def acreate_chat_completion(
+        self, conversation_id: Optional[str] = None, **kwargs: Any
+    ) -> Any:
+        """Async version of `create_chat_completion`, which can be cancelled."""
+        backend = self.select(kwargs["model"], conversation_id)
+        started_at = time.perf_counter()
+        try:
+            response = await backend.async_client.chat.completions.create(**kwargs)
+        except openai.OpenAIError:
+            self.release(backend, error=True)
+            raise
+        except BaseException:
+            # Cancelled by the caller, which says nothing about the backend
+            self.release(backend)
+            raise
+
+        if kwargs.get("stream"):
+            return _TrackedAsyncStream(self, backend, response, started_at)
+
+        self.release(backend, time.perf_counter() - started_at)
+        return response
+
+    def client(self, conversation_id: Optional[str] = None) -> SimpleNamespace:
+        """
+        Stand-in for the parts of `OpenAI` that ChatApplication uses, routing every
+        request of the conversation through this router.
+        """
+        conversation_id = conversation_id or uuid.uuid4().hex
+
+        def create(**kwargs: Any) -> Any:
+            return self.create_chat_completion(conversation_id, **kwargs)
+
+        return SimpleNamespace(
+            chat=SimpleNamespace(completions=SimpleNamespace(create=create)),
+            models=SimpleNamespace(list=self.list_models),
+        )
+
+    def async_client(self, conversation_id: Optional[str] = None) -> SimpleNamespace:
+        """Like `client`, but `chat.completions.create` is a coroutine, as on `AsyncOpenAI`."""
+        conversation_id = conversation_id or uuid.uuid4().hex
+
+        async def create(**kwargs: Any) -> Any:
+            return await self.acreate_chat_completion(conversation_id, **kwargs)
+
+        return SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+
+    def stats(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [
+                {
+                    "name": b.name,
+                    "models": sorted(b.models),
+                    "requests": b.requests,
+                    "in_flight": b.in_flight,
+                    "ewma_latency": b.ewma_latency,
+                    "failures": b.failures,
+                }
+                for b in self.backends
+            ]
+
+
+def main():
+    from chat import ChatApplication, ConversationHistory
+    from stub_server import StubServer
+
+    model = "mistralai/Mistral-7B-Instruct-v0.3"
+    # Three replicas of the same model, one of them much slower
+    stubs = [
+        StubServer(model, token_rate=rate, max_concurrency=4, response_tokens=32).start()
+        for rate in (80.0, 80.0, 20.0)
+    ]
+    router = Router(
+        [Backend(stub.url, "stub", name=f"stub-{i}") for i, stub in enumerate(stubs)]
+    )
+    router.refresh_models()
+
+    def session(session_id: int) -> List[str]:
+        chat_app = ChatApplication(
+            router.client(conversation_id=f"session-{session_id}"), model, echo=False
+        )
+        chat_app.history = ConversationHistory(model, use_tokenizer=False)
+        for turn in range(4):
+            chat_app.process_user_input(f"Question {turn} of session {session_id}", stream=True)
+        return [m["role"] for m in chat_app.conversation_history]
+
+    try:
+        with ThreadPoolExecutor(max_workers=12) as executor:
+            list(executor.map(session, range(24)))
+    finally:
+        for stub in stubs:
+            stub.stop()
+
+    for backend in router.stats():
+        latency = backend["ewma_latency"]
+        latency = f"{latency:.3f}s" if latency is not None else "-"
+        print(f"{backend['name']}: {backend['requests']} requests, EWMA latency {latency}")
+
+
+if __name__ == "__main__":
+    main()
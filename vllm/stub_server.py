@@ -0,0 +1,257 @@
+"""
+Local stand-in for a vLLM OpenAI-compatible server.
+
+It implements `/v1/models` and `/v1/chat/completions` (streaming and not) and
+generates tokens at a configurable rate, so `benchmark.py` and `chat.py` can be
+exercised offline:
+
+    python stub_server.py --model mistralai/Mistral-7B-Instruct-v0.3 --token-rate 40
+
+Prefill time grows with the prompt length, and at most `max_concurrency`
+requests are decoded at once, the rest queue like they would on a full GPU.
+"""
+
+import argparse
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def estimate_tokens(messages):
+    # Roughly 4 characters per token, images cost a fixed amount
+    tokens = 0
+    for message in messages:
+        content = message.get("content") or ""
+        if isinstance(content, str):
+            tokens += len(content) // 4 + 1
+            continue
+        for part in content:
+            if part.get("type") == "text":
+                tokens += len(part.get("text", "")) // 4 + 1
+            else:
+                tokens += 1024
+    return tokens
+
+
+class StubServer:
+    def __init__(
+        self,
+        model,
+        token_rate=50.0,
+        prefill_rate=5000.0,
+        max_concurrency=16,
+        response_tokens=128,
+        max_model_len=8192,
+        host="127.0.0.1",
+        port=0,
+    ):
+        self.model = model
+        # Tokens per second generated for each request
+        self.token_rate = token_rate
+        # Prompt tokens per second processed before the first token
+        self.prefill_rate = prefill_rate
+        self.response_tokens = response_tokens
+        self.max_model_len = max_model_len
+
+        self.requests_served = 0
+        self._slots = threading.Semaphore(max_concurrency)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        host, port = self._server.server_address[:2]
+        self.url = f"http://{host}:{port}"
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _tokens(self, max_tokens):
+        count = min(max_tokens or self.response_tokens, self.response_tokens)
+        # Every token but the first starts with a space, like most BPE vocabularies
+        return [f"{'' if i == 0 else ' '}token{i}" for i in range(count)]
+
+    def complete(self, body, send_chunk=None):
+        """
+        Generates a completion for a request body, calling `send_chunk` with each
+        token as it is produced when streaming. Returns the text and usage.
+        """
+        prompt_tokens = estimate_tokens(body.get("messages", []))
+        tokens = self._tokens(body.get("max_tokens") or body.get("max_completion_tokens"))
+
+        with self._slots:
+            time.sleep(prompt_tokens / self.prefill_rate)
+            started_at = time.perf_counter()
+            for i, token in enumerate(tokens):
+                # Pace against the start, so sleep overhead doesn't accumulate
+                delay = started_at + i / self.token_rate - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                if send_chunk is not None:
+                    send_chunk(token)
+
+        with self._lock:
+            self.requests_served += 1
+
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": len(tokens),
+            "total_tokens": prompt_tokens + len(tokens),
+        }
+        return "".join(tokens), usage
+
+    def _make_handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, status, payload):
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if self.path.rstrip("/") != "/v1/models":
+                    self._send_json(404, {"error": "not found"})
+                    return
+                self._send_json(
+                    200,
+                    {
+                        "object": "list",
+                        "data": [
+                            {
+                                "id": stub.model,
+                                "object": "model",
+                                "created": 0,
+                                "owned_by": "vllm",
+                                "max_model_len": stub.max_model_len,
+                            }
+                        ],
+                    },
+                )
+
+            def do_POST(self):
+                if self.path.rstrip("/") != "/v1/chat/completions":
+                    self._send_json(404, {"error": "not found"})
+                    return
+
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length) or b"{}")
+                completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+                created = int(time.time())
+
+                if not body.get("stream"):
+                    text, usage = stub.complete(body)
+                    self._send_json(
+                        200,
+                        {
+                            "id": completion_id,
+                            "object": "chat.completion",
+                            "created": created,
+                            "model": stub.model,
+                            "choices": [
+                                {
+                                    "index": 0,
+                                    "message": {"role": "assistant", "content": text},
+                                    "finish_reason": "length",
+                                }
+                            ],
+                            "usage": usage,
+                        },
+                    )
+                    return
+
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+
+                def send_event(payload):
+                    data = f"data: {payload}\n\n".encode()
+                    self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                    self.wfile.flush()
+
+                def chunk(delta, finish_reason=None, usage=None):
+                    choices = []
+                    if delta is not None:
+                        choices.append(
+                            {"index": 0, "delta": delta, "finish_reason": finish_reason}
+                        )
+                    return json.dumps(
+                        {
+                            "id": completion_id,
+                            "object": "chat.completion.chunk",
+                            "created": created,
+                            "model": stub.model,
+                            "choices": choices,
+                            "usage": usage,
+                        }
+                    )
+
+                try:
+                    send_event(chunk({"role": "assistant", "content": ""}))
+                    _, usage = stub.complete(
+                        body, lambda token: send_event(chunk({"content": token}))
+                    )
+                    send_event(chunk({}, finish_reason="length"))
+                    if (body.get("stream_options") or {}).get("include_usage"):
+                        send_event(chunk(None, usage=usage))
+                    send_event("[DONE]")
+                    self.wfile.write(b"0\r\n\r\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    # The client went away, e.g. a cancelled request
+                    pass
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OpenAI-compatible stub server")
+    parser.add_argument("--model", default="mistralai/Mistral-7B-Instruct-v0.3")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--token-rate", type=float, default=50.0, help="Tokens/second per request")
+    parser.add_argument("--prefill-rate", type=float, default=5000.0, help="Prompt tokens/second")
+    parser.add_argument("--max-concurrency", type=int, default=16, help="Requests decoded at once")
+    parser.add_argument("--response-tokens", type=int, default=128)
+    parser.add_argument("--max-model-len", type=int, default=8192)
+    args = parser.parse_args()
+
+    server = StubServer(
+        args.model,
+        token_rate=args.token_rate,
+        prefill_rate=args.prefill_rate,
+        max_concurrency=args.max_concurrency,
+        response_tokens=args.response_tokens,
+        max_model_len=args.max_model_len,
+        host=args.host,
+        port=args.port,
+    ).start()
+    print(f"Serving {args.model} at {server.url}/v1")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,45 +1,136 @@
 import concurrent.futures
 import json
-from urllib.parse import urljoin, urlparse
+import time
+from urllib.parse import urlparse
 
-from beam import Image, function
+from beam import Image, Volume, function
 
+from batching import BatchSizer
+from bloom import ScalableBloomFilter
+from checkpoint import CrawlCheckpoint
+from frontier import Frontier
 
-@function(image=Image().add_python_packages(["requests", "beautifulsoup4"]))
-def scrape_page(url):
-    import requests
-    from bs4 import BeautifulSoup
+# Response cache shared by the scraping containers, for conditional recrawls
+CACHE_PATH = "./scrape_cache"
+SCRAPE_IMAGE = Image().add_python_packages(
+    ["httpx[http2,brotli]", "selectolax", "beautifulsoup4"]
+)
+SCRAPE_VOLUMES = [Volume(name="scrape-cache", mount_path=CACHE_PATH)]
+# Seconds before a call is given up on, here and on Beam
+CALL_TIMEOUT = 120
 
-    response = requests.get(url)
+
+@function(image=SCRAPE_IMAGE, volumes=SCRAPE_VOLUMES)
+def scrape_page(url, links_only=False):
+    import httpx
+
+    from extract import empty_page, extract_page
+    from fetcher import get_fetcher
+
+    try:
+        response = get_fetcher(CACHE_PATH).get(url)
+    except httpx.HTTPError:
+        return empty_page(url)
     if response.status_code != 200:
-        return {"url": url, "title": "", "content": "", "links": []}
+        return empty_page(url)
+    return extract_page(url, response.text, links_only=links_only)
+
+
+@function(image=SCRAPE_IMAGE, volumes=SCRAPE_VOLUMES, timeout=CALL_TIMEOUT)
+def scrape_pages(urls, links_only=False):
+    """
+    Scrapes a batch of URLs in one container, fetching them concurrently and
+    parsing each page as it arrives. Returns the pages, in completion order, and
+    the seconds spent, so the caller can tell the call's overhead apart. With
+    links_only=True, only titles and links are extracted.
+    """
+    import time
 
-    soup = BeautifulSoup(response.text, "html.parser")
-    title = soup.find(id="firstHeading").text
-    content = soup.find(id="mw-content-text").find(class_="mw-parser-output")
+    from extract import empty_page, extract_page
+    from fetcher import get_fetcher
 
-    if not content:
-        return {"url": url, "title": title, "content": "", "links": []}
+    started_at = time.monotonic()
+    pages = []
+    for response in get_fetcher(CACHE_PATH).get_many(urls):
+        if response.status_code != 200:
+            pages.append(empty_page(response.url))
+            continue
+        # A page that can't be parsed shouldn't fail the rest of the batch
+        try:
+            pages.append(
+                extract_page(response.url, response.text, links_only=links_only)
+            )
+        except Exception as e:
+            print(f"Error extracting {response.url}: {str(e)}")
+            pages.append(empty_page(response.url))
+    return {"pages": pages, "seconds": time.monotonic() - started_at}
 
-    paragraphs = [p.text for p in content.find_all("p", recursive=False)]
-    links = [urljoin(url, link["href"]) for link in content.find_all("a", href=True)]
 
-    return {
-        "url": url,
-        "title": title,
-        "content": "\n\n".join(paragraphs),
-        "links": links,
-    }
+class Batch:
+    """A batch of URLs, and the calls scraping it started so far."""
+
+    def __init__(self, urls):
+        self.urls = urls
+        # The running calls and when they started, more than one for a straggler
+        self.calls = {}
+        self.attempts = 0
 
 
 class WikipediaCrawler:
-    def __init__(self, start_url, max_pages=100, batch_size=5):
+    # How often running calls are checked for timeouts and stragglers
+    poll_seconds = 0.1
+
+    def __init__(
+        self,
+        start_url,
+        max_pages=100,
+        concurrency=5,
+        max_urls_per_call=100,
+        call_timeout=CALL_TIMEOUT,
+        straggler_factor=3.0,
+        max_attempts=3,
+        prioritize=False,
+        checkpoint_path=None,
+        checkpoint_every=100,
+        seen_error_rate=None,
+        links_only=False,
+    ):
         self.start_url = start_url
         self.max_pages = max_pages
-        self.batch_size = batch_size
-        self.visited_pages = set()
-        self.pages_to_visit = [start_url]
+        # Keep `concurrency` batches in flight, each scraped by one remote call and
+        # sized from the observed per-call overhead and fetch time. A call running
+        # straggler_factor times longer than expected is re-issued, the first to
+        # finish wins, and a batch gets up to max_attempts calls in all
+        self.concurrency = concurrency
+        self.batch_sizer = BatchSizer(max_size=max_urls_per_call)
+        self.call_timeout = call_timeout
+        self.straggler_factor = straggler_factor
+        self.max_attempts = max_attempts
+        # With links_only, pages are saved without their content, to map the site
+        self.links_only = links_only
+        # Pages to visit, and every page queued so far. With prioritize=True, the
+        # pages with the most in-links are visited first. With seen_error_rate, the
+        # seen pages are kept in a Bloom filter, which takes a fraction of the memory
+        # but skips that fraction of new pages as false positives.
+        seen = None
+        if seen_error_rate:
+            seen = ScalableBloomFilter(error_rate=seen_error_rate)
+        self.frontier = Frontier(
+            prioritize=prioritize, seen=seen, track_changes=checkpoint_path is not None
+        )
         self.scraped_data = {}
+        self.pages_scraped = 0
+
+        # With a checkpoint, pages are written to disk instead of kept in memory,
+        # and a crawl restarted with the same path resumes where it stopped
+        self.checkpoint = None
+        if checkpoint_path:
+            self.checkpoint = CrawlCheckpoint(checkpoint_path, every_pages=checkpoint_every)
+            self.pages_scraped = self.checkpoint.restore(self.frontier)
+            if self.pages_scraped:
+                print(f"Resuming crawl: {self.pages_scraped} pages already scraped")
+        if not self.pages_scraped:
+            self.frontier.add(start_url)
 
     def is_wikipedia_url(self, url):
         parsed_url = urlparse(url)
@@ -48,31 +139,120 @@ class WikipediaCrawler:
         ) and parsed_url.path.startswith("/wiki/")
 
     def crawl(self):
-        while len(self.scraped_data) < self.max_pages and self.pages_to_visit:
-            # Create a batch of 5 pages to scrape that we have not yet visited
-            batch = []
-            while len(batch) < self.batch_size and self.pages_to_visit:
-                p = self.pages_to_visit.pop(0)
-                if p not in self.visited_pages:
-                    batch.append(p)
-
-            for result in scrape_page.map(batch):
-                # Save the result and collect new links
-                self.scraped_data[result["url"]] = result
-                if len(self.scraped_data) < self.max_pages:
-                    new_links = [
-                        link
-                        for link in result["links"]
-                        if self.is_wikipedia_url(link)
-                        and link not in self.visited_pages
-                        and link not in self.pages_to_visit
-                    ]
-                    self.pages_to_visit.extend(new_links)
-
-        print(f"Crawling completed. Scraped {len(self.scraped_data)} pages.")
+        # Not a `with` block, abandoned calls may still be running when the crawl ends
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.concurrency * 4)
+        running = {}
+        try:
+            while self.pages_scraped < self.max_pages and (self.frontier or running):
+                self.fill(executor, running)
+
+                done, _ = concurrent.futures.wait(
+                    running,
+                    timeout=self.poll_seconds,
+                    return_when=concurrent.futures.FIRST_COMPLETED,
+                )
+                for future in done:
+                    # Skip a call whose batch another call just finished
+                    if future in running:
+                        self.finish(executor, running, future)
+                self.check_running(executor, running)
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        if self.checkpoint is not None:
+            self.checkpoint.save(self.frontier)
+        print(f"Crawling completed. Scraped {self.pages_scraped} pages.")
+        print(
+            f"Seen {len(self.frontier.seen)} URLs, "
+            f"using {self.frontier.seen_memory_bytes() / 1024**2:.1f} MB"
+        )
+
+    def fill(self, executor, running):
+        """Starts batches until `concurrency` are in flight, the frontier only holds unvisited pages."""
+        batches = set(running.values())
+        remaining = self.max_pages - self.pages_scraped - sum(len(b.urls) for b in batches)
+        while len(batches) < self.concurrency and self.frontier and remaining > 0:
+            urls = []
+            while len(urls) < min(self.batch_sizer.size, remaining) and self.frontier:
+                urls.append(self.frontier.pop())
+            remaining -= len(urls)
+            batch = Batch(urls)
+            batches.add(batch)
+            self.call(executor, running, batch)
+
+    def call(self, executor, running, batch):
+        batch.attempts += 1
+        future = executor.submit(scrape_pages.remote, batch.urls, self.links_only)
+        batch.calls[future] = time.monotonic()
+        running[future] = batch
+
+    def retry(self, executor, running, batch, reason):
+        if batch.attempts < self.max_attempts:
+            self.call(executor, running, batch)
+        else:
+            print(f"Giving up on {len(batch.urls)} pages from {batch.urls[0]}: {reason}")
+
+    def finish(self, executor, running, future):
+        batch = running.pop(future)
+        started_at = batch.calls.pop(future)
+        try:
+            response = future.result()
+        except Exception as e:
+            # Wait for the batch's other call, if it has one
+            if not batch.calls:
+                self.retry(executor, running, batch, str(e))
+            return
+
+        # The first call to finish wins, the batch's other call is ignored
+        for other in batch.calls:
+            del running[other]
+        batch.calls.clear()
+
+        self.batch_sizer.observe(
+            len(batch.urls), time.monotonic() - started_at, response["seconds"]
+        )
+        for result in response["pages"]:
+            # Save the result and collect new links
+            self.save_result(result)
+            if self.pages_scraped < self.max_pages:
+                self.frontier.add_many(filter(self.is_wikipedia_url, result["links"]))
+
+        if self.checkpoint is not None:
+            self.checkpoint.maybe_save(self.frontier)
+
+    def check_running(self, executor, running):
+        """Gives up on calls past the timeout, and re-issues stragglers."""
+        now = time.monotonic()
+        for batch in dict.fromkeys(running.values()):
+            for future, started_at in list(batch.calls.items()):
+                if now - started_at > self.call_timeout:
+                    # Stop waiting for it, its thread finishes on its own
+                    del batch.calls[future]
+                    del running[future]
+            if not batch.calls:
+                self.retry(executor, running, batch, "timed out")
+                continue
+
+            expected = self.batch_sizer.expected_seconds(len(batch.urls))
+            if (
+                expected is not None
+                and len(batch.calls) == 1
+                and batch.attempts < self.max_attempts
+                and now - min(batch.calls.values()) > self.straggler_factor * expected
+            ):
+                self.call(executor, running, batch)
+
+    def save_result(self, result):
+        self.pages_scraped += 1
+        if self.checkpoint is None:
+            self.scraped_data[result["url"]] = result
+        else:
+            self.checkpoint.record(result)
 
     def get_scraped_data(self):
-        return self.scraped_data
+        if self.checkpoint is None:
+            return self.scraped_data
+        return {page["url"]: page for page in self.checkpoint.pages()}
 
 
 if __name__ == "__main__":
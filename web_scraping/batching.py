@@ -0,0 +1,51 @@
+import math
+
+
+class BatchSizer:
+    """
+    Picks how many URLs to send in each remote scraping call.
+
+    Every call pays a fixed overhead (scheduling, serialization, the round trip to
+    a container) on top of fetching its pages. The overhead and the fetch time per
+    URL are tracked as moving averages, and batches are sized so the overhead is at
+    most `target_overhead` of the call, within `min_size` and `max_size`.
+    """
+
+    def __init__(self, initial_size=5, min_size=1, max_size=100, target_overhead=0.1, alpha=0.3):
+        self.initial_size = initial_size
+        self.min_size = min_size
+        self.max_size = max_size
+        self.target_overhead = target_overhead
+        self.alpha = alpha
+        self.overhead = None
+        self.seconds_per_url = None
+
+    def _ewma(self, average, value):
+        return value if average is None else self.alpha * value + (1 - self.alpha) * average
+
+    def observe(self, batch_size, call_seconds, fetch_seconds):
+        """Records a call: its size, its round-trip time, and the time spent fetching in the container."""
+        if not batch_size:
+            return
+        self.overhead = self._ewma(self.overhead, max(call_seconds - fetch_seconds, 0.0))
+        self.seconds_per_url = self._ewma(self.seconds_per_url, fetch_seconds / batch_size)
+
+    def expected_seconds(self, batch_size):
+        """The expected round-trip time of a call with this many URLs, once calls have been observed."""
+        if self.overhead is None:
+            return None
+        return self.overhead + self.seconds_per_url * batch_size
+
+    @property
+    def size(self):
+        if self.overhead is None:
+            return self.initial_size
+        if not self.seconds_per_url:
+            return self.max_size
+        # overhead / (overhead + n * seconds_per_url) <= target_overhead
+        size = math.ceil(
+            self.overhead
+            * (1 - self.target_overhead)
+            / (self.target_overhead * self.seconds_per_url)
+        )
+        return max(self.min_size, min(self.max_size, size))
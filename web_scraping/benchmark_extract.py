@@ -0,0 +1,142 @@
+"""
+Compares the extraction backends on saved pages: the time to extract each page,
+in full and links-only mode, and the pages where a backend's result differs from
+BeautifulSoup's. The backends only agree on well-formed HTML, see extract.py.
+
+By default it runs on the fixed pages in fixtures/, so it works offline. --fetch
+saves long Wikipedia articles, each pinned to its revision as of REVISIONS_AS_OF,
+to another directory, to run on real pages:
+
+    python benchmark_extract.py --repeat 20
+    python benchmark_extract.py --fetch --fixtures wikipedia
+"""
+
+import argparse
+import json
+import os
+import time
+from urllib.parse import quote, unquote, urlencode
+
+from extract import BACKENDS
+
+# Long articles, where parsing dominates a container's time
+ARTICLES = [
+    "Web_scraping",
+    "World_War_II",
+    "United_States",
+    "Python_(programming_language)",
+    "Albert_Einstein",
+    "COVID-19_pandemic",
+    "India",
+    "Barack_Obama",
+    "Climate_change",
+    "The_Beatles",
+]
+# Articles are downloaded as they were at this time, so every download is the same
+REVISIONS_AS_OF = "2025-01-01T00:00:00Z"
+BASE_URL = "https://en.wikipedia.org/wiki/"
+API_URL = "https://en.wikipedia.org/w/api.php"
+INDEX_URL = "https://en.wikipedia.org/w/index.php"
+FIXTURES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def revision_id(fetcher, article):
+    # The latest revision made at or before REVISIONS_AS_OF
+    params = {
+        "action": "query",
+        "prop": "revisions",
+        "titles": article,
+        "rvlimit": 1,
+        "rvdir": "older",
+        "rvstart": REVISIONS_AS_OF,
+        "rvprop": "ids",
+        "format": "json",
+        "formatversion": 2,
+    }
+    response = fetcher.get(f"{API_URL}?{urlencode(params)}")
+    page = json.loads(response.text)["query"]["pages"][0]
+    return page["revisions"][0]["revid"]
+
+
+def fetch_fixtures(path):
+    from fetcher import Fetcher
+
+    os.makedirs(path, exist_ok=True)
+    fetcher = Fetcher()
+    for article in ARTICLES:
+        oldid = revision_id(fetcher, article)
+        response = fetcher.get(f"{INDEX_URL}?title={quote(article)}&oldid={oldid}")
+        fixture_path = os.path.join(path, f"{article}.html")
+        with open(fixture_path, "w") as f:
+            f.write(response.text)
+        size = len(response.text) / 1024
+        print(f"Saved {fixture_path}, revision {oldid} ({size:.0f} KB)")
+
+
+def load_fixtures(path):
+    fixtures = []
+    for name in sorted(os.listdir(path)):
+        if name.endswith(".html"):
+            with open(os.path.join(path, name)) as f:
+                fixtures.append((BASE_URL + quote(name[: -len(".html")]), f.read()))
+    return fixtures
+
+
+def benchmark(extract, fixtures, repeat, links_only):
+    started_at = time.perf_counter()
+    for _ in range(repeat):
+        pages = [extract(url, html, links_only) for url, html in fixtures]
+    return (time.perf_counter() - started_at) / (repeat * len(fixtures)), pages
+
+
+def differences(page, expected):
+    fields = [f for f in ("title", "content", "links") if page[f] != expected[f]]
+    if "links" in fields:
+        fields[-1] = f"links ({len(page['links'])} vs {len(expected['links'])})"
+    return ", ".join(fields)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Extraction backend benchmark")
+    parser.add_argument("--fixtures", default=FIXTURES_PATH, help="Directory of saved pages")
+    parser.add_argument(
+        "--fetch", action="store_true", help="Download pinned Wikipedia articles"
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.fetch:
+        if os.path.abspath(args.fixtures) == FIXTURES_PATH:
+            parser.error("Pass --fixtures with another directory to download into")
+        fetch_fixtures(args.fixtures)
+    elif not os.path.isdir(args.fixtures):
+        parser.error(f"{args.fixtures} does not exist, pass --fetch to download it")
+    fixtures = load_fixtures(args.fixtures)
+    megabytes = sum(len(html) for _, html in fixtures) / 1024**2
+    print(f"{len(fixtures)} pages, {megabytes:.1f} MB of HTML\n")
+
+    print(f"{'backend':<15} {'mode':<11} {'ms/page':>8} {'speedup':>8} {'matches':>8}")
+    for links_only in (False, True):
+        # BeautifulSoup comes first, and the others are compared against it
+        baseline, expected = None, None
+        mode = "links-only" if links_only else "full"
+        for name, extract in BACKENDS.items():
+            seconds, pages = benchmark(extract, fixtures, args.repeat, links_only)
+            if baseline is None:
+                baseline, expected = seconds, pages
+            mismatches = [
+                (url, differences(page, want))
+                for (url, _), page, want in zip(fixtures, pages, expected)
+                if page != want
+            ]
+            print(
+                f"{name:<15} {mode:<11} "
+                f"{seconds * 1000:>8.1f} {baseline / seconds:>7.1f}x "
+                f"{len(fixtures) - len(mismatches):>4}/{len(fixtures)}"
+            )
+            for url, fields in mismatches:
+                print(f"  differs on {unquote(url.rsplit('/', 1)[-1])}: {fields}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Microbenchmark of the crawl frontier.
+
+Every round adds N synthetic URLs, with a fraction of duplicates as found on real
+pages, then pops them all. The per-operation cost of `Frontier` stays flat as N
+grows, while the original list frontier (`pop(0)` and `in` checks) grows with N,
+so it is only run up to --max-list-urls.
+
+    python benchmark_frontier.py --max-urls 10000000
+"""
+
+import argparse
+import random
+import resource
+import time
+
+from frontier import Frontier
+
+
+def synthetic_urls(count, duplicate_rate=0.3, seed=0):
+    rng = random.Random(seed)
+    unique = 0
+    for _ in range(count):
+        if unique and rng.random() < duplicate_rate:
+            index = rng.randrange(unique)
+        else:
+            index = unique
+            unique += 1
+        yield f"https://en.wikipedia.org/wiki/Article_{index}#section"
+
+
+def run_frontier(count, prioritize):
+    frontier = Frontier(prioritize=prioritize)
+    started_at = time.perf_counter()
+    frontier.add_many(synthetic_urls(count))
+    added_at = time.perf_counter()
+    popped = 0
+    while frontier:
+        frontier.pop()
+        popped += 1
+    finished_at = time.perf_counter()
+    return added_at - started_at, finished_at - added_at, popped
+
+
+def run_list(count):
+    # The frontier the crawlers used before, for comparison
+    visited, pages_to_visit = set(), []
+    started_at = time.perf_counter()
+    for url in synthetic_urls(count):
+        if url not in visited and url not in pages_to_visit:
+            pages_to_visit.append(url)
+    added_at = time.perf_counter()
+    popped = 0
+    while pages_to_visit:
+        visited.add(pages_to_visit.pop(0))
+        popped += 1
+    finished_at = time.perf_counter()
+    return added_at - started_at, finished_at - added_at, popped
+
+
+def peak_memory_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Crawl frontier microbenchmark")
+    parser.add_argument("--max-urls", type=int, default=1_000_000)
+    parser.add_argument(
+        "--max-list-urls",
+        type=int,
+        default=20_000,
+        help="Largest size to run the list frontier at, it is quadratic",
+    )
+    args = parser.parse_args()
+
+    sizes = []
+    size = 10_000
+    while size <= args.max_urls:
+        sizes.append(size)
+        size *= 10
+
+    print(f"{'frontier':<12} {'urls':>10} {'add ns/url':>11} {'pop ns/url':>11} {'peak MB':>9}")
+    for size in sizes:
+        runs = [("fifo", lambda: run_frontier(size, False))]
+        runs.append(("priority", lambda: run_frontier(size, True)))
+        if size <= args.max_list_urls:
+            runs.append(("list", lambda: run_list(size)))
+
+        for name, run in runs:
+            add_time, pop_time, popped = run()
+            print(
+                f"{name:<12} {size:>10} {add_time / size * 1e9:>11.0f} "
+                f"{pop_time / max(popped, 1) * 1e9:>11.0f} {peak_memory_mb():>9.0f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Compares the memory and throughput of the crawlers' seen-sets: an exact Python
+set of URLs and a scalable Bloom filter at a few false-positive rates.
+
+    python benchmark_seen_set.py --urls 10000000
+"""
+
+import argparse
+import sys
+import time
+
+from bloom import ScalableBloomFilter
+
+
+def urls(count, offset=0):
+    for i in range(offset, offset + count):
+        yield f"https://en.wikipedia.org/wiki/Article_{i}"
+
+
+def set_memory_bytes(seen):
+    return sys.getsizeof(seen) + sum(sys.getsizeof(url) for url in seen)
+
+
+def benchmark(name, seen, count, lookups):
+    started_at = time.perf_counter()
+    for url in urls(count):
+        seen.add(url)
+    add_time = time.perf_counter() - started_at
+
+    # URLs that were never added, so every hit is a false positive
+    started_at = time.perf_counter()
+    false_positives = sum(url in seen for url in urls(lookups, offset=count))
+    lookup_time = time.perf_counter() - started_at
+
+    memory = seen.memory_bytes if hasattr(seen, "memory_bytes") else set_memory_bytes(seen)
+    print(
+        f"{name:<14} {count:>10} {memory / 1024**2:>10.1f} {memory / count:>10.1f} "
+        f"{count / add_time:>12.0f} {lookups / lookup_time:>12.0f} "
+        f"{false_positives / lookups:>10.5f}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Seen-set benchmark")
+    parser.add_argument("--urls", type=int, default=1_000_000)
+    parser.add_argument("--lookups", type=int, default=200_000)
+    args = parser.parse_args()
+
+    print(
+        f"{'seen-set':<14} {'urls':>10} {'MB':>10} {'bytes/url':>10} "
+        f"{'adds/s':>12} {'lookups/s':>12} {'fp rate':>10}"
+    )
+    benchmark("exact set", set(), args.urls, args.lookups)
+    for error_rate in (0.01, 0.001, 0.0001):
+        benchmark(
+            f"bloom {error_rate:g}",
+            ScalableBloomFilter(
+                initial_capacity=max(args.urls // 8, 1000), error_rate=error_rate
+            ),
+            args.urls,
+            args.lookups,
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+import hashlib
+import math
+
+
+def _hashes(item):
+    # Double hashing: every bit position is derived from the two halves of one
+    # digest, computed once per item however many filters it is checked against
+    digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+    return int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+
+
+class BloomFilter:
+    """
+    A fixed-size Bloom filter: set membership in a bit array, with no false
+    negatives and a false-positive rate of about `error_rate` once `capacity`
+    items have been added.
+    """
+
+    def __init__(self, capacity, error_rate=0.001):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        # Optimal sizes for n items at error rate p: m = -n ln p / (ln 2)^2, k = m/n ln 2
+        self.num_bits = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def _contains_hashes(self, h1, h2):
+        bits, num_bits = self.bits, self.num_bits
+        for i in range(self.num_hashes):
+            p = (h1 + i * h2) % num_bits
+            if not bits[p >> 3] & (1 << (p & 7)):
+                return False
+        return True
+
+    def _add_hashes(self, h1, h2):
+        bits, num_bits = self.bits, self.num_bits
+        added = False
+        for i in range(self.num_hashes):
+            p = (h1 + i * h2) % num_bits
+            mask = 1 << (p & 7)
+            if not bits[p >> 3] & mask:
+                bits[p >> 3] |= mask
+                added = True
+        if added:
+            self.count += 1
+        return added
+
+    def __contains__(self, item):
+        return self._contains_hashes(*_hashes(item))
+
+    def add(self, item):
+        """Adds an item, returning False if it was (probably) already present."""
+        return self._add_hashes(*_hashes(item))
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def memory_bytes(self):
+        return len(self.bits)
+
+
+class ScalableBloomFilter:
+    """
+    A Bloom filter that grows as items are added (Almeida et al., 2007). When the
+    current filter is full, a larger one with a tighter error rate is added, so the
+    overall false-positive rate stays below `error_rate` however many items arrive.
+    """
+
+    def __init__(self, initial_capacity=1_000_000, error_rate=0.001, growth=2, tightening=0.5):
+        self.error_rate = error_rate
+        self.growth = growth
+        self.tightening = tightening
+        # The error rates of the filters form a geometric series summing to error_rate
+        self.filters = [BloomFilter(initial_capacity, error_rate * (1 - tightening))]
+
+    def __contains__(self, item):
+        h1, h2 = _hashes(item)
+        return any(f._contains_hashes(h1, h2) for f in reversed(self.filters))
+
+    def add(self, item):
+        h1, h2 = _hashes(item)
+        if any(f._contains_hashes(h1, h2) for f in reversed(self.filters)):
+            return False
+
+        current = self.filters[-1]
+        if current.count >= current.capacity:
+            current = BloomFilter(
+                current.capacity * self.growth, current.error_rate * self.tightening
+            )
+            self.filters.append(current)
+        current._add_hashes(h1, h2)
+        return True
+
+    def __len__(self):
+        return sum(len(f) for f in self.filters)
+
+    @property
+    def memory_bytes(self):
+        return sum(f.memory_bytes for f in self.filters)
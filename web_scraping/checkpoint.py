@@ -0,0 +1,89 @@
+import json
+import sqlite3
+import time
+
+
+class CrawlCheckpoint:
+    """
+    Persists a crawl to SQLite as it goes, so a restarted crawl resumes where the
+    last checkpoint left off.
+
+    Two tables are appended to: every URL the frontier has seen, in the order it was
+    found (with its in-link count), and every scraped page. The queue is never
+    written out, on restore it is the seen URLs that have no scraped page yet,
+    which also re-queues pages that were being fetched when the crawl stopped.
+
+    Scraped pages are buffered and written, together with the frontier changes,
+    every `every_pages` pages or `every_seconds` seconds, whichever comes first.
+    """
+
+    def __init__(self, path, every_pages=100, every_seconds=30.0):
+        self.path = path
+        self.every_pages = every_pages
+        self.every_seconds = every_seconds
+        self._pending = []
+        self._last_saved_at = time.monotonic()
+
+        self._conn = sqlite3.connect(path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS seen (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                url TEXT NOT NULL UNIQUE,
+                inlinks INTEGER NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS pages (url TEXT PRIMARY KEY, data TEXT NOT NULL)"
+        )
+        self._conn.commit()
+
+    def restore(self, frontier):
+        """Loads the checkpointed frontier, returning the number of pages already scraped."""
+        seen = (row[0] for row in self._conn.execute("SELECT url FROM seen"))
+        queued = self._conn.execute(
+            """
+            SELECT url, inlinks FROM seen
+            WHERE url NOT IN (SELECT url FROM pages)
+            ORDER BY seq
+            """
+        )
+        frontier.restore(seen, queued)
+        return self._conn.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+
+    def record(self, result):
+        self._pending.append(result)
+
+    def maybe_save(self, frontier):
+        if (
+            len(self._pending) >= self.every_pages
+            or time.monotonic() - self._last_saved_at >= self.every_seconds
+        ):
+            self.save(frontier)
+
+    def save(self, frontier):
+        # One transaction, so pages and the links found on them are saved together
+        with self._conn:
+            self._conn.executemany(
+                """
+                INSERT INTO seen (url, inlinks) VALUES (?, ?)
+                ON CONFLICT(url) DO UPDATE SET inlinks = excluded.inlinks
+                """,
+                frontier.drain_changes(),
+            )
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO pages VALUES (?, ?)",
+                ((result["url"], json.dumps(result)) for result in self._pending),
+            )
+        self._pending = []
+        self._last_saved_at = time.monotonic()
+
+    def pages(self):
+        """Every scraped page, read back one at a time."""
+        for (data,) in self._conn.execute("SELECT data FROM pages ORDER BY rowid"):
+            yield json.loads(data)
+
+    def close(self):
+        self._conn.close()
@@ -1,44 +1,115 @@
 import concurrent.futures
 import json
-from urllib.parse import urljoin, urlparse
+import time
+from urllib.parse import urlparse
 
-from beam import Image, function
+from beam import Image, Volume, function
 
+from batching import BatchSizer
+from bloom import ScalableBloomFilter
+from checkpoint import CrawlCheckpoint
+from frontier import Frontier
 
-@function(image=Image().add_python_packages(["requests", "beautifulsoup4"]))
-def scrape_page(url):
-    import requests
-    from bs4 import BeautifulSoup
+# Response cache shared by the scraping containers, for conditional recrawls
+CACHE_PATH = "./scrape_cache"
+SCRAPE_IMAGE = Image().add_python_packages(
+    ["httpx[http2,brotli]", "selectolax", "beautifulsoup4"]
+)
+SCRAPE_VOLUMES = [Volume(name="scrape-cache", mount_path=CACHE_PATH)]
+# Seconds before Beam gives up on a call, so a hung container can't stall the crawl
+CALL_TIMEOUT = 120
 
-    response = requests.get(url)
-    if response.status_code != 200:
-        return {"url": url, "title": "", "content": "", "links": []}
-
-    soup = BeautifulSoup(response.text, "html.parser")
-    title = soup.find(id="firstHeading").text
-    content = soup.find(id="mw-content-text").find(class_="mw-parser-output")
 
-    if not content:
-        return {"url": url, "title": title, "content": "", "links": []}
+@function(image=SCRAPE_IMAGE, volumes=SCRAPE_VOLUMES)
+def scrape_page(url, links_only=False):
+    import httpx
 
-    paragraphs = [p.text for p in content.find_all("p", recursive=False)]
-    links = [urljoin(url, link["href"]) for link in content.find_all("a", href=True)]
+    from extract import empty_page, extract_page
+    from fetcher import get_fetcher
 
-    return {
-        "url": url,
-        "title": title,
-        "content": "\n\n".join(paragraphs),
-        "links": links,
-    }
+    try:
+        response = get_fetcher(CACHE_PATH).get(url)
+    except httpx.HTTPError:
+        return empty_page(url)
+    if response.status_code != 200:
+        return empty_page(url)
+    return extract_page(url, response.text, links_only=links_only)
+
+
+@function(image=SCRAPE_IMAGE, volumes=SCRAPE_VOLUMES, timeout=CALL_TIMEOUT)
+def scrape_pages(urls, links_only=False):
+    """
+    Scrapes a batch of URLs in one container, fetching them concurrently and
+    parsing each page as it arrives. Returns the pages, in completion order, and
+    the seconds spent, so the caller can tell the call's overhead apart. With
+    links_only=True, only titles and links are extracted.
+    """
+    import time
+
+    from extract import empty_page, extract_page
+    from fetcher import get_fetcher
+
+    started_at = time.monotonic()
+    pages = []
+    for response in get_fetcher(CACHE_PATH).get_many(urls):
+        if response.status_code != 200:
+            pages.append(empty_page(response.url))
+            continue
+        # A page that can't be parsed shouldn't fail the rest of the batch
+        try:
+            pages.append(
+                extract_page(response.url, response.text, links_only=links_only)
+            )
+        except Exception as e:
+            print(f"Error extracting {response.url}: {str(e)}")
+            pages.append(empty_page(response.url))
+    return {"pages": pages, "seconds": time.monotonic() - started_at}
 
 
 class WikipediaCrawler:
-    def __init__(self, start_url, max_pages=100):
+    def __init__(
+        self,
+        start_url,
+        max_pages=100,
+        max_workers=5,
+        max_urls_per_call=100,
+        prioritize=False,
+        checkpoint_path=None,
+        checkpoint_every=100,
+        seen_error_rate=None,
+        links_only=False,
+    ):
         self.start_url = start_url
         self.max_pages = max_pages
-        self.visited_pages = set()
-        self.pages_to_visit = [start_url]
+        # Up to max_workers remote calls run at once, each scraping a batch of URLs
+        # sized from the observed per-call overhead and fetch time
+        self.max_workers = max_workers
+        self.batch_sizer = BatchSizer(max_size=max_urls_per_call)
+        # With links_only, pages are saved without their content, to map the site
+        self.links_only = links_only
+        # Pages to visit, and every page queued so far. With prioritize=True, the
+        # pages with the most in-links are visited first. With seen_error_rate, the
+        # seen pages are kept in a Bloom filter, which takes a fraction of the memory
+        # but skips that fraction of new pages as false positives.
+        seen = None
+        if seen_error_rate:
+            seen = ScalableBloomFilter(error_rate=seen_error_rate)
+        self.frontier = Frontier(
+            prioritize=prioritize, seen=seen, track_changes=checkpoint_path is not None
+        )
         self.scraped_data = {}
+        self.pages_scraped = 0
+
+        # With a checkpoint, pages are written to disk instead of kept in memory,
+        # and a crawl restarted with the same path resumes where it stopped
+        self.checkpoint = None
+        if checkpoint_path:
+            self.checkpoint = CrawlCheckpoint(checkpoint_path, every_pages=checkpoint_every)
+            self.pages_scraped = self.checkpoint.restore(self.frontier)
+            if self.pages_scraped:
+                print(f"Resuming crawl: {self.pages_scraped} pages already scraped")
+        if not self.pages_scraped:
+            self.frontier.add(start_url)
 
     def is_wikipedia_url(self, url):
         parsed_url = urlparse(url)
@@ -47,26 +118,32 @@ class WikipediaCrawler:
         ) and parsed_url.path.startswith("/wiki/")
 
     def process_scraped_page(self, result):
-        if not result or len(self.scraped_data) >= self.max_pages:
+        if not result or self.pages_scraped >= self.max_pages:
             return
 
-        self.scraped_data[result["url"]] = result
-        if len(self.scraped_data) < self.max_pages:
-            new_links = filter(self.is_wikipedia_url, result["links"])
-            self.pages_to_visit.extend(new_links)
+        self.save_result(result)
+        if self.pages_scraped < self.max_pages:
+            self.frontier.add_many(filter(self.is_wikipedia_url, result["links"]))
+        if self.checkpoint is not None:
+            self.checkpoint.maybe_save(self.frontier)
 
     def crawl(self):
-        with concurrent.futures.ThreadPoolExecutor(max_workers=5) as executor:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
             futures = {}
-            while len(self.scraped_data) < self.max_pages and (
-                self.pages_to_visit or futures
+            while self.pages_scraped < self.max_pages and (
+                self.frontier or futures
             ):
-                # Start new tasks if we have capacity and pages to visit
-                while len(futures) < 5 and self.pages_to_visit:
-                    url = self.pages_to_visit.pop(0)
-                    self.visited_pages.add(url)
-                    future = executor.submit(scrape_page.remote, url)
-                    futures[future] = url
+                # Start new tasks if we have capacity and pages to visit, without
+                # queueing more pages than are left to scrape
+                in_flight = sum(len(batch) for batch, _ in futures.values())
+                remaining = self.max_pages - self.pages_scraped - in_flight
+                while len(futures) < self.max_workers and self.frontier and remaining > 0:
+                    batch = []
+                    while len(batch) < min(self.batch_sizer.size, remaining) and self.frontier:
+                        batch.append(self.frontier.pop())
+                    remaining -= len(batch)
+                    future = executor.submit(scrape_pages.remote, batch, self.links_only)
+                    futures[future] = (batch, time.monotonic())
 
                 # Wait for any task to complete
                 if futures:
@@ -74,17 +151,36 @@ class WikipediaCrawler:
                         futures, return_when=concurrent.futures.FIRST_COMPLETED
                     )
                     for future in done:
-                        url = futures.pop(future)
+                        batch, started_at = futures.pop(future)
                         try:
-                            result = future.result()
-                            self.process_scraped_page(result)
+                            response = future.result()
+                            self.batch_sizer.observe(
+                                len(batch), time.monotonic() - started_at, response["seconds"]
+                            )
+                            for result in response["pages"]:
+                                self.process_scraped_page(result)
                         except Exception as e:
-                            print(f"Error processing {url}: {str(e)}")
-
-        print(f"Crawling completed. Scraped {len(self.scraped_data)} pages.")
+                            print(f"Error processing {len(batch)} pages from {batch[0]}: {str(e)}")
+
+        if self.checkpoint is not None:
+            self.checkpoint.save(self.frontier)
+        print(f"Crawling completed. Scraped {self.pages_scraped} pages.")
+        print(
+            f"Seen {len(self.frontier.seen)} URLs, "
+            f"using {self.frontier.seen_memory_bytes() / 1024**2:.1f} MB"
+        )
+
+    def save_result(self, result):
+        self.pages_scraped += 1
+        if self.checkpoint is None:
+            self.scraped_data[result["url"]] = result
+        else:
+            self.checkpoint.record(result)
 
     def get_scraped_data(self):
-        return self.scraped_data
+        if self.checkpoint is None:
+            return self.scraped_data
+        return {page["url"]: page for page in self.checkpoint.pages()}
 
 
 if __name__ == "__main__":
@@ -0,0 +1,97 @@
+from urllib.parse import urljoin
+
+# Tags whose text BeautifulSoup leaves out of an element's .text
+SKIPPED_TEXT_TAGS = ("style", "script", "template", "rp", "rt")
+
+
+def empty_page(url, title=""):
+    return {"url": url, "title": title, "content": "", "links": []}
+
+
+def extract_beautifulsoup(url, html, links_only=False):
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, "html.parser")
+    title = soup.find(id="firstHeading").text
+    content = soup.find(id="mw-content-text").find(class_="mw-parser-output")
+
+    if not content:
+        return empty_page(url, title)
+
+    paragraphs = []
+    if not links_only:
+        paragraphs = [p.text for p in content.find_all("p", recursive=False)]
+    links = [urljoin(url, link["href"]) for link in content.find_all("a", href=True)]
+
+    return {
+        "url": url,
+        "title": title,
+        "content": "\n\n".join(paragraphs),
+        "links": links,
+    }
+
+
+def _selectolax_text(node):
+    # The whole text in one call, unless there are strings BeautifulSoup would skip
+    if node.css_first(", ".join(SKIPPED_TEXT_TAGS)) is None:
+        return node.text()
+    parts = []
+    for child in node.iter(include_text=True):
+        if child.tag == "-text":
+            parts.append(child.text_content)
+        elif child.tag not in SKIPPED_TEXT_TAGS and child.tag != "-comment":
+            parts.append(_selectolax_text(child))
+    return "".join(parts)
+
+
+def extract_selectolax(url, html, links_only=False):
+    from selectolax.lexbor import LexborHTMLParser
+
+    tree = LexborHTMLParser(html)
+    title = _selectolax_text(tree.css_first("#firstHeading"))
+    content = tree.css_first("#mw-content-text").css_first(".mw-parser-output")
+
+    if not content:
+        return empty_page(url, title)
+
+    paragraphs = []
+    if not links_only:
+        paragraphs = [_selectolax_text(p) for p in content.iter() if p.tag == "p"]
+    links = [
+        urljoin(url, link.attributes["href"] or "") for link in content.css("a[href]")
+    ]
+
+    return {
+        "url": url,
+        "title": title,
+        "content": "\n\n".join(paragraphs),
+        "links": links,
+    }
+
+
+# selectolax parses with lexbor, in C. On well-formed HTML every backend returns the
+# same page, except for links inside <template>, whose contents lexbor keeps out of
+# the tree. lexbor follows the HTML5 tree construction rules and html.parser
+# doesn't, so on malformed markup, like unclosed or misnested tags, they build
+# different trees and the text and links can differ
+BACKENDS = {
+    "beautifulsoup": extract_beautifulsoup,
+    "selectolax": extract_selectolax,
+}
+
+
+def default_backend():
+    try:
+        import selectolax.lexbor  # noqa: F401
+    except ImportError:
+        return "beautifulsoup"
+    return "selectolax"
+
+
+def extract_page(url, html, backend=None, links_only=False):
+    """
+    Pulls the title, top-level paragraphs and links out of a Wikipedia article.
+    With links_only=True the paragraphs are skipped, for crawls that only need to
+    discover pages, and the content is left empty.
+    """
+    return BACKENDS[backend or default_backend()](url, html, links_only)
@@ -0,0 +1,163 @@
+import asyncio
+import hashlib
+import json
+import os
+import queue
+import threading
+
+DEFAULT_TIMEOUT = 10.0
+USER_AGENT = "beam-examples-crawler/1.0 (https://github.com/beam-cloud/examples)"
+
+
+def _http2_available():
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class FetchResult:
+    def __init__(self, url, status_code, text, not_modified=False):
+        self.url = url
+        self.status_code = status_code
+        self.text = text
+        # True when the server answered 304 and the text came from the cache
+        self.not_modified = not_modified
+
+
+class ResponseCache:
+    """One JSON file per URL, so it can live on a volume shared by containers."""
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    def _file(self, url):
+        return os.path.join(self.path, f"{hashlib.sha256(url.encode()).hexdigest()}.json")
+
+    def get(self, url):
+        try:
+            with open(self._file(url)) as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+
+    def put(self, url, etag, last_modified, text):
+        path = self._file(url)
+        # Write then rename, so readers never see a partial entry
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"etag": etag, "last_modified": last_modified, "text": text}, f)
+        os.replace(tmp_path, path)
+
+
+class Fetcher:
+    """
+    Fetches pages over one pooled client per container, so connections (HTTP/2
+    where the server supports it) are only set up once, and gzip, deflate and
+    brotli responses are decompressed.
+
+    With a `cache_dir`, pages that come with an ETag or Last-Modified header are
+    cached, and fetched again with a conditional request, so a recrawl of
+    unchanged pages mostly costs 304s.
+    """
+
+    def __init__(self, cache_dir=None, timeout=DEFAULT_TIMEOUT, max_connections=20):
+        import httpx
+
+        self.cache = ResponseCache(cache_dir) if cache_dir else None
+        self.client_options = {
+            "http2": _http2_available(),
+            # Only time the request itself, not the wait for a free pooled connection
+            "timeout": httpx.Timeout(timeout, pool=None),
+            "follow_redirects": True,
+            "limits": httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+            ),
+            "headers": {"User-Agent": USER_AGENT},
+        }
+        self.client = httpx.Client(**self.client_options)
+        self.stats = {"requests": 0, "not_modified": 0, "bytes_downloaded": 0}
+        self._lock = threading.Lock()
+
+        # The async client is tied to an event loop, so the container keeps one
+        # running in the background and its connections outlive each batch
+        self._loop = None
+        self._async_client = None
+
+    def conditional_headers(self, cached):
+        headers = {}
+        if cached and cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+        if cached and cached.get("last_modified"):
+            headers["If-Modified-Since"] = cached["last_modified"]
+        return headers
+
+    def handle_response(self, url, response, cached):
+        """Turns a response into a FetchResult, updating the cache and stats."""
+        with self._lock:
+            self.stats["requests"] += 1
+            self.stats["bytes_downloaded"] += response.num_bytes_downloaded
+
+        if response.status_code == 304 and cached:
+            with self._lock:
+                self.stats["not_modified"] += 1
+            return FetchResult(url, 200, cached["text"], not_modified=True)
+
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        if self.cache and response.status_code == 200 and (etag or last_modified):
+            self.cache.put(url, etag, last_modified, response.text)
+        return FetchResult(url, response.status_code, response.text)
+
+    def get(self, url):
+        cached = self.cache.get(url) if self.cache else None
+        response = self.client.get(url, headers=self.conditional_headers(cached))
+        return self.handle_response(url, response, cached)
+
+    async def get_async(self, url):
+        import httpx
+
+        if self._async_client is None:
+            self._async_client = httpx.AsyncClient(**self.client_options)
+        cached = self.cache.get(url) if self.cache else None
+        try:
+            response = await self._async_client.get(
+                url, headers=self.conditional_headers(cached)
+            )
+        except httpx.HTTPError:
+            return FetchResult(url, None, "")
+        return self.handle_response(url, response, cached)
+
+    def get_many(self, urls):
+        """
+        Fetches URLs concurrently over the async client, yielding each FetchResult
+        as soon as it arrives, so the caller can parse pages while the rest are still
+        downloading. Failed fetches have a status_code of None.
+        """
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, daemon=True).start()
+
+        results = queue.Queue()
+        for url in urls:
+            future = asyncio.run_coroutine_threadsafe(self.get_async(url), self._loop)
+            future.add_done_callback(results.put)
+        for _ in urls:
+            yield results.get().result()
+
+
+_fetcher = None
+_fetcher_lock = threading.Lock()
+
+
+def get_fetcher(cache_dir=None):
+    """The container's shared Fetcher, created on first use."""
+    global _fetcher
+    with _fetcher_lock:
+        if _fetcher is None:
+            _fetcher = Fetcher(cache_dir=cache_dir)
+        return _fetcher
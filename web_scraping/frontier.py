@@ -0,0 +1,147 @@
+import heapq
+import itertools
+import re
+import sys
+from collections import deque
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+# Query parameters that only track where a visitor came from
+TRACKING_PARAMS = re.compile(r"^(utm_\w+|fbclid|gclid|mc_eid)$")
+PERCENT_ENCODED = re.compile(r"%([0-9A-Fa-f]{2})")
+UNRESERVED = set("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-._~")
+
+
+def _normalize_percent_encoding(component):
+    # Decode escaped unreserved characters and uppercase the rest (RFC 3986 6.2.2)
+    def replace(match):
+        char = chr(int(match.group(1), 16))
+        return char if char in UNRESERVED else f"%{match.group(1).upper()}"
+
+    return PERCENT_ENCODED.sub(replace, component)
+
+
+def canonicalize_url(url):
+    """
+    Returns a canonical form of a URL, so different spellings of the same page are
+    only crawled once: the scheme and host are lowercased, default ports, fragments
+    and tracking parameters are dropped, and the query is sorted.
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    netloc = parts.hostname or ""
+    if parts.port and parts.port != DEFAULT_PORTS.get(scheme):
+        netloc = f"{netloc}:{parts.port}"
+
+    path = _normalize_percent_encoding(parts.path) or "/"
+    query = ""
+    if parts.query:
+        params = [
+            (key, value)
+            for key, value in parse_qsl(parts.query, keep_blank_values=True)
+            if not TRACKING_PARAMS.match(key)
+        ]
+        query = urlencode(sorted(params))
+
+    return urlunsplit((scheme, netloc, path, query, ""))
+
+
+class Frontier:
+    """
+    The URLs left to crawl, and every URL seen so far.
+
+    URLs are canonicalized and only queued the first time they are seen. By
+    default they are crawled in the order they were found, with constant-time
+    `add` and `pop`. With `prioritize=True`, the queued URL with the most in-links
+    so far is crawled first instead, at O(log n) per operation.
+    """
+
+    def __init__(self, prioritize=False, seen=None, track_changes=False):
+        self.prioritize = prioritize
+        # Anything with `add` and `in` works, e.g. a Bloom filter for huge crawls
+        self.seen = seen if seen is not None else set()
+        # New URLs and in-link counts since the last drain_changes(), for checkpoints
+        self.track_changes = track_changes
+        self._changes = {}
+        self._queue = deque()
+        # Priority mode: a heap of (-in-links, first seen, url) with stale entries
+        # left in place, and the in-link count and first-seen order of queued URLs
+        self._heap = []
+        self._inlinks = {}
+        self._first_seen = {}
+        self._order = itertools.count()
+
+    def __len__(self):
+        return len(self._inlinks) if self.prioritize else len(self._queue)
+
+    def __bool__(self):
+        return len(self) > 0
+
+    def __contains__(self, url):
+        return canonicalize_url(url) in self.seen
+
+    def add(self, url):
+        """Queues a URL if it hasn't been seen before, returning whether it was."""
+        url = canonicalize_url(url)
+        if url in self.seen:
+            if self.prioritize and url in self._inlinks:
+                # Another in-link for a queued URL raises its priority
+                self._inlinks[url] += 1
+                heapq.heappush(
+                    self._heap, (-self._inlinks[url], self._first_seen[url], url)
+                )
+                if self.track_changes:
+                    self._changes[url] = self._inlinks[url]
+            return False
+
+        self.seen.add(url)
+        if self.track_changes:
+            self._changes[url] = 1
+        if self.prioritize:
+            self._push(url, 1)
+        else:
+            self._queue.append(url)
+        return True
+
+    def _push(self, url, inlinks):
+        self._inlinks[url] = inlinks
+        self._first_seen[url] = next(self._order)
+        heapq.heappush(self._heap, (-inlinks, self._first_seen[url], url))
+
+    def add_many(self, urls):
+        return sum(self.add(url) for url in urls)
+
+    def pop(self):
+        if not self.prioritize:
+            return self._queue.popleft()
+
+        while self._heap:
+            priority, _, url = heapq.heappop(self._heap)
+            # Skip entries superseded by a later in-link, or already crawled
+            if self._inlinks.get(url) == -priority:
+                del self._inlinks[url]
+                del self._first_seen[url]
+                return url
+        raise IndexError("pop from an empty frontier")
+
+    def seen_memory_bytes(self):
+        """Memory held by the seen-set, walking every URL for an exact set."""
+        if hasattr(self.seen, "memory_bytes"):
+            return self.seen.memory_bytes
+        return sys.getsizeof(self.seen) + sum(sys.getsizeof(url) for url in self.seen)
+
+    def drain_changes(self):
+        """Returns the (url, in-links) added or updated since the last call, in order."""
+        changes, self._changes = self._changes, {}
+        return list(changes.items())
+
+    def restore(self, seen, queued):
+        """Reloads a checkpointed frontier: every URL seen, and the (url, in-links) queued."""
+        for url in seen:
+            self.seen.add(url)
+        for url, inlinks in queued:
+            self.seen.add(url)
+            if self.prioritize:
+                self._push(url, inlinks)
+            else:
+                self._queue.append(url)